@@ -0,0 +1,170 @@
+'''
+adaptive.py
+Adaptive sampling of a map over a rectangle, for plots and distortion maps.
+
+Sampling starts from a coarse grid of square cells. A cell is split into four
+where the value of the map at its center differs from the mean of its corners
+by more than a tolerance, that is where the map is far from linear across it,
+so points gather near poles, zeros and branch cuts and stay sparse where the
+map is almost linear. Every level of refinement evaluates the map once, on all
+of its new points together.
+'''
+
+import numpy as np
+from typing import Callable, Tuple
+from zippy.utils import get_color
+
+# The ways cells can be compared with the tolerance
+CRITERIA = ('color', 'value')
+
+class AdaptiveSample:
+
+    '''
+    Points chosen by adaptive_sample and the values of the map at them.
+    '''
+
+    def __init__(self, points: np.ndarray, values: np.ndarray, cells: np.ndarray):
+        '''
+        Constructor.
+        Parameters:
+        points (np.ndarray): the sampled points
+        values (np.ndarray): the value of the map at each point
+        cells (np.ndarray): the cells that were not split, as rows of
+        (min_r, max_r, min_c, max_c)
+        '''
+        self.points = points
+        self.values = values
+        self.cells = cells
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def triangulation(self):
+        '''
+        Returns a Delaunay triangulation of the points, for plt.tripcolor or plt.triplot.
+        Returns:
+        matplotlib.tri.Triangulation
+        '''
+        import matplotlib.tri
+        return matplotlib.tri.Triangulation(self.points.real, self.points.imag)
+
+    def colors(self) -> np.ndarray:
+        '''
+        Returns the domain coloring of each value, see get_color, with
+        values that are not finite colored black.
+        Returns:
+        np.ndarray: array of shape (len(self), 3) holding (r, g, b)
+        '''
+        finite = np.isfinite(self.values)
+        rgb = get_color(np.where(finite, self.values, 0))
+        rgb[~finite] = 0
+        return rgb
+
+def _difference(center: np.ndarray, corners: np.ndarray, criterion: str) -> np.ndarray:
+    '''
+    Returns how far the value at the center of each cell is from the mean of the
+    values at its corners, which is 0 where the map is linear across the cell.
+    Parameters:
+    center (np.ndarray): value at the center of each cell
+    corners (np.ndarray): values at the corners, of shape (cells, 4)
+    criterion (str): 'color' for the largest difference of the red, green and blue
+    parts of get_color, each in [0, 1], or 'value' for the distance between the values
+    relative to 1 plus their size
+    Returns:
+    np.ndarray: the difference of each cell, infinite where a value is not finite
+    '''
+    with np.errstate(invalid='ignore', over='ignore'):
+        if criterion == 'color':
+            finite = np.isfinite(center) & np.all(np.isfinite(corners), axis=1)
+            mean_color = get_color(np.where(np.isfinite(corners), corners, 0)).mean(axis=1)
+            difference = np.abs(get_color(np.where(finite, center, 0)) - mean_color).max(axis=-1)
+        else:
+            mean = corners.mean(axis=1)
+            finite = np.isfinite(center) & np.isfinite(mean)
+            difference = np.abs(center - mean) / (1 + np.abs(mean))
+    return np.where(finite, difference, np.inf)
+
+def adaptive_sample(func: Callable[[np.ndarray], np.ndarray],
+                    extent: Tuple[float, float, float, float],
+                    tol: float = 0.02,
+                    initial: int = 16,
+                    max_depth: int = 6,
+                    criterion: str = 'color') -> AdaptiveSample:
+    '''
+    Samples a map over a rectangle, finely where it varies and coarsely where it does not.
+    With the defaults, the finest cells are as small as those of a uniform grid of
+    1024 by 1024 points, which is reached only where it is needed.
+    Parameters:
+    func (function): function applied to a 1D array of complex points at once,
+    such as Zipper.forward or F_a.apply
+    extent (Tuple[float, float, float, float]): (min_r, max_r, min_c, max_c)
+    tol (float): cells whose center differs from the mean of their corners by more
+    than this are split
+    initial (int): the number of cells along each side of the starting grid
+    max_depth (int): the most times a cell of the starting grid is split
+    criterion (str): 'color' or 'value', see _difference
+    Returns:
+    AdaptiveSample
+    Raises:
+    ValueError for an unknown criterion or a starting grid with no cells
+    '''
+    if criterion not in CRITERIA:
+        raise ValueError(f"criterion must be one of {', '.join(CRITERIA)}, got {criterion!r}")
+    if initial < 1:
+        raise ValueError(f'initial must be positive, got {initial}.')
+    min_r, max_r, min_c, max_c = extent
+
+    # Points are kept on an integer lattice as fine as the smallest cells, and
+    # named by their index into it, so that points shared by cells are evaluated once
+    n = initial * 2 ** (max_depth + 1)
+    step = complex((max_r - min_r) / n, (max_c - min_c) / n)
+    ids = np.empty(0, dtype=np.int64)
+    values = np.empty(0, dtype=np.complex128)
+
+    def lookup(i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        '''
+        Returns the value at each lattice point, evaluating func on the new ones.
+        '''
+        nonlocal ids, values
+        key = i * (n + 1) + j
+        new = np.setdiff1d(key, ids)
+        if len(new):
+            z = min_r + (new // (n + 1)) * step.real + 1j * (min_c + (new % (n + 1)) * step.imag)
+            with np.errstate(all='ignore'):
+                computed = np.asarray(func(z), dtype=np.complex128).reshape(-1)
+            ids = np.concatenate([ids, new])
+            values = np.concatenate([values, computed])
+            order = np.argsort(ids)
+            ids, values = ids[order], values[order]
+        return values[np.searchsorted(ids, key)]
+
+    # Each cell is its lower left lattice point and its side
+    side = 2 ** (max_depth + 1)
+    i, j = np.meshgrid(np.arange(initial) * side, np.arange(initial) * side, indexing='ij')
+    i, j = i.reshape(-1), j.reshape(-1)
+    leaves = []
+    for depth in range(max_depth + 1):
+        corners = np.stack([lookup(i, j), lookup(i + side, j), lookup(i, j + side), lookup(i + side, j + side)], axis=1)
+        center = lookup(i + side // 2, j + side // 2)
+
+        split = _difference(center, corners, criterion) > tol
+
+        # Cells where nothing is finite are outside the domain of the map
+        split &= np.isfinite(center) | np.any(np.isfinite(corners), axis=1)
+        if depth == max_depth:
+            split[:] = False
+        leaves.append(np.stack([i[~split], j[~split], np.full(np.count_nonzero(~split), side)], axis=1))
+
+        half = side // 2
+        i, j = i[split], j[split]
+        i = np.concatenate([i, i + half, i, i + half])
+        j = np.concatenate([j, j, j + half, j + half])
+        side = half
+        if len(i) == 0:
+            break
+
+    leaves = np.concatenate(leaves)
+    cells = np.stack([min_r + leaves[:, 0] * step.real, min_r + (leaves[:, 0] + leaves[:, 2]) * step.real,
+                      min_c + leaves[:, 1] * step.imag, min_c + (leaves[:, 1] + leaves[:, 2]) * step.imag], axis=1)
+    points = min_r + (ids // (n + 1)) * step.real + 1j * (min_c + (ids % (n + 1)) * step.imag)
+    return AdaptiveSample(points, values, cells)
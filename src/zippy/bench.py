@@ -0,0 +1,182 @@
+'''
+bench.py
+Timings of the component maps, grids, rendering and the zipper.
+
+To run, and save the timings as a baseline:
+python -m zippy.bench --save baseline.json
+
+To run and compare against a baseline, exiting with status 1 if anything slowed down:
+python -m zippy.bench --compare baseline.json --threshold 0.2
+
+Building a zipper is O(N^2), so N = 10^5 boundary points takes several minutes
+and is left out of the default sizes; add it with --sizes 100 1000 10000 100000.
+'''
+
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+from typing import Callable, Dict, List, Sequence
+from zippy.f_a import F_a
+from zippy.point import Point
+from zippy.utils import f3sqrt, get_color, render_domain_coloring, generate_complex_point, iter_complex
+from zippy.workspace import Workspace
+from zippy.zipper import Zipper
+
+SIZES = (100, 1000, 10000)
+QUICK_SIZES = (100, 300)
+
+def _time(func: Callable, repeat: int = 5) -> float:
+    '''
+    Returns the shortest wall time of several calls, which is the least
+    affected by other work on the machine.
+    Parameters:
+    func (Callable): called with no arguments
+    repeat (int): the number of calls
+    Returns:
+    float: seconds
+    '''
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _points(n: int) -> np.ndarray:
+    '''
+    Returns n fixed points of the lower half plane, so that every run maps the same points.
+    '''
+    rng = np.random.default_rng(0)
+    return rng.normal(size=n) - 1j * np.abs(rng.normal(size=n))
+
+def _boundary(n: int) -> np.ndarray:
+    '''
+    Returns n vertices of a smooth star-shaped curve around 0.
+    '''
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    return np.exp(1j * t) * (1 + .3 * np.cos(3 * t))
+
+def run(sizes: Sequence[int] = SIZES, points: int = 100000, repeat: int = 5) -> Dict[str, float]:
+    '''
+    Runs every benchmark.
+    Parameters:
+    sizes (Sequence[int]): numbers of boundary points to build and evaluate zippers with
+    points (int): the number of points given to each batch map
+    repeat (int): the number of calls each timing is the best of
+    Returns:
+    Dict[str, float]: name of each benchmark -> seconds
+    '''
+    results = {}
+    f = F_a(complex(.3, -.7))
+    z = _points(points)
+
+    # The scalar maps are timed on fewer points, and reported per point like the batch maps
+    scalar_count = max(points // 100, 1)
+    scalar_points = [Point(complex(p)) for p in z[:scalar_count]]
+    results['scalar_f1_per_point'] = _time(lambda: [f.f1(p) for p in scalar_points], repeat) / scalar_count
+    results['scalar_f2_per_point'] = _time(lambda: [f.f2(p) for p in scalar_points], repeat) / scalar_count
+    results['scalar_f3_per_point'] = _time(lambda: [f.f3(p) for p in scalar_points], repeat) / scalar_count
+
+    results['batch_f1_per_point'] = _time(lambda: f.f1_array(z), repeat) / points
+    results['batch_f2_per_point'] = _time(lambda: f.f2_array(z), repeat) / points
+    results['batch_f3_per_point'] = _time(lambda: f.f3_array(z), repeat) / points
+    results['batch_apply_per_point'] = _time(lambda: f.apply(z), repeat) / points
+    workspace = Workspace(len(z))
+    results['batch_apply_workspace_per_point'] = _time(lambda: f.apply(z, out=workspace.result, workspace=workspace), repeat) / points
+    results['f3sqrt_per_point'] = _time(lambda: f3sqrt(z), repeat) / points
+    results['get_color_per_point'] = _time(lambda: get_color(z), repeat) / points
+
+    # Grids of about the same number of points as the batch maps
+    density = np.sqrt(points) / 2
+    results['grid_point_array'] = _time(lambda: generate_complex_point(-1, 1, -1, 1, density, as_array=True), repeat)
+    results['grid_iter_complex'] = _time(lambda: sum(len(c) for c in iter_complex(-1, 1, -1, 1, density)), repeat)
+    side = int(np.sqrt(points))
+    results['render_identity'] = _time(lambda: render_domain_coloring(lambda w: w, (-1, 1, -1, 1), (side, side)), repeat)
+
+    eval_points = z[:1000] * .1
+    for n in sizes:
+        boundary = _boundary(n)
+
+        # Building is O(n^2), so large sizes are only built once
+        build_repeat = repeat if n <= 1000 else 1
+        results[f'zipper_build_{n}'] = _time(lambda: Zipper(boundary, interior=0), build_repeat)
+        zipper = Zipper(boundary, interior=0)
+        results[f'zipper_forward_{n}'] = _time(lambda: zipper.forward(eval_points), build_repeat)
+        results[f'zipper_forward_disk_{n}'] = _time(lambda: zipper.forward_disk(eval_points), build_repeat)
+        results[f'classify_per_point_{n}'] = _time(lambda: zipper.classify(z, tol=1e-6), build_repeat) / points
+    return results
+
+def environment() -> Dict[str, str]:
+    '''
+    Returns what the timings depend on besides the code, to store with a baseline.
+    '''
+    return {'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float = 0.2) -> List[str]:
+    '''
+    Returns the benchmarks that got slower than the baseline by more than the threshold.
+    Benchmarks that are missing from either side are skipped.
+    Parameters:
+    results (Dict[str, float]): new timings
+    baseline (Dict[str, float]): old timings
+    threshold (float): the allowed relative slowdown, 0.2 is 20%
+    Returns:
+    List[str]: names of the benchmarks that slowed down
+    '''
+    return [name for name in results
+            if name in baseline and results[name] > baseline[name] * (1 + threshold)]
+
+def main(argv: List[str] = None) -> int:
+    '''
+    Command line entry point, see the module docstring.
+    Returns:
+    int: exit status, 1 if a comparison found a slowdown
+    '''
+    parser = argparse.ArgumentParser(prog='python -m zippy.bench', description='Time the zipper and its component maps.')
+    parser.add_argument('--save', metavar='PATH', help='write the timings as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare the timings with a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown that is flagged (default 0.2)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=None,
+                        help=f'numbers of boundary points for the zipper (default {" ".join(map(str, SIZES))})')
+    parser.add_argument('--points', type=int, default=100000, help='number of points given to the batch maps')
+    parser.add_argument('--repeat', type=int, default=5, help='number of calls each timing is the best of')
+    parser.add_argument('--quick', action='store_true', help='small sizes, for checking that the benchmarks run')
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+    points = 10000 if args.quick else args.points
+    repeat = 1 if args.quick else args.repeat
+    results = run(sizes=sizes, points=points, repeat=repeat)
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+    slower = compare(results, baseline, args.threshold) if baseline is not None else []
+
+    for name, seconds in results.items():
+        line = f'{name:32s} {seconds:12.4e} s'
+        if baseline is not None and baseline.get(name, 0) > 0:
+            line += f'  {seconds / baseline[name]:6.2f}x baseline'
+        if name in slower:
+            line += '  SLOWER'
+        print(line)
+
+    if args.save is not None:
+        with open(args.save, 'w') as file:
+            json.dump({'environment': environment(), 'results': results}, file, indent=2)
+
+    if slower:
+        print(f'{len(slower)} benchmark(s) slowed down by more than {args.threshold:.0%}: {", ".join(slower)}')
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+'''
+boundary.py
+Loading of large boundary curves, reduced to a number of vertices a zipper can be built on.
+
+Building a zipper on N vertices costs O(N^2), so a digitized curve with millions
+of vertices is first reduced. The vertices are read in chunks, from a memory-mapped
+.npy or raw file or from CSV, and vertices that are within a tolerance of the last
+vertex kept are dropped as they stream past, so only the deduplicated vertices are
+ever held. The curve is then oriented counterclockwise and brought down to a target
+number of vertices. Vertices where the curve turns by more than a corner angle are
+always kept; the rest of the vertices are spread by a measure that is part arc length
+and part turning, so that curved stretches get more of them than straight ones.
+They are either chosen among the original vertices (decimate), or placed along the
+edges at equal steps of the measure (resample).
+
+To load a curve of 10^6 vertices as 2000 vertices and build its zipper:
+zipper = Zipper(load_boundary('curve.npy', target=2000))
+'''
+
+import os
+import numpy as np
+from typing import Iterator
+from zippy.point import PointArray
+from zippy.storage import read_chunks
+
+METHODS = ('decimate', 'resample')
+
+def read_vertices(path: str, fmt: str = None, chunk_size: int = 1 << 20) -> Iterator[np.ndarray]:
+    '''
+    Reads the vertices of a curve in chunks.
+    Parameters:
+    path (str): file to read
+    fmt (str): 'npy' for a complex array or a real array of shape (N, 2), which is
+    memory-mapped, 'csv' for lines of x,y, or 'raw' for little-endian complex128,
+    otherwise from the extension of path
+    chunk_size (int): the most vertices in a chunk
+    Returns:
+    Iterator[np.ndarray]: complex128 chunks
+    Raises:
+    ValueError for an unknown format, or an npy array of another shape
+    '''
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt == 'csv':
+        with open(path, 'rb') as stream:
+            yield from read_chunks(stream, 'csv', chunk_size)
+        return
+    if fmt == 'npy':
+        array = np.load(path, mmap_mode='r')
+        if not (array.ndim == 1 and array.dtype.kind == 'c') and not (array.ndim == 2 and array.shape[1] == 2):
+            raise ValueError(f'Expected a 1D complex array or an array of shape (N, 2), got shape {array.shape} and dtype {array.dtype}.')
+    elif fmt == 'raw':
+        array = np.memmap(path, dtype='<c16', mode='r') if os.path.getsize(path) else np.empty(0, dtype=np.complex128)
+    else:
+        raise ValueError(f"format must be one of npy, csv, raw, got {fmt!r}")
+
+    for start in range(0, len(array), chunk_size):
+        chunk = array[start:start + chunk_size]
+        if chunk.ndim == 2:
+            yield chunk[:, 0] + 1j * chunk[:, 1].astype(np.float64)
+        else:
+            yield chunk.astype(np.complex128)
+
+def deduplicate(chunks: Iterator[np.ndarray], tol: float) -> np.ndarray:
+    '''
+    Drops every vertex within tol of the last vertex kept, as the chunks stream past,
+    and the last vertices if they close the curve onto the first.
+    Distances are measured along the curve, so a vertex is kept when the curve has
+    run for more than tol since the last vertex kept, which every vertex at the end
+    of an edge longer than tol has. Only runs of short edges need to be walked.
+    Parameters:
+    chunks (Iterator[np.ndarray]): the vertices, in order
+    tol (float): distance below which vertices are merged, 0 to only drop repeats
+    Returns:
+    np.ndarray: the vertices that are kept
+    '''
+    kept = []
+    last = None
+
+    # The length of the curve up to the last vertex read, and up to the last vertex kept
+    length = 0.0
+    anchor = 0.0
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        steps = np.abs(np.diff(chunk, prepend=chunk[0] if last is None else last))
+        lengths = length + np.cumsum(steps)
+        keep = steps > tol
+        if last is None:
+            keep[0] = True
+
+        # A run of short edges can only hold a vertex to keep if the curve runs for
+        # more than tol through it, and only those runs are walked, from the vertex kept before them
+        short = np.flatnonzero(~keep)
+        if len(short):
+            breaks = np.flatnonzero(np.diff(short) > 1)
+            firsts = short[np.concatenate([[0], breaks + 1])]
+            lasts = short[np.concatenate([breaks, [len(short) - 1]])]
+            anchors = np.where(firsts > 0, lengths[np.maximum(firsts - 1, 0)], anchor)
+            long_runs = lengths[lasts] - anchors > tol
+            for first, end, start in zip(firsts[long_runs], lasts[long_runs], anchors[long_runs]):
+                run_lengths = lengths[first:end + 1]
+                k = np.searchsorted(run_lengths, start + tol, side='right')
+                while k < len(run_lengths):
+                    keep[first + k] = True
+                    k = np.searchsorted(run_lengths, run_lengths[k] + tol, side='right')
+        kept_lengths = lengths[keep]
+        if len(kept_lengths):
+            anchor = kept_lengths[-1]
+        kept.append(chunk[keep])
+        length = lengths[-1]
+        last = chunk[-1]
+
+    z = np.concatenate(kept) if kept else np.zeros(0, dtype=np.complex128)
+    while len(z) > 1 and np.abs(z[-1] - z[0]) <= tol:
+        z = z[:-1]
+    return z
+
+def signed_area(z: np.ndarray) -> float:
+    '''
+    Returns the signed area of a closed polygon, which is positive when it runs counterclockwise.
+    '''
+    # Measured from the first vertex, so that a curve far from 0 does not lose precision
+    d = z - z[0]
+    return 0.5 * float(np.sum(d.real * np.roll(d.imag, -1) - np.roll(d.real, -1) * d.imag))
+
+def orient(z: np.ndarray) -> np.ndarray:
+    '''
+    Returns the vertices of a closed polygon in counterclockwise order, keeping the first vertex first.
+    '''
+    if signed_area(z) < 0:
+        return np.concatenate([z[:1], z[:0:-1]])
+    return z
+
+def _turning(z: np.ndarray) -> tuple:
+    '''
+    Returns the edge after every vertex of a closed polygon, and the angle the polygon turns by at it.
+    '''
+    edges = np.roll(z, -1) - z
+    with np.errstate(divide='ignore', invalid='ignore'):
+        turning = np.abs(np.angle(edges / np.roll(edges, 1)))
+    return edges, np.nan_to_num(turning)
+
+def _measure(edges: np.ndarray, turning: np.ndarray, corners: np.ndarray, curvature: float) -> tuple:
+    '''
+    Returns the start of every vertex in the measure that the vertices other than
+    corners are spread by, the mass at each vertex and the mass of the edge after it, see simplify.
+    '''
+    # Corners are kept anyway, so their turning does not draw other vertices to them
+    turning = np.where(corners, 0.0, turning)
+    total_turning = float(np.sum(turning))
+    share = curvature if total_turning > 0 else 0.0
+    mass = share * turning / (total_turning if total_turning > 0 else 1)
+    lengths = np.abs(edges)
+    edge_mass = (1 - share) * lengths / np.sum(lengths)
+    starts = np.concatenate([[0.0], np.cumsum(mass + edge_mass)[:-1]])
+    return starts, mass, edge_mass
+
+def simplify(z: np.ndarray, target: int, method: str = 'decimate', corner: float = np.pi / 4,
+             curvature: float = 0.5) -> np.ndarray:
+    '''
+    Brings a closed polygon down to about target vertices. The first vertex and every
+    corner, where the polygon turns by more than corner, are kept, and the other vertices
+    are spread at equal steps of a measure that gives curvature of its weight to the
+    turning at each vertex and the rest to arc length. If there are more corners than
+    target, the sharpest of them are kept.
+    Parameters:
+    z (np.ndarray): the vertices, in order
+    target (int): the number of vertices to keep, at least 3
+    method (str): 'decimate' to keep the original vertices nearest each step,
+    or 'resample' to place new vertices along the edges at each step; either gives
+    fewer than target where steps meet the same vertex or a corner
+    corner (float): the turning angle, in radians, above which a vertex is a corner
+    curvature (float): the share of the measure given to turning, between 0 and 1
+    Returns:
+    np.ndarray: the vertices kept, in order, starting from the first vertex
+    Raises:
+    ValueError for an unknown method, a target below 3 or a curvature outside [0, 1]
+    '''
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}, got {method!r}")
+    if target < 3:
+        raise ValueError(f'target must be at least 3, got {target}')
+    if not 0 <= curvature <= 1:
+        raise ValueError(f'curvature must be between 0 and 1, got {curvature}')
+    n = len(z)
+    if n <= target:
+        return z
+
+    edges, turning = _turning(z)
+    corners = turning > corner
+    corners[0] = True
+    corner_index = np.flatnonzero(corners)
+    if len(corner_index) >= target:
+        sharpest = 1 + np.argsort(-turning[corner_index[1:]], kind='stable')[:target - 1]
+        return z[np.sort(np.concatenate([[0], corner_index[sharpest]]))]
+    starts, mass, edge_mass = _measure(edges, turning, corners, curvature)
+
+    # Equal steps of the measure, each in the middle of its share so that none
+    # falls on the first vertex
+    count = target - len(corner_index)
+    steps = (np.arange(count) + 0.5) / count
+    index = np.searchsorted(starts, steps, side='right') - 1
+    offset = steps - starts[index] - mass[index]
+
+    if method == 'decimate':
+        # The step falls on the vertex, or in the edge after it and is rounded to the nearer end
+        after = (offset > 0) & (offset > edge_mass[index] / 2)
+        chosen = np.union1d((index + after) % n, corner_index)
+        return z[chosen]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.clip(np.nan_to_num(offset / edge_mass[index]), 0, 1)
+    points = z[index] + fraction * edges[index]
+    positions = np.concatenate([index + fraction, corner_index.astype(np.float64)])
+    order = np.argsort(positions, kind='stable')
+    points = np.concatenate([points, z[corner_index]])[order]
+    # A step that rounds onto a corner from the edge before it is the corner
+    keep = np.diff(positions[order], prepend=-1.0) > 1e-9
+    return points[keep]
+
+def boundary_points(z: np.ndarray) -> PointArray:
+    '''
+    Returns the vertices of a polygon as a PointArray with is_origin and on_axis set
+    for vertices at 0 and on the real axis, the input the zipper expects.
+    on_arc is deliberately left unset, also for vertices on the unit circle: it marks
+    points on the arc \\gamma from 0 to a of a stage F_a, which depends on the chain
+    being built and not on where the vertex lies.
+    '''
+    z = np.asarray(z, dtype=np.complex128).reshape(-1)
+    return PointArray.from_flags(z, z == 0, z.imag == 0, np.zeros(len(z), dtype=bool), np.zeros(len(z), dtype=np.int8))
+
+def load_boundary(path: str, target: int = None, tol: float = 1e-9, method: str = 'decimate',
+                  corner: float = np.pi / 4, curvature: float = 0.5, fmt: str = None,
+                  chunk_size: int = 1 << 20) -> PointArray:
+    '''
+    Loads a closed curve for a zipper: reads its vertices in chunks, drops
+    near-coincident vertices, orients it counterclockwise and brings it down to
+    target vertices, see the module docstring.
+    Parameters:
+    path (str): file of vertices, see read_vertices
+    target (int): the number of vertices to keep, otherwise every vertex left after deduplication
+    tol (float): the distance below which vertices are merged, relative to the
+    larger side of the bounding box of the curve
+    method, corner, curvature: see simplify
+    fmt (str): see read_vertices
+    chunk_size (int): the most vertices read at once
+    Returns:
+    PointArray: the vertices, with their flags set, see boundary_points
+    Raises:
+    ValueError if fewer than three distinct vertices are left, or see read_vertices and simplify
+    '''
+    # The bounding box takes a pass of its own, which only holds one chunk at a time
+    low = complex(np.inf, np.inf)
+    high = complex(-np.inf, -np.inf)
+    for chunk in read_vertices(path, fmt, chunk_size):
+        if len(chunk):
+            low = complex(min(low.real, chunk.real.min()), min(low.imag, chunk.imag.min()))
+            high = complex(max(high.real, chunk.real.max()), max(high.imag, chunk.imag.max()))
+    size = max(high.real - low.real, high.imag - low.imag, 0.0)
+
+    z = deduplicate(read_vertices(path, fmt, chunk_size), tol * size if np.isfinite(size) else 0.0)
+    if len(z) < 3:
+        raise ValueError(f'{path} has {len(z)} distinct vertices, at least three are needed.')
+    z = orient(z)
+    if target is not None:
+        z = simplify(z, target, method=method, corner=corner, curvature=curvature)
+    return boundary_points(z)
@@ -0,0 +1,130 @@
+'''
+branches.py
+Tracking of the branches of f_3 through a chain of maps, with arrays of a fixed shape.
+
+F_a.f3 returns one or two Points for each point, and applying it again to each
+of them fans out into lists of lists. Here every input point instead keeps one
+primary branch, in an array of the same length as the input, and only the
+points that split add an alternate branch to a compact side array, together
+with the index of the input point it came from. Splitting then costs memory
+in proportion to the number of points that split, and every stage maps the
+primary and alternate branches together in one batch.
+'''
+
+import numpy as np
+from typing import Iterable
+from zippy.point import PointArray
+
+class BranchedPoints:
+
+    '''
+    The branches of a set of points: one primary branch for every point, and
+    alternate branches for the points that split, indexed back to their source.
+    '''
+
+    def __init__(self, primary: PointArray, alternate: PointArray = None, source: np.ndarray = None):
+        '''
+        Constructor.
+        Parameters:
+        primary (PointArray): one branch of every point
+        alternate (PointArray): the other branches, otherwise none
+        source (np.ndarray): for each alternate branch, the index of its point in primary
+        Raises:
+        ValueError if alternate and source do not have the same length
+        '''
+        self.primary = primary
+        self.alternate = primary[np.zeros(0, dtype=np.int64)] if alternate is None else alternate
+        self.source = np.zeros(0, dtype=np.int64) if source is None else np.asarray(source, dtype=np.int64)
+        if len(self.source) != len(self.alternate):
+            raise ValueError(f'{len(self.alternate)} alternate branches were given with {len(self.source)} sources.')
+
+    def __len__(self) -> int:
+        return len(self.primary)
+
+    @property
+    def split(self) -> np.ndarray:
+        '''
+        Whether each point has more than one branch.
+        '''
+        return np.bincount(self.source, minlength=len(self.primary)) > 0
+
+    def counts(self) -> np.ndarray:
+        '''
+        Returns the number of branches of each point.
+        '''
+        return np.bincount(self.source, minlength=len(self.primary)) + 1
+
+    def joined(self) -> PointArray:
+        '''
+        Returns every branch in one PointArray, the primary branches first.
+        '''
+        return PointArray.concatenate([self.primary, self.alternate])
+
+    def sources(self) -> np.ndarray:
+        '''
+        Returns the index of the point of every branch, in the order of joined.
+        '''
+        return np.concatenate([np.arange(len(self.primary)), self.source])
+
+    def branches_of(self, i: int) -> PointArray:
+        '''
+        Returns every branch of one point, the primary branch first.
+        '''
+        return PointArray.concatenate([self.primary[i:i + 1], self.alternate[self.source == i]])
+
+def _with_alternates(joined: PointArray, sources: np.ndarray, n: int,
+                     new: PointArray, new_sources: np.ndarray) -> BranchedPoints:
+    '''
+    Splits an array of every branch back into primary and alternate branches,
+    with newly split branches added at the end.
+    '''
+    return BranchedPoints(joined[:n],
+                          PointArray.concatenate([joined[n:], new]),
+                          np.concatenate([sources[n:], new_sources]))
+
+def f3_branches(f, points: BranchedPoints) -> BranchedPoints:
+    '''
+    Applies f_3 to every branch. Points that are the origin or on the arc split,
+    and their second branch, the negation of the first, is added to the alternates.
+    Parameters:
+    f (F_a): the map
+    points (BranchedPoints): branches to apply f_3 to
+    Returns:
+    BranchedPoints: f_3 of every branch, with the new alternate branches
+    '''
+    joined = points.joined()
+    sources = points.sources()
+    z, is_origin, on_axis, on_arc, branch_sign, split = f.f3_array(joined.z, joined.is_origin, joined.on_axis,
+                                                                  joined.on_arc, joined.branch_sign)
+    image = PointArray.from_flags(z, is_origin, on_axis, on_arc, branch_sign, names=joined.names)
+    second = PointArray.from_flags(-z[split], is_origin[split], on_axis[split], on_arc[split], -branch_sign[split],
+                                   names=None if joined.names is None else joined.names[split])
+    return _with_alternates(image, sources, len(points), second, sources[split])
+
+def apply_branches(f, points: BranchedPoints) -> BranchedPoints:
+    '''
+    Applies f_3(f_2(f_1(z))) to every branch in one batch.
+    Parameters:
+    f (F_a): the map
+    points (BranchedPoints): branches to apply the map to
+    Returns:
+    BranchedPoints
+    '''
+    joined = points.joined()
+    flags = f.f2_array(*f.f1_array(joined.z, joined.is_origin, joined.on_axis, joined.on_arc, joined.branch_sign))
+    image = PointArray.from_flags(*flags, names=joined.names)
+    return f3_branches(f, BranchedPoints(image[:len(points)], image[len(points):], points.source))
+
+def apply_chain(maps: Iterable, points: PointArray) -> BranchedPoints:
+    '''
+    Applies a chain of maps F_a to points, keeping every branch.
+    Parameters:
+    maps (Iterable[F_a]): the maps, in order
+    points (PointArray): points to apply the maps to
+    Returns:
+    BranchedPoints: every branch of the image of every point
+    '''
+    branches = BranchedPoints(points)
+    for f in maps:
+        branches = apply_branches(f, branches)
+    return branches
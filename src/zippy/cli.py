@@ -0,0 +1,262 @@
+'''
+cli.py
+The zippy command, which streams points through a saved map.
+
+To map a file of points through a map written by Zipper.save:
+zippy map.zippy points.npy -o images.npy
+
+To map raw little-endian complex128 from stdin to stdout with the inverse:
+cat images.bin | zippy map.zippy --inverse > points.bin
+
+Points are read, mapped and written in chunks of bounded size, by a reader
+thread, the main thread and a writer thread joined by short queues, so that
+reading and writing overlap with the computation.
+'''
+
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+import numpy as np
+from typing import BinaryIO, Iterator, List
+from zippy.parallel import MapPool
+from zippy.storage import read_chunks, read_npy_header
+from zippy.zipper import Zipper
+
+FORMATS = ('csv', 'npy', 'raw')
+
+# Every npy file written here has a header of this length, so that its shape
+# can be filled in once the number of points is known
+_NPY_HEADER = 128
+
+# Marks the end of the stream in the queues
+_DONE = object()
+
+def _format(path: str, given: str) -> str:
+    '''
+    Returns the format given, or the one of the file extension, otherwise raw.
+    '''
+    if given is not None:
+        return given
+    extension = os.path.splitext(path or '')[1].lstrip('.').lower()
+    return extension if extension in FORMATS else 'raw'
+
+def _npy_header(count: int) -> bytes:
+    '''
+    Returns an npy header for count complex128 values, padded to _NPY_HEADER bytes.
+    '''
+    header = f"{{'descr': '<c16', 'fortran_order': False, 'shape': ({count},), }}"
+    prefix = b'\x93NUMPY\x01\x00'
+    length = _NPY_HEADER - len(prefix) - 2
+    return prefix + length.to_bytes(2, 'little') + header.ljust(length - 1).encode('latin1') + b'\n'
+
+class ChunkWriter:
+
+    '''
+    Writes complex points in chunks, in one of FORMATS.
+    '''
+
+    def __init__(self, stream: BinaryIO, fmt: str, count: int = None):
+        '''
+        Constructor.
+        Parameters:
+        stream (BinaryIO): binary stream to write
+        fmt (str): see zippy.storage.read_chunks
+        count (int): the number of points, if known, which npy needs in its header
+        Raises:
+        ValueError for npy when the count is not known and the stream cannot seek
+        back to fill it in
+        '''
+        self.stream = stream
+        self.fmt = fmt
+        self.count = 0
+        if fmt == 'npy':
+            if count is None and not stream.seekable():
+                raise ValueError('npy output needs a file when the number of points is not known in advance.')
+            self.start = stream.tell() if count is None else None
+            stream.write(_npy_header(0 if count is None else count))
+
+    def write(self, chunk: np.ndarray):
+        self.count += len(chunk)
+        if self.fmt == 'csv':
+            lines = [f'{z.real!r},{z.imag!r}\n' for z in chunk.tolist()]
+            self.stream.write(''.join(lines).encode('utf-8'))
+        else:
+            self.stream.write(np.ascontiguousarray(chunk, dtype='<c16').tobytes())
+
+    def close(self):
+        '''
+        Fills in the npy header if needed and flushes the stream.
+        '''
+        if self.fmt == 'npy' and self.start is not None:
+            end = self.stream.tell()
+            self.stream.seek(self.start)
+            self.stream.write(_npy_header(self.count))
+            self.stream.seek(end)
+        self.stream.flush()
+
+def _count(stream: BinaryIO, fmt: str) -> int:
+    '''
+    Returns the number of points in a seekable raw or npy input without reading it, otherwise None.
+    '''
+    if fmt == 'csv' or not stream.seekable():
+        return None
+    start = stream.tell()
+    if fmt == 'npy':
+        shape, _ = read_npy_header(stream)
+        stream.seek(start)
+        return shape[0] if len(shape) == 1 else None
+    size = stream.seek(0, os.SEEK_END) - start
+    stream.seek(start)
+    return size // 16
+
+def _produce(chunks: Iterator[np.ndarray], out: queue.Queue, errors: List[BaseException], stop: threading.Event):
+    '''
+    Puts every chunk in a queue and then _DONE, keeping any error for the main thread.
+    Stops early once stop is set.
+    '''
+    try:
+        for chunk in chunks:
+            if stop.is_set():
+                break
+            out.put(chunk)
+    except BaseException as error:
+        errors.append(error)
+    finally:
+        out.put(_DONE)
+
+def _consume(writer: ChunkWriter, source: queue.Queue, errors: List[BaseException]):
+    '''
+    Writes chunks from a queue until _DONE, keeping any error for the main thread.
+    '''
+    try:
+        while True:
+            chunk = source.get()
+            if chunk is _DONE:
+                return
+            writer.write(chunk)
+    except BaseException as error:
+        errors.append(error)
+        # Keep draining, so that the main thread never blocks on a full queue
+        while source.get() is not _DONE:
+            pass
+
+def run(zipper: Zipper, source: BinaryIO, target: BinaryIO, in_format: str, out_format: str,
+        inverse: bool = False, chunk_size: int = 1 << 20, workers: int = None) -> int:
+    '''
+    Streams points from source through the map to target.
+    Parameters:
+    zipper (Zipper): the map
+    source (BinaryIO): binary stream of points, in in_format
+    target (BinaryIO): binary stream for the images, in out_format
+    in_format, out_format (str): see zippy.storage.read_chunks
+    inverse (bool): whether to apply Zipper.inverse rather than Zipper.forward
+    chunk_size (int): the most points held in each chunk
+    workers (int): if given, each chunk is split between this many processes, which
+    are started once for the whole stream, see zippy.parallel.MapPool
+    Returns:
+    int: the number of points mapped
+    '''
+    count = _count(source, in_format) if in_format != 'csv' else None
+    writer = ChunkWriter(target, out_format, count)
+    errors: List[BaseException] = []
+    if workers is None:
+        pool = None
+        method = zipper.inverse if inverse else zipper.forward
+    else:
+        size = chunk_size if count is None else max(min(chunk_size, count), 1)
+        pool = method = MapPool(zipper, size, workers, 'inverse' if inverse else 'forward')
+
+    # Two chunks waiting on each side are enough to keep the computation busy
+    inputs = queue.Queue(maxsize=2)
+    outputs = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    reader = threading.Thread(target=_produce, args=(read_chunks(source, in_format, chunk_size), inputs, errors, stop),
+                              daemon=True)
+    writer_thread = threading.Thread(target=_consume, args=(writer, outputs, errors), daemon=True)
+    reader.start()
+    writer_thread.start()
+
+    chunk = None
+    try:
+        while True:
+            chunk = inputs.get()
+            if chunk is _DONE:
+                break
+            # Nothing more can be written once the writer failed, as when the reader
+            # of a pipe has gone away
+            if errors:
+                break
+            outputs.put(method(chunk))
+    finally:
+        outputs.put(_DONE)
+        writer_thread.join()
+
+        # If the map raised, the reader may be blocked on a full queue, so it is
+        # told to stop and the queue is drained until it finishes
+        stop.set()
+        while chunk is not _DONE:
+            chunk = inputs.get()
+        reader.join()
+        if pool is not None:
+            pool.close()
+    if errors:
+        raise errors[0]
+    writer.close()
+    return writer.count
+
+def main(argv: List[str] = None) -> int:
+    '''
+    Command line entry point, see the module docstring.
+    Returns:
+    int: exit status
+    '''
+    parser = argparse.ArgumentParser(prog='zippy', description='Stream points through a map saved by Zipper.save.')
+    parser.add_argument('map', help='map file written by Zipper.save')
+    parser.add_argument('input', nargs='?', default=None, help='file of points, otherwise stdin')
+    parser.add_argument('-o', '--output', default=None, help='file for the images, otherwise stdout')
+    parser.add_argument('--input-format', choices=FORMATS, default=None,
+                        help='format of the points (default from the extension, otherwise raw complex128)')
+    parser.add_argument('--output-format', choices=FORMATS, default=None,
+                        help='format of the images (default from the extension, otherwise that of the input)')
+    parser.add_argument('--inverse', action='store_true', help='apply the inverse map, from the disk to the region')
+    parser.add_argument('--chunk-size', type=int, default=1 << 20, help='number of points mapped at once (default 2^20)')
+    parser.add_argument('--workers', type=int, default=None, help='processes that each chunk is split between')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not report the throughput')
+    args = parser.parse_args(argv)
+
+    in_format = _format(args.input, args.input_format)
+    out_format = _format(args.output, args.output_format) if args.output or args.output_format else in_format
+    zipper = Zipper.load(args.map)
+
+    source = sys.stdin.buffer if args.input is None else open(args.input, 'rb')
+    target = sys.stdout.buffer if args.output is None else open(args.output, 'wb')
+    start = time.perf_counter()
+    try:
+        count = run(zipper, source, target, in_format, out_format, inverse=args.inverse,
+                    chunk_size=args.chunk_size, workers=args.workers)
+    except ValueError as error:
+        print(f'zippy: {error}', file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # The reader of stdout has gone away, as with zippy ... | head. Python flushes
+        # stdout again at exit, so it is pointed at devnull to keep that from failing too
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+    finally:
+        if args.input is not None:
+            source.close()
+        if args.output is not None:
+            target.close()
+    elapsed = time.perf_counter() - start
+
+    if not args.quiet:
+        rate = count / elapsed if elapsed > 0 else float('inf')
+        print(f'{count} points in {elapsed:.3f} s ({rate:,.0f} points/s)', file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
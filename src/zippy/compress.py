@@ -0,0 +1,209 @@
+'''
+compress.py
+Compression of the end of a zipper chain by a power series, for fast evaluation on a region.
+
+The last maps of a long chain only move the images of points well inside the
+region a little, and the composition of those maps with the final map and the
+disk map is analytic on the whole lower half plane, which holds their images.
+The lower half plane is sent onto the unit disk by the Mobius map
+\\xi = (w - p) / (w - \\bar{p}), with p the mean of the images of the points, so that
+the branch points of the remaining stages, on the real axis, land on the unit circle
+and a power series in \\xi converges on the images of a compact set of points.
+On such a set the end of the chain is replaced by that series, fitted by least
+squares. The number of stages replaced is the largest for which the series still
+matches the full chain to a tolerance on points held out from the fit, and the
+error seen on them is reported.
+
+No two Mobius pieces of the chain are next to each other, since every f_1 is
+followed by the square of f_2 and the root of f_3, and f_2 \\circ f_1 is already
+evaluated as one rational function by F_a.apply, so there is nothing to fuse
+into one matrix. The savings all come from the series.
+'''
+
+import warnings
+import numpy as np
+from typing import Tuple, Union
+from zippy.point import PointArray
+from zippy.zipper import Zipper
+
+# The largest error on the held out points is multiplied by this to give the bound,
+# since points between them can be a little worse
+SAFETY = 2.0
+
+class CompressedZipper:
+
+    '''
+    A zipper whose last stages, final map and disk map are replaced by a power series
+    on the images of a compact set of points.
+    '''
+
+    def __init__(self, zipper: Zipper, stages: int, center: complex, radius: float,
+                 coefficients: np.ndarray, error_bound: float):
+        '''
+        Constructor, see compress.
+        Parameters:
+        zipper (Zipper): the full map
+        stages (int): the number of maps F_a kept from the start of the chain
+        center (complex): the point p of the lower half plane sent to 0, see the module docstring
+        radius (float): the radius of the disk of \\xi on which the series was fitted
+        coefficients (np.ndarray): coefficients of the series in \\xi / radius,
+        the constant first
+        error_bound (float): the empirical bound on the difference from the full chain,
+        measured on held out points, see compress
+        '''
+        self.zipper = zipper
+        self.stages = stages
+        self.center = center
+        self.radius = radius
+        self.coefficients = coefficients
+        self.error_bound = error_bound
+
+    @property
+    def degree(self) -> int:
+        return len(self.coefficients) - 1
+
+    def operations(self) -> Tuple[int, int]:
+        '''
+        Returns the number of maps F_a evaluated for a point in the region, followed by
+        a series of degree self.degree, against the number in the full chain.
+        '''
+        return self.stages, len(self.zipper.maps)
+
+    def _tail(self, w: np.ndarray) -> np.ndarray:
+        '''
+        Applies the maps after the kept stages, the final map and the disk map, exactly.
+        '''
+        for f in self.zipper.maps[self.stages:]:
+            f.apply(w, out=w)
+        u = self.zipper.final_map(w)
+        c = self.zipper.interior_image
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = (u - c) / (u - np.conj(c))
+        result[np.isinf(u)] = 1
+        return result
+
+    def forward(self, z: Union[np.ndarray, PointArray]) -> np.ndarray:
+        '''
+        Evaluates the map. Points whose image after the kept stages falls outside the
+        disk of the fit are sent through the rest of the chain instead, so points
+        away from the compressed region are still mapped correctly, only slower.
+        Parameters:
+        z (np.ndarray or PointArray): points to apply the map to
+        Returns:
+        np.ndarray: image of each point
+        '''
+        if isinstance(z, PointArray):
+            z = z.z
+        z = np.asarray(z, dtype=np.complex128)
+        w = self.zipper.initial_map(z.reshape(-1))
+        for f in self.zipper.maps[:self.stages]:
+            f.apply(w, out=w)
+
+        t = _disk(w, self.center) / self.radius
+        inside = np.abs(t) <= 1
+        result = np.empty_like(w)
+        result[inside] = np.polynomial.polynomial.polyval(t[inside], self.coefficients)
+        if not np.all(inside):
+            result[~inside] = self._tail(w[~inside])
+        return result.reshape(z.shape)
+
+def _disk(w: np.ndarray, center: complex) -> np.ndarray:
+    '''
+    Sends the lower half plane onto the unit disk, with center sent to 0.
+    '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (w - center) / (w - np.conj(center))
+
+def _fit(w: np.ndarray, target: np.ndarray, check_w: np.ndarray, check: np.ndarray,
+         degree: int) -> Tuple[complex, float, np.ndarray, float]:
+    '''
+    Fits a power series to target at the points w and returns it with its largest
+    error at the held out points, infinite if they are not inside the disk of the fit.
+    '''
+    center = complex(np.mean(w))
+    if not center.imag < 0 or not np.all(np.isfinite(w)):
+        return center, np.inf, np.zeros(1, dtype=np.complex128), np.inf
+    xi = _disk(w, center)
+    radius = min(float(np.max(np.abs(xi))) * 1.02, 1.0)
+    t = xi / radius
+    coefficients = np.linalg.lstsq(np.vander(t, degree + 1, increasing=True), target, rcond=None)[0]
+
+    check_t = _disk(check_w, center) / radius
+    if np.any(np.abs(check_t) > 1):
+        return center, radius, coefficients, np.inf
+    error = SAFETY * float(np.max(np.abs(np.polynomial.polynomial.polyval(check_t, coefficients) - check)))
+    return center, radius, coefficients, error
+
+def compress(zipper: Zipper, points: np.ndarray, tol: float = 1e-10, degree: int = 24,
+             holdout: float = 0.25, seed: int = 0) -> CompressedZipper:
+    '''
+    Replaces as many of the last stages of a zipper as possible by a power series
+    that matches the full chain to tol on a compact set of points.
+    The error bound is empirical, not proven: it is SAFETY times the largest difference
+    from the full chain on points that were held out from the fit, so the points should
+    fill the region the compressed map will be used on, including its edge.
+    The images of the points are kept every \\sqrt{n} stages of the n in the chain, and
+    each candidate is replayed from the checkpoint before it, so memory grows as
+    \\sqrt{n} times the number of points.
+    If even replacing only the final and disk maps misses tol, that map is returned
+    with its error bound and a warning.
+    Parameters:
+    zipper (Zipper): the map to compress
+    points (np.ndarray): points of the region, well inside the polygon
+    tol (float): the largest allowed difference from the full chain
+    degree (int): the degree of the series
+    holdout (float): the fraction of the points kept out of the fit to check it
+    seed (int): seed for choosing the held out points
+    Returns:
+    CompressedZipper
+    Raises:
+    ValueError if too few points are given to fit the series
+    '''
+    z = np.asarray(points, dtype=np.complex128).reshape(-1)
+    if len(z) * (1 - holdout) < 2 * (degree + 1):
+        raise ValueError(f'At least {int(np.ceil(2 * (degree + 1) / (1 - holdout)))} points are needed for degree {degree}.')
+    order = np.random.default_rng(seed).permutation(len(z))
+    held = order < int(len(z) * holdout)
+    expected = zipper.forward(z)
+
+    # The images of the points every step stages, from which each candidate is replayed
+    n = len(zipper.maps)
+    step = max(int(np.sqrt(n)), 1)
+    checkpoints = np.empty((n // step + 1, len(z)), dtype=np.complex128)
+    w = zipper.initial_map(z)
+    checkpoints[0] = w
+    for k, f in enumerate(zipper.maps):
+        f.apply(w, out=w)
+        if (k + 1) % step == 0:
+            checkpoints[(k + 1) // step] = w
+
+    def attempt(stages: int):
+        w = checkpoints[stages // step].copy()
+        for f in zipper.maps[stages // step * step:stages]:
+            f.apply(w, out=w)
+        return _fit(w[~held], expected[~held], w[held], expected[held], degree)
+
+    # Keeping every stage only replaces the final and disk maps, which is returned with
+    # its bound even if it misses tol; from there the number of stages replaced is
+    # doubled while the fit holds, then narrowed down by bisection
+    best = (n, attempt(n))
+    replaced = 1
+    while replaced <= n:
+        fit = attempt(n - replaced)
+        if fit[3] > tol:
+            break
+        best = (n - replaced, fit)
+        replaced *= 2
+    low, high = n - min(replaced, n + 1), best[0]
+    while high - low > 1:
+        middle = (low + high) // 2
+        fit = attempt(middle)
+        if fit[3] <= tol:
+            best, high = (middle, fit), middle
+        else:
+            low = middle
+
+    stages, (center, radius, coefficients, error) = best
+    if error > tol:
+        warnings.warn(f'The series misses tol = {tol:g} even with every stage kept; its error bound is {error:g}.')
+    return CompressedZipper(zipper, stages, center, radius, coefficients, error)
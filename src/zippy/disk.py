@@ -0,0 +1,333 @@
+'''
+disk.py
+Complex disk arithmetic on arrays, for certified error bounds on mapped points.
+
+A DiskArray holds a center and a radius for every point, and stands for every
+complex number within the radius of the center. Every operation returns disks
+that contain every possible result, including the rounding error of computing
+the new centers in float64. NumPy cannot change the rounding mode, so the
+radii are rounded outward by scaling them up by a bound on the relative
+rounding error of the operations that computed them.
+'''
+
+import functools
+import numpy as np
+from typing import Tuple, Union
+from zippy.utils import f3sqrt
+
+# The unit roundoff of float64 and the smallest positive float64
+EPS = 2.0 ** -53
+TINY = np.finfo(np.float64).smallest_subnormal
+
+def _up(x: np.ndarray, flops: int) -> np.ndarray:
+    '''
+    Bounds from above a nonnegative value that was computed with the given
+    number of correctly rounded operations on nonnegative numbers.
+    '''
+    return x * (1 + 2 * flops * EPS) + TINY
+
+def _down(x: np.ndarray, flops: int) -> np.ndarray:
+    '''
+    Bounds from below a nonnegative value, as _up does from above.
+    '''
+    return np.maximum(x * (1 - 2 * flops * EPS) - TINY, 0.0)
+
+class DiskArray:
+
+    '''
+    An array of complex disks, given by their centers and radii.
+    '''
+
+    __slots__ = ('center', 'radius')
+
+    # NumPy scalars and arrays defer to the operators below instead of broadcasting over them
+    __array_ufunc__ = None
+
+    def __init__(self, center: Union[complex, np.ndarray], radius: Union[float, np.ndarray] = None):
+        '''
+        Constructor.
+        Parameters:
+        center (complex or np.ndarray): the centers, taken as exact
+        radius (float or np.ndarray): the radii, otherwise 0
+        '''
+        self.center = np.asarray(center, dtype=np.complex128)
+        if radius is None:
+            self.radius = np.zeros(self.center.shape, dtype=np.float64)
+        else:
+            self.radius = np.broadcast_to(np.asarray(radius, dtype=np.float64), self.center.shape).copy()
+        self._cover()
+
+    def _cover(self):
+        '''
+        A disk around a point that overflowed, or whose radius could not be
+        computed, contains everything.
+        '''
+        self.radius[~np.isfinite(self.center) | np.isnan(self.radius)] = np.inf
+
+    @staticmethod
+    def _pair(center: np.ndarray, radius: np.ndarray) -> 'DiskArray':
+        '''
+        Returns disks from arrays of the same shape that the operations below have
+        just computed, without the copies of the constructor. Their radii grow with
+        the modulus of the center, so they are already infinite or NaN wherever the
+        center is not finite, and only NaN radii need to be covered.
+        '''
+        disks = DiskArray.__new__(DiskArray)
+        disks.center = center
+        disks.radius = radius
+        radius[np.isnan(radius)] = np.inf
+        return disks
+
+    @staticmethod
+    def _wrap(x) -> 'DiskArray':
+        return x if isinstance(x, DiskArray) else DiskArray(x)
+
+    def _sum(self, center: np.ndarray, other: 'DiskArray') -> 'DiskArray':
+        # Each part of the sum is off by at most EPS times itself
+        radius = np.abs(center)
+        radius *= EPS
+        radius += self.radius
+        radius += other.radius
+        return self._pair(center, _up(radius, 4))
+
+    def __add__(self, other) -> 'DiskArray':
+        other = self._wrap(other)
+        return self._sum(self.center + other.center, other)
+
+    __radd__ = __add__
+
+    def __neg__(self) -> 'DiskArray':
+        return DiskArray(-self.center, self.radius)
+
+    def __sub__(self, other) -> 'DiskArray':
+        other = self._wrap(other)
+        return self._sum(self.center - other.center, other)
+
+    def __rsub__(self, other) -> 'DiskArray':
+        other = self._wrap(other)
+        return self._sum(other.center - self.center, other)
+
+    def __mul__(self, other) -> 'DiskArray':
+        other = self._wrap(other)
+        center = self.center * other.center
+
+        # (c_1 + d_1)(c_2 + d_2) - c_1 c_2 = c_1 d_2 + c_2 d_1 + d_1 d_2, and a complex
+        # product is off by at most 2 \sqrt{2} EPS |c_1| |c_2|
+        size_1 = np.abs(self.center)
+        size_2 = np.abs(other.center)
+        with np.errstate(invalid='ignore'):
+            radius = (size_1 * other.radius + size_2 * self.radius + self.radius * other.radius
+                      + 4 * EPS * size_1 * size_2)
+        return self._pair(center, _up(radius, 10))
+
+    __rmul__ = __mul__
+
+    def square(self) -> 'DiskArray':
+        '''
+        Returns disks that contain z^2 for every z in each disk, as self * self
+        does with one modulus instead of two.
+        '''
+        size = np.abs(self.center)
+        with np.errstate(invalid='ignore'):
+            radius = (2 * size + self.radius) * self.radius + 4 * EPS * size * size
+        return self._pair(self.center * self.center, _up(radius, 10))
+
+    def reciprocal(self) -> 'DiskArray':
+        '''
+        Returns disks that contain 1 / z for every z in each disk, with
+        infinite radius where a disk contains 0.
+        '''
+        x, y = self.center.real, self.center.imag
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            norm = x * x + y * y
+            center = np.empty_like(self.center)
+            center.real = x / norm
+            center.imag = -y / norm
+
+            # |1/z - 1/c| = |z - c| / (|c| |z|) <= r / (|c| (|c| - r)), and 1 / c
+            # is computed with a relative error of at most 4 EPS
+            size = np.abs(self.center)
+            gap = _down(size - self.radius, 2)
+            radius = _up(self.radius / _down(size * gap, 1) + 4 * EPS * np.abs(center), 6)
+        radius[~(gap > 0) | ~np.isfinite(radius)] = np.inf
+        return self._pair(center, radius)
+
+    def __truediv__(self, other) -> 'DiskArray':
+        return self * self._wrap(other).reciprocal()
+
+    def __rtruediv__(self, other) -> 'DiskArray':
+        return self._wrap(other) * self.reciprocal()
+
+    def __getitem__(self, index) -> 'DiskArray':
+        return DiskArray(self.center[index], self.radius[index])
+
+    def __setitem__(self, index, value):
+        value = self._wrap(value)
+        self.center[index] = value.center
+        self.radius[index] = value.radius
+
+    def __len__(self) -> int:
+        return len(self.center)
+
+    def conjugate(self) -> 'DiskArray':
+        return DiskArray(np.conj(self.center), self.radius)
+
+    def meets_cut(self, branch: str = 'f3') -> np.ndarray:
+        '''
+        Returns whether each disk meets the branch cut of a square root, which ends at 0.
+        Parameters:
+        branch (str): 'f3' for f3sqrt, with the cut along [0, \\infty), or
+        'principal' for np.sqrt, with the cut along (-\\infty, 0]
+        Returns:
+        np.ndarray: boolean flags
+        Raises:
+        ValueError for an unknown branch
+        '''
+        if branch == 'f3':
+            off_cut = self.center.real < 0
+        elif branch == 'principal':
+            off_cut = self.center.real > 0
+        else:
+            raise ValueError(f"branch must be 'f3' or 'principal', got {branch!r}")
+        distance = np.where(off_cut, np.abs(self.center), np.abs(self.center.imag))
+        return _down(distance, 1) <= _up(self.radius, 1)
+
+    def sqrt(self, branch: str = 'f3') -> 'DiskArray':
+        '''
+        Returns disks that contain the square root of every point in each disk.
+        Where a disk does not meet the branch cut, the branch is continuous on it
+        and |\\sqrt{z} - \\sqrt{c}| <= \\sqrt{|c|} (1 - \\sqrt{1 - r / |c|}) from the
+        binomial series. Where it meets the cut, the disk covers both roots.
+        Parameters:
+        branch (str): 'f3' or 'principal', see meets_cut
+        Returns:
+        DiskArray
+        Raises:
+        ValueError for an unknown branch
+        '''
+        meets_cut = self.meets_cut(branch)
+        root = f3sqrt(self.center) if branch == 'f3' else np.sqrt(self.center)
+
+        size = np.abs(self.center)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = _up(self.radius / _down(size, 1), 1)
+            scale = _down(np.sqrt(_down(size, 1)) * (1 + np.sqrt(_down(np.maximum(1 - ratio, 0), 1))), 4)
+            radius = self.radius / scale
+
+            # Every root of a point in the disk has modulus at most \\sqrt{|c| + r}
+            both = np.sqrt(size) + np.sqrt(_up(size + self.radius, 1))
+            radius = np.where(meets_cut, both, radius)
+
+            # f3sqrt and np.sqrt are off by at most 4 EPS relative
+            radius = _up(radius + 4 * EPS * np.abs(root), 8)
+        radius[~np.isfinite(radius)] = np.inf
+        return self._pair(root, radius)
+
+    def contains(self, z: np.ndarray) -> np.ndarray:
+        '''
+        Returns whether each point is in its disk.
+        '''
+        return np.abs(np.asarray(z) - self.center) <= self.radius
+
+def constants_disk(f) -> Tuple[DiskArray, DiskArray]:
+    '''
+    Returns disks around b = |a|^2 / Re a and c = |a|^2 / Im a of a map F_a,
+    whose base point a is taken as exact.
+    Parameters:
+    f (F_a): the map
+    Returns:
+    DiskArray: b, None when Re a = 0 and b = \\infty
+    DiskArray: c
+    '''
+    return _constants(complex(f.a))[:2]
+
+@functools.lru_cache(maxsize=1 << 16)
+def _constants(a: complex) -> Tuple[DiskArray, DiskArray, DiskArray]:
+    '''
+    Returns the disks of constants_disk and a disk around b^2 + c^2, computed once
+    for each a, since a chain applies the same stages to every batch of points.
+    The disks are shared, so they must not be changed.
+    '''
+    real = DiskArray(np.array([a.real]))
+    imag = DiskArray(np.array([a.imag]))
+    modulus = real.square() + imag.square()
+    b = None if a.real == 0 else modulus / real
+    c = modulus / imag
+    return b, c, None if b is None else b.square() + c.square()
+
+def initial_map_disk(z: DiskArray, z0: complex, z1: complex) -> DiskArray:
+    '''
+    Disk version of Zipper.initial_map, \\sqrt{(z - z_1) / (z_0 - z)} with the root
+    taken by f3sqrt. As in apply_disk, the quotient is evaluated at the centers and
+    its radius grown by the mean value form, with the derivative (z_0 - z_1) / (z_0 - z)^2.
+    Parameters:
+    z (DiskArray): disks to apply the map to
+    z0 (complex): the boundary point sent to \\infty
+    z1 (complex): the boundary point sent to 0
+    Returns:
+    DiskArray
+    '''
+    point = DiskArray(z.center)
+    h = (point - z1) / (z0 - point)
+    if np.any(z.radius > 0):
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            gap = _down(_down(np.abs(z0 - z.center), 3) - z.radius, 2)
+            slope = _up(_up(abs(z0 - z1), 3) / gap ** 2, 4)
+            slope[~(gap > 0)] = np.inf
+            h = DiskArray(h.center, _up(h.radius + z.radius * slope, 2))
+    return h.sqrt('f3')
+
+def apply_disk(f, z: DiskArray, on_axis: np.ndarray = None) -> DiskArray:
+    '''
+    Disk version of F_a.apply. Away from the axis the root is f3sqrt, and on the axis
+    it is the principal root times the sign of Re f_1(z); where that sign is not
+    determined by the disk, the result covers both signs.
+    Going one operation at a time would count every appearance of z separately, which
+    overestimates badly where the terms cancel, and compounds over a chain. So
+    g(z) = f_2(f_1(z)) is evaluated at the centers, and the radius is grown by the mean
+    value form |g(z) - g(c)| <= r \\max |g'|, with g'(z) = 2 b^3 z / (b - z)^3,
+    before the root is taken in disk arithmetic.
+    Parameters:
+    f (F_a): the map
+    z (DiskArray): disks to apply the map to
+    on_axis (np.ndarray): optional boolean flags for points on the real axis,
+    otherwise every center in the closed upper half plane
+    Returns:
+    DiskArray: disks that contain f_a of every point of each disk
+    '''
+    axis = z.center.imag >= 0 if on_axis is None else np.asarray(on_axis, dtype=bool)
+    b, c, scale = _constants(complex(f.a))
+    point = DiskArray(z.center)
+
+    # f_2(f_1(z)) = (b^2 + c^2) (z - a)(z - \\bar{a}) / (b - z)^2
+    g = (point - f.a) * (point - np.conj(f.a))
+    if b is not None:
+        g = g * scale / (b - point).square()
+
+    if np.any(z.radius > 0):
+        size = _up(np.abs(z.center) + z.radius, 2)
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            if b is None:
+                slope = 2 * size
+            else:
+                # |b - z| is at least the distance between the centers less both radii
+                gap = _down(_down(np.abs(b.center - z.center), 3) - z.radius - b.radius, 2)
+                modulus = _up(np.abs(b.center) + b.radius, 2)
+                slope = _up(2 * modulus ** 3 * size / gap ** 3, 8)
+                slope[~(gap > 0)] = np.inf
+            g = DiskArray(g.center, _up(g.radius + z.radius * slope, 2))
+
+    out = g.sqrt('f3')
+    if np.any(axis):
+        on_axis = z[axis]
+        roots = g[axis].sqrt('principal')
+        f1 = on_axis if b is None else on_axis * b / (b - on_axis)
+        f1_real = f1.center.real
+        negative = f1_real < 0
+        roots.center[negative] = -roots.center[negative]
+
+        # The sign of Re f_1(z) changes inside the disk, so the image may be either root
+        unknown = np.abs(f1_real) <= f1.radius
+        roots.radius[unknown] = _up(2 * np.abs(roots.center[unknown]) + roots.radius[unknown], 3)
+        out[axis] = roots
+    return out
@@ -2,10 +2,64 @@
 f_a.py
 '''
 
-from zippy.point import Point
+from zippy.point import Point, PointArray
 import numpy as np
-from typing import List
-from zippy.utils import sign, f3sqrt
+from typing import List, Tuple, Union
+from zippy.utils import sign, f3sqrt, as_complex
+
+def _complex_divide(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    '''
+    Elementwise complex division a / b using the same sequence of
+    floating point operations as Python's built-in complex division.
+    NumPy multiplies by a reciprocal instead, which can differ from the
+    scalar path in the last bit.
+    Parameters:
+    a (np.ndarray): numerators
+    b (np.ndarray): denominators
+    Returns:
+    np.ndarray: a / b
+    '''
+    a = np.asarray(a, dtype=np.complex128)
+    b = np.asarray(b, dtype=np.complex128)
+    a_re, a_im = a.real, a.imag
+    b_re, b_im = b.real, b.imag
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # |Re b| >= |Im b|: scale by Im b / Re b
+        ratio = b_im / b_re
+        denom = b_re + b_im * ratio
+        real_major = np.empty(a.shape if a.ndim >= b.ndim else b.shape, dtype=np.complex128)
+        real_major.real = (a_re + a_im * ratio) / denom
+        real_major.imag = (a_im - a_re * ratio) / denom
+
+        # |Im b| > |Re b|: scale by Re b / Im b
+        ratio = b_re / b_im
+        denom = b_re * ratio + b_im
+        imag_major = np.empty_like(real_major)
+        imag_major.real = (a_re * ratio + a_im) / denom
+        imag_major.imag = (a_im * ratio - a_re) / denom
+
+    return np.where(np.abs(b_re) >= np.abs(b_im), real_major, imag_major)
+
+def _broadcast_flags(z: np.ndarray,
+                     is_origin: np.ndarray,
+                     on_axis: np.ndarray,
+                     on_arc: np.ndarray,
+                     branch_sign: np.ndarray) -> Tuple[np.ndarray, ...]:
+    '''
+    Fills in missing flag arrays with the defaults used by Point and
+    checks that every array has the shape of z.
+    Returns:
+    Tuple[np.ndarray, ...]: (is_origin, on_axis, on_arc, branch_sign)
+    '''
+    is_origin = np.zeros(z.shape, dtype=bool) if is_origin is None else np.asarray(is_origin, dtype=bool)
+    on_axis = np.zeros(z.shape, dtype=bool) if on_axis is None else np.asarray(on_axis, dtype=bool)
+    on_arc = np.zeros(z.shape, dtype=bool) if on_arc is None else np.asarray(on_arc, dtype=bool)
+    branch_sign = np.zeros(z.shape, dtype=np.int8) if branch_sign is None else np.asarray(branch_sign, dtype=np.int8)
+    for flag in (is_origin, on_axis, on_arc, branch_sign):
+        if flag.shape != z.shape:
+            raise ValueError(f'Flag array of shape {flag.shape} does not match points of shape {z.shape}')
+    return is_origin, on_axis, on_arc, branch_sign
 
 class F_a:
 
@@ -13,27 +67,54 @@ class F_a:
     The map f_a as defined in the Geodisc algorithm.
     '''
 
-    def __init__(self, a: complex):
+    # Relative distance from w^2 to c^2 within which apply_inverse sends a real point to 0
+    SNAP = 64 * np.finfo(np.float64).eps
+
+    def __init__(self, a: Union[Point, complex]):
         '''
         Constructor.
         Parameters:
-        a (complex): the base point of the map
+        a (Point or complex): the base point of the map
         '''
 
-        self.a = a.z
-        self.b = (np.abs(self.a) ** 2) / self.a.real
-        self.c = (np.abs(self.a) ** 2) / self.a.imag
+        self.a = a.z if isinstance(a, Point) else complex(a)
+
+        # b = \infty when a is on the imaginary axis
+        with np.errstate(divide='ignore'):
+            self.b = (np.abs(self.a) ** 2) / self.a.real
+            self.c = (np.abs(self.a) ** 2) / self.a.imag
+
+    @classmethod
+    def from_constants(cls, a: complex, b: float, c: float) -> 'F_a':
+        '''
+        Builds the map from constants that were already computed by the
+        constructor, for instance in another process, without recomputing them.
+        Parameters:
+        a (complex): the base point of the map
+        b (float), c (float): the constants of the map for a
+        Returns:
+        F_a
+        '''
+        f = cls.__new__(cls)
+        f.a = complex(a)
+        f.b = np.float64(b)
+        f.c = np.float64(c)
+        return f
 
-    def f1(self, p: Point) -> Point:
+    def f1(self, p: Union[Point, PointArray]) -> Union[Point, PointArray]:
         '''
         Applies the Mobius map f_1(z) = \frac{z}{1- \frac{z}{b}}
         to the given point.
         Parameters:
-        p (Point): point to apply map to
+        p (Point or PointArray): point(s) to apply map to
         Returns:
-        Point: f_1(p.z)
+        Point or PointArray: f_1(p.z)
         '''
 
+        if isinstance(p, PointArray):
+            return PointArray.from_flags(*self.f1_array(p.z, p.is_origin, p.on_axis, p.on_arc, p.branch_sign),
+                                         names = p.names)
+
         # f_1(b) = \inf
         if p.z == self.b:
             return Point(z=complex(np.inf, 0)) # FIXME: How do we want to handle this?
@@ -61,14 +142,19 @@ class F_a:
 
         
 
-    def f2(self, p: Point) -> Point:
+    def f2(self, p: Union[Point, PointArray]) -> Union[Point, PointArray]:
         '''
         Applies the map f_2(z) = z^2 + c^2 to the given point.
         Parameters:
-        p (Point): point to apply map to
+        p (Point or PointArray): point(s) to apply map to
         Returns:
-        Point: f_2(p.z)
+        Point or PointArray: f_2(p.z)
         '''
+
+        if isinstance(p, PointArray):
+            return PointArray.from_flags(*self.f2_array(p.z, p.is_origin, p.on_axis, p.on_arc, p.branch_sign),
+                                         names = p.names)
+
         z = p.z ** 2 + self.c ** 2
 
         # Note that we do not update the is_origin flag, as
@@ -82,18 +168,30 @@ class F_a:
                      name = p.name,
                      branch_sign = p.branch_sign)
 
-    def f3(self, p: Point) -> List[Point]:
+    def f3(self, p: Union[Point, PointArray]) -> Union[List[Point], List[PointArray]]:
         '''
         Applies the map f_3(z) = \sqrt{z} with the branch
         cut along the real axis.
+        For a PointArray, the first array holds the first branch of every point
+        and the second array, if present, holds the second branch of only those
+        points that are multivalued.
         Parameters:
-        p (Point): point to apply map to
+        p (Point or PointArray): point(s) to apply map to
         Returns:
-        List[Point]: f_3(z), result of map, potentially multivalued
+        List[Point] or List[PointArray]: f_3(z), result of map, potentially multivalued
         Raises:
         ValueError if the origin is encountered without is_origin flag
         '''
 
+        if isinstance(p, PointArray):
+            z, is_origin, on_axis, on_arc, branch_sign, split = self.f3_array(p.z, p.is_origin, p.on_axis, p.on_arc, p.branch_sign)
+            results = [PointArray.from_flags(z, is_origin, on_axis, on_arc, branch_sign, names = p.names)]
+            if np.any(split):
+                results.append(PointArray.from_flags(-z[split], is_origin[split], on_axis[split], on_arc[split],
+                                                     -branch_sign[split],
+                                                     names = None if p.names is None else p.names[split]))
+            return results
+
         if p.z == 0 and not p.is_origin:
             raise ValueError("Unexpected: zero encountered in f3 from non-origin point.")
 
@@ -108,15 +206,16 @@ class F_a:
             # When we do not use the standard one, the wrong branch is assigned.
             # The square root function with the branch cut along (0, \infty) is f3sqrt
             sqrt_val = np.sqrt(p.z)
-            print(f'the square root value is: {sqrt_val} when the input is {p.z}')
             return [
                 Point(z = sqrt_val, is_origin = False, name = p.name, branch_sign = 1),
                 Point(z = -sqrt_val, is_origin = False, name = p.name, branch_sign = -1)
             ]
         
         elif p.on_axis:
-            
-            sqrt_val = p.branch_sign * f3sqrt(p.z)
+
+            # Points on the axis lie on the branch cut after f_2, so the side
+            # they came from is given by the branch sign rather than f3sqrt
+            sqrt_val = p.branch_sign * np.sqrt(p.z)
             return [
                 Point(z = sqrt_val, is_origin = False, on_axis = True, branch_sign = p.branch_sign, name = p.name)
             ]
@@ -125,5 +224,497 @@ class F_a:
             # Defaults to the principal branch for all non-axis values
             sqrt_val = f3sqrt(p.z)
             return [
-                Point(z = sqrt_val, is_origin = False, on_axis = False, branch_sign = sign, name = p.name)
-            ]
\ No newline at end of file
+                Point(z = sqrt_val, is_origin = False, on_axis = False, branch_sign = p.branch_sign, name = p.name)
+            ]
+
+    '''
+    Batch versions of f_1, f_2 and f_3.
+    Each takes an array of points z together with parallel arrays for the
+    is_origin, on_axis, on_arc and branch_sign attributes of Point, and
+    returns the same five arrays for the image. Entry i of the output agrees
+    exactly with the Point returned by the scalar map for entry i of the input.
+    '''
+
+    def f1_array(self,
+                 z: np.ndarray,
+                 is_origin: np.ndarray = None,
+                 on_axis: np.ndarray = None,
+                 on_arc: np.ndarray = None,
+                 branch_sign: np.ndarray = None,
+                 dz: np.ndarray = None) -> Tuple[np.ndarray, ...]:
+        '''
+        Applies f_1(z) = \\frac{z}{1- \\frac{z}{b}} to an array of points.
+        Parameters:
+        z (np.ndarray): points to apply map to
+        is_origin, on_axis, on_arc (np.ndarray): boolean flags for each point
+        branch_sign (np.ndarray): branch multiplier for each point
+        dz (np.ndarray): optional derivatives, multiplied in place by f_1'(z) = \\frac{b^2}{(b - z)^2}
+        Returns:
+        Tuple[np.ndarray, ...]: (z, is_origin, on_axis, on_arc, branch_sign) of f_1(z)
+        '''
+        z = np.asarray(z, dtype=np.complex128)
+        is_origin, on_axis, on_arc, branch_sign = _broadcast_flags(z, is_origin, on_axis, on_arc, branch_sign)
+
+        # z / b is exact in the real and imaginary parts since b is real
+        scaled = np.empty_like(z)
+        scaled.real = z.real / self.b
+        scaled.imag = z.imag / self.b
+        w = _complex_divide(z, 1 - scaled)
+        new_sign = sign(w)
+
+        # f_1(b) = \inf, which drops all of the flags of the original point
+        at_b = z == self.b
+        if np.any(at_b):
+            w[at_b] = complex(np.inf, 0)
+            is_origin = np.where(at_b, False, is_origin)
+            on_axis = np.where(at_b, True, on_axis)
+            on_arc = np.where(at_b, False, on_arc)
+            new_sign[at_b] = 0
+
+        # f_1 is the identity when b = \\infty
+        if dz is not None and np.isfinite(self.b):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dz *= self.b ** 2 / (self.b - z) ** 2
+        return w, is_origin.copy(), on_axis.copy(), on_arc.copy(), new_sign
+
+    def f2_array(self,
+                 z: np.ndarray,
+                 is_origin: np.ndarray = None,
+                 on_axis: np.ndarray = None,
+                 on_arc: np.ndarray = None,
+                 branch_sign: np.ndarray = None,
+                 dz: np.ndarray = None) -> Tuple[np.ndarray, ...]:
+        '''
+        Applies f_2(z) = z^2 + c^2 to an array of points.
+        Parameters:
+        z (np.ndarray): points to apply map to
+        is_origin, on_axis, on_arc (np.ndarray): boolean flags for each point
+        branch_sign (np.ndarray): branch multiplier for each point
+        dz (np.ndarray): optional derivatives, multiplied in place by f_2'(z) = 2z
+        Returns:
+        Tuple[np.ndarray, ...]: (z, is_origin, on_axis, on_arc, branch_sign) of f_2(z)
+        '''
+        z = np.asarray(z, dtype=np.complex128)
+        is_origin, on_axis, on_arc, branch_sign = _broadcast_flags(z, is_origin, on_axis, on_arc, branch_sign)
+
+        # The square is expanded into real arithmetic since NumPy's complex
+        # multiply may fuse operations and round differently than Python
+        w = np.empty_like(z)
+        w.real = z.real * z.real - z.imag * z.imag
+        w.imag = z.real * z.imag + z.imag * z.real
+        w += self.c ** 2
+        if dz is not None:
+            dz *= 2 * z
+        return w, is_origin.copy(), on_axis.copy(), on_arc.copy(), branch_sign.copy()
+
+    def f3_array(self,
+                 z: np.ndarray,
+                 is_origin: np.ndarray = None,
+                 on_axis: np.ndarray = None,
+                 on_arc: np.ndarray = None,
+                 branch_sign: np.ndarray = None,
+                 dz: np.ndarray = None) -> Tuple[np.ndarray, ...]:
+        '''
+        Applies f_3(z) = \\sqrt{z} to an array of points.
+        The arrays returned hold the first branch that f3 would return for
+        each point. Points that are the origin or on the arc have a second
+        branch, which is always the negation of the first; these are marked
+        in the returned split mask.
+        Parameters:
+        z (np.ndarray): points to apply map to
+        is_origin, on_axis, on_arc (np.ndarray): boolean flags for each point
+        branch_sign (np.ndarray): branch multiplier for each point
+        dz (np.ndarray): optional derivatives, multiplied in place by f_3'(z) = \\frac{1}{2 f_3(z)}
+        for the first branch, the second branch of split points has the negation
+        Returns:
+        Tuple[np.ndarray, ...]: (z, is_origin, on_axis, on_arc, branch_sign, split) of f_3(z)
+        Raises:
+        ValueError if the origin is encountered without is_origin flag
+        '''
+        z = np.asarray(z, dtype=np.complex128)
+        is_origin, on_axis, on_arc, branch_sign = _broadcast_flags(z, is_origin, on_axis, on_arc, branch_sign)
+
+        if np.any((z == 0) & ~is_origin):
+            raise ValueError("Unexpected: zero encountered in f3 from non-origin point.")
+
+        split = is_origin | on_arc
+        axis = on_axis & ~split
+
+        # Every point that is not split or on the axis uses the custom branch cut,
+        # points on the axis take their branch sign instead
+        w = f3sqrt(z)
+        w = np.where(axis, branch_sign * np.sqrt(z), w)
+        w = np.where(split, np.sqrt(z), w)
+
+        # Split points restart with branch sign 1 and only land on the axis if the root is real
+        new_axis = np.where(split, w.imag == 0, axis)
+        new_sign = np.where(split, 1, branch_sign).astype(np.int8)
+
+        if dz is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dz /= 2 * w
+        return w, np.zeros(z.shape, dtype=bool), new_axis, np.zeros(z.shape, dtype=bool), new_sign, split
+
+    def apply(self,
+              z: np.ndarray,
+              out: np.ndarray = None,
+              on_axis: np.ndarray = None,
+              on_arc: np.ndarray = None,
+              dz: np.ndarray = None,
+              workspace=None) -> np.ndarray:
+        '''
+        Applies the whole map f_a(z) = \\sqrt{(\\frac{z}{1 - z/b})^2 + c^2}
+        to an array of points, giving the first branch that f3(f2(f1(p))) would.
+        Rather than squaring f_1(z) and adding c^2, which loses all precision
+        near the base point a where f_1(z)^2 is close to -c^2, this uses
+        f_2(f_1(z)) = (b^2 + c^2) \\frac{(z - a)(z - \\bar{a})}{(b - z)^2}
+        so that f_a(a) = 0 exactly. When b = \\infty, this is (z - a)(z - \\bar{a}).
+        Branches follow f3: points on the arc take the principal root, and points
+        on the axis take the principal root times the sign of Re f_1(z). If on_axis
+        is not given, every point of the closed upper half plane is treated as on
+        the axis, since f_a is only defined on the lower half plane.
+        If dz is given, it holds the derivative of z with respect to some variable
+        and is multiplied in place by f_a'(z), see derivative.
+        Single precision input is computed in single precision, for previews.
+        With a workspace, every temporary array is taken from it, so that
+        no array is allocated, see _apply_workspace.
+        Parameters:
+        z (np.ndarray): points to apply map to
+        out (np.ndarray): optional array to write the result into, may be z
+        on_axis (np.ndarray): optional boolean flags for points on the real axis
+        on_arc (np.ndarray): optional boolean flags for points on the arc or the origin
+        dz (np.ndarray): optional derivatives to carry through the map in place
+        workspace (Workspace): optional temporary arrays, see zippy.workspace
+        Returns:
+        np.ndarray: f_a(z)
+        Raises:
+        ValueError if the workspace is for another dtype, or z is not 1D with a workspace
+        '''
+        z = as_complex(z)
+        if out is None:
+            out = np.empty_like(z)
+        if workspace is not None:
+            return self._apply_workspace(z, out, on_axis, on_arc, dz, workspace)
+
+        # The constants in the precision of z, so that single precision stays single
+        b = z.real.dtype.type(self.b)
+        scale = z.real.dtype.type(self.b ** 2 + self.c ** 2)
+
+        # Everything that needs z is read before out is written, in case out is z
+        axis = z.imag >= 0 if on_axis is None else np.asarray(on_axis, dtype=bool)
+        if on_arc is not None:
+            on_arc = np.asarray(on_arc, dtype=bool)
+            axis = axis & ~on_arc
+        z_axis = z[axis]
+        at_inf = np.isinf(z)
+        at_b = z == self.b
+        finite_b = np.isfinite(self.b)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            other = np.subtract(z, self.a.conjugate())
+            if finite_b:
+                denom = np.subtract(b, z)
+                np.divide(other, denom, out=other)
+            if dz is not None:
+                # f_a'(z) f_a(z) = b^3 z / (b - z)^3, divided by f_a(z) once it is known
+                np.multiply(dz, z, out=dz)
+                if finite_b:
+                    dz *= self.b ** 3
+                    dz /= denom ** 3
+            np.subtract(z, self.a, out=out)
+            if finite_b:
+                np.divide(out, denom, out=out)
+            np.multiply(out, other, out=out)
+            if finite_b:
+                np.multiply(out, scale, out=out)
+
+        if finite_b:
+            # f_2(f_1(\infty)) = f_2(-b) = b^2 + c^2 and f_2(f_1(b)) = \infty
+            out[at_inf] = scale
+            out[at_b] = complex(np.inf, 0)
+
+            # Sign of Re f_1(z) = b (b Re z - |z|^2) / |b - z|^2, which is -b at \infty
+            with np.errstate(invalid='ignore'):
+                f1_real = self.b * (self.b * z_axis.real - (z_axis.real ** 2 + z_axis.imag ** 2))
+            f1_real[np.isinf(z_axis)] = -self.b
+        else:
+            # When a is on the imaginary axis, b = \infty and f_1 is the identity
+            out[at_inf] = complex(np.inf, 0)
+            f1_real = z_axis.real
+
+        roots_axis = np.sqrt(out[axis])
+        np.negative(roots_axis, out=roots_axis, where=f1_real < 0)
+
+        # f_a sends the real axis to itself, so rounding must not move real points off of it
+        roots_axis.imag[z_axis.imag == 0] = 0
+        roots_arc = None if on_arc is None else np.sqrt(out[on_arc])
+        f3sqrt(out, out=out)
+        out[axis] = roots_axis
+        if on_arc is not None:
+            out[on_arc] = roots_arc
+        if dz is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dz /= out
+            dz[at_b] = complex(np.inf, 0)
+        return out
+
+    def _apply_workspace(self, z: np.ndarray, out: np.ndarray, on_axis: np.ndarray,
+                         on_arc: np.ndarray, dz: np.ndarray, workspace) -> np.ndarray:
+        '''
+        apply, with every temporary array taken from a workspace. The same operations
+        are done in the same order, so the result is the same to the bit, but the
+        points on the axis and the arc are picked out with masks rather than
+        by indexing, which would copy them.
+        '''
+        if z.ndim != 1:
+            raise ValueError(f'A workspace needs a 1D array of points, got shape {z.shape}.')
+        if workspace.dtype != z.dtype:
+            raise ValueError(f'The workspace is for {workspace.dtype}, the points are {z.dtype}.')
+        ws = workspace(len(z))
+        b = z.real.dtype.type(self.b)
+        scale = z.real.dtype.type(self.b ** 2 + self.c ** 2)
+        finite_b = np.isfinite(self.b)
+        x = z.real
+        y = z.imag
+
+        # Everything that needs z is read before out is written, in case out is z
+        if on_axis is None:
+            np.greater_equal(y, 0, out=ws.axis)
+        else:
+            np.copyto(ws.axis, on_axis)
+        if on_arc is not None:
+            # axis & ~on_arc, without allocating ~on_arc
+            np.greater(ws.axis, on_arc, out=ws.axis)
+        np.equal(y, 0, out=ws.on_real)
+        np.logical_and(ws.on_real, ws.axis, out=ws.on_real)
+        np.isinf(z, out=ws.at_inf)
+        np.equal(z, self.b, out=ws.at_b)
+
+        # Re f_1(z) at every point, of which only the sign on the axis is used, see apply
+        if finite_b:
+            with np.errstate(invalid='ignore', over='ignore'):
+                np.square(x, out=ws.f1)
+                np.square(y, out=ws.big)
+                ws.f1 += ws.big
+                np.multiply(b, x, out=ws.big)
+                np.subtract(ws.big, ws.f1, out=ws.f1)
+                ws.f1 *= self.b
+            np.copyto(ws.f1, -self.b, where=ws.at_inf)
+        else:
+            np.copyto(ws.f1, x)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            other = np.subtract(z, self.a.conjugate(), out=ws.other)
+            if finite_b:
+                denom = np.subtract(b, z, out=ws.denom)
+                np.divide(other, denom, out=other)
+            if dz is not None:
+                np.multiply(dz, z, out=dz)
+                if finite_b:
+                    dz *= self.b ** 3
+                    dz /= np.power(denom, 3, out=ws.power)
+            np.subtract(z, self.a, out=out)
+            if finite_b:
+                np.divide(out, denom, out=out)
+            np.multiply(out, other, out=out)
+            if finite_b:
+                np.multiply(out, scale, out=out)
+
+        if finite_b:
+            np.copyto(out, scale, where=ws.at_inf)
+            np.copyto(out, complex(np.inf, 0), where=ws.at_b)
+        else:
+            np.copyto(out, complex(np.inf, 0), where=ws.at_inf)
+
+        roots = ws.root
+        np.sqrt(out, out=roots, where=ws.axis)
+        np.less(ws.f1, 0, out=ws.negative)
+        np.logical_and(ws.negative, ws.axis, out=ws.negative)
+        np.negative(roots, out=roots, where=ws.negative)
+        np.copyto(roots.imag, 0, where=ws.on_real)
+        if on_arc is not None:
+            np.sqrt(out, out=roots, where=on_arc)
+        f3sqrt(out, out=out, workspace=ws)
+        np.copyto(out, roots, where=ws.axis)
+        if on_arc is not None:
+            np.copyto(out, roots, where=on_arc)
+        if dz is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dz /= out
+            np.copyto(dz, complex(np.inf, 0), where=ws.at_b)
+        return out
+
+    '''
+    Inverses of f_1, f_2, f_3 and of the whole map f_a, on arrays of points.
+    f_a sends the lower half plane minus the arc from 0 to a onto the lower
+    half plane, so every inverse returns points of the closed lower half plane.
+    '''
+
+    def f3_inverse(self, w: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Inverts f_3 by squaring. Points on the real axis were taken on the
+        side given by their branch sign, which is returned so that f2_inverse
+        can pick the same side.
+        Parameters:
+        w (np.ndarray): points to invert
+        Returns:
+        np.ndarray: w^2
+        np.ndarray: branch sign of each point, the sign of Re w
+        '''
+        w = np.asarray(w, dtype=np.complex128)
+        return w * w, sign(w)
+
+    def f2_inverse(self, v: np.ndarray, branch_sign: np.ndarray = None) -> np.ndarray:
+        '''
+        Inverts f_2(z) = z^2 + c^2 with the root in the lower half plane.
+        Where v - c^2 lies on the cut [0, \\infty), the real root is
+        taken with the given branch sign, otherwise it is positive.
+        Parameters:
+        v (np.ndarray): points to invert
+        branch_sign (np.ndarray): branch multiplier for each point
+        Returns:
+        np.ndarray: \\sqrt{v - c^2}
+        '''
+        v = np.asarray(v, dtype=np.complex128)
+        u = f3sqrt(v - self.c ** 2)
+        cut = (u.imag == 0) & (u.real != 0)
+        if branch_sign is not None:
+            u[cut] = np.abs(u.real[cut]) * np.asarray(branch_sign)[cut]
+        else:
+            u[cut] = np.abs(u.real[cut])
+        return u
+
+    def f1_inverse(self, w: np.ndarray) -> np.ndarray:
+        '''
+        Inverts the Mobius map f_1, f_1^{-1}(w) = \\frac{w}{1 + \\frac{w}{b}},
+        which sends -b to \\infty and \\infty to b.
+        Parameters:
+        w (np.ndarray): points to invert
+        Returns:
+        np.ndarray: f_1^{-1}(w)
+        '''
+        w = np.asarray(w, dtype=np.complex128)
+        if not np.isfinite(self.b):
+            return w.copy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = w / (1 + w / self.b)
+        z[w == -self.b] = complex(np.inf, 0)
+        z[np.isinf(w)] = self.b
+        return z
+
+    def derivative(self, z: np.ndarray, w: np.ndarray = None) -> np.ndarray:
+        '''
+        Returns f_a'(z). Since f_2(f_1(z)) = (b^2 + c^2) \\frac{(z - a)(z - \\bar{a})}{(b - z)^2}
+        and (b^2 + c^2)(b - Re a) = b^3, the chain rule gives
+        f_a'(z) = \\frac{b^3 z}{(b - z)^3 f_a(z)}, or \\frac{z}{f_a(z)} when b = \\infty.
+        Parameters:
+        z (np.ndarray): points to differentiate at
+        w (np.ndarray): f_a(z), if already known
+        Returns:
+        np.ndarray: f_a'(z)
+        '''
+        z = np.asarray(z, dtype=np.complex128)
+        if w is None:
+            w = self.apply(z)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if not np.isfinite(self.b):
+                return z / w
+            return self.b ** 3 * z / ((self.b - z) ** 3 * w)
+
+    def apply_inverse(self,
+                      w: np.ndarray,
+                      out: np.ndarray = None,
+                      polish: bool = True,
+                      tol: float = 1e-6) -> np.ndarray:
+        '''
+        Applies f_a^{-1}(w) = f_1^{-1}(\\sqrt{(w - c)(w + c)}) to an array of points,
+        which inverts apply. The factored form keeps w^2 - c^2 accurate near w = \\pm c,
+        the images of the two sides of the arc at 0. Real points with w^2 > c^2 are sent
+        back to the real axis on the side given by the sign of w.
+        Near w = \\pm c and near w = f_a(\\infty), the inverse is sensitive to rounding,
+        so points there are polished with Newton's method on f_a(z) = w.
+        The rest of the points are left as they are, so that the polish only
+        costs anything where it is needed.
+        Parameters:
+        w (np.ndarray): points to invert
+        out (np.ndarray): optional array to write the result into, may be w
+        polish (bool): whether to polish sensitive points with Newton's method
+        tol (float): relative distance of w^2 to c^2 or to f_a(\\infty)^2 below which a point is polished
+        Returns:
+        np.ndarray: f_a^{-1}(w)
+        '''
+        w = np.asarray(w, dtype=np.complex128)
+        if out is None:
+            out = np.empty_like(w)
+
+        # Everything that needs w is read before out is written, in case out is w
+        at_inf = np.isinf(w)
+        real = w.imag == 0
+        real_sign = sign(w[real])
+        with np.errstate(invalid='ignore'):
+            v = np.subtract(w, self.c)
+            v *= w + self.c
+        size = np.abs(v)
+        near = size < tol * self.c ** 2
+        if np.isfinite(self.b):
+            # f_a(\\infty) is the root of v = b^2, where f_1^{-1} has its pole
+            near |= np.abs(v - self.b ** 2) < tol * self.b ** 2
+        if polish:
+            near &= ~at_inf
+            target = w[near]
+
+        f3sqrt(v, out=out)
+        roots = out[real]
+        v_real = v.real[real]
+        cut = v_real >= 0
+        roots[cut] = real_sign[cut] * np.sqrt(v_real[cut])
+
+        # Real points within rounding of \\pm c are the base of the arc, as otherwise
+        # the square root would move them a distance \\sqrt{\\epsilon} c up the arc
+        roots[size[real] <= self.SNAP * self.c ** 2] = 0
+        out[real] = roots
+
+        if np.isfinite(self.b):
+            at_pole = out == -self.b
+            with np.errstate(divide='ignore', invalid='ignore'):
+                denom = np.divide(out, self.b)
+                denom += 1
+                np.divide(out, denom, out=out)
+            out[at_pole] = complex(np.inf, 0)
+            out[at_inf] = self.b
+        else:
+            out[at_inf] = complex(np.inf, 0)
+
+        if polish and np.any(near):
+            start = out[near]
+            finite = np.isfinite(start)
+            start[finite] = self._newton(start[finite], target[finite])
+            out[near] = start
+        return out
+
+    def _newton(self, z: np.ndarray, w: np.ndarray, steps: int = 3) -> np.ndarray:
+        '''
+        Polishes approximate solutions of f_a(z) = w with Newton's method,
+        keeping a step only if it reduces the residual and stays in the
+        closed lower half plane.
+        Parameters:
+        z (np.ndarray): starting points
+        w (np.ndarray): targets
+        steps (int): the number of Newton steps
+        Returns:
+        np.ndarray: the polished points
+        '''
+        z = z.copy()
+        fz = self.apply(z)
+        residual = np.abs(fz - w)
+        for _ in range(steps):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                step = z - (fz - w) / self.derivative(z, fz)
+            step.imag = np.minimum(step.imag, 0)
+            f_step = self.apply(step)
+            with np.errstate(invalid='ignore'):
+                better = np.abs(f_step - w) < residual
+            z[better] = step[better]
+            fz[better] = f_step[better]
+            residual[better] = np.abs(f_step - w)[better]
+        return z
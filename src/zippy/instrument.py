@@ -0,0 +1,165 @@
+'''
+instrument.py
+Opt-in recording of how each stage of the chain behaves.
+
+A hook is any callable hook(stage, f, z, w, seconds), called by Zipper.chain
+after map number stage, f, sent the points z to w in the given wall time.
+While no hook is registered, the chain runs exactly as it would without this module.
+'''
+
+import json
+import time
+import numpy as np
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List
+
+# The registered hooks, in the order they are called
+_hooks: List[Callable] = []
+
+def add_hook(hook: Callable):
+    '''
+    Registers a hook to be called after every stage of the chain.
+    Parameters:
+    hook (Callable): called as hook(stage, f, z, w, seconds)
+    '''
+    _hooks.append(hook)
+
+def remove_hook(hook: Callable):
+    '''
+    Unregisters a hook.
+    Parameters:
+    hook (Callable): a hook given to add_hook
+    Raises:
+    ValueError if the hook is not registered
+    '''
+    _hooks.remove(hook)
+
+def active() -> bool:
+    '''
+    Returns whether any hook is registered.
+    '''
+    return bool(_hooks)
+
+def run_stage(stage: int, f, w: np.ndarray, dz: np.ndarray = None, workspace=None):
+    '''
+    Applies one map of the chain in place and calls every hook with the
+    points before and after it. The map runs as it does without hooks, in the
+    precision of w and in the workspace if one is given, so the time measured is
+    that of the same code; only the copy of the points for the hooks is added.
+    Parameters:
+    stage (int): index of the map in the chain
+    f (F_a): the map
+    w (np.ndarray): points to apply the map to, overwritten by their images
+    dz (np.ndarray): optional derivatives, see F_a.apply
+    workspace (Workspace): optional temporary arrays, see F_a.apply
+    '''
+    z = w.copy()
+    start = time.perf_counter()
+    f.apply(w, out=w, dz=dz, workspace=workspace)
+    seconds = time.perf_counter() - start
+    for hook in _hooks:
+        hook(stage, f, z, w, seconds)
+
+@contextmanager
+def recording(**kwargs) -> Iterator['Recorder']:
+    '''
+    Registers a new Recorder for the duration of a with block.
+    Parameters:
+    kwargs: passed to Recorder
+    Returns:
+    Recorder
+    '''
+    recorder = Recorder(**kwargs)
+    add_hook(recorder)
+    try:
+        yield recorder
+    finally:
+        remove_hook(recorder)
+
+class Recorder:
+
+    '''
+    A hook that aggregates, for each stage, the wall time, the number of
+    points, the smallest and largest modulus of the images, the number of
+    images near the branch cut, and a histogram of the local condition number
+    |z f'(z) / f(z)|, which measures how much f magnifies relative errors in z.
+    Nothing is kept per point.
+    '''
+
+    def __init__(self, cut_tol: float = 1e-8, bins: np.ndarray = None):
+        '''
+        Constructor.
+        Parameters:
+        cut_tol (float): an image w is near the branch cut if it is off the
+        real axis by less than cut_tol |w|
+        bins (np.ndarray): edges of the histogram of log10 of the condition number,
+        otherwise half decades from 10^{-8} to 10^{8}
+        '''
+        self.cut_tol = cut_tol
+        self.bins = np.linspace(-8, 8, 33) if bins is None else np.asarray(bins, dtype=np.float64)
+        self.stages: Dict[int, Dict] = {}
+
+    def __call__(self, stage: int, f, z: np.ndarray, w: np.ndarray, seconds: float):
+        '''
+        Adds the points of one stage to the statistics.
+        '''
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = {'calls': 0, 'points': 0, 'seconds': 0.0,
+                     'min_modulus': np.inf, 'max_modulus': 0.0, 'near_cut': 0,
+                     'condition': np.zeros(len(self.bins) + 1, dtype=np.int64)}
+            self.stages[stage] = stats
+
+        stats['calls'] += 1
+        stats['points'] += len(w)
+        stats['seconds'] += seconds
+
+        with np.errstate(all='ignore'):
+            modulus = np.abs(w)
+            finite = np.isfinite(modulus)
+            if np.any(finite):
+                stats['min_modulus'] = min(stats['min_modulus'], float(np.min(modulus[finite])))
+                stats['max_modulus'] = max(stats['max_modulus'], float(np.max(modulus[finite])))
+            off_axis = -w.imag
+            stats['near_cut'] += int(np.count_nonzero((off_axis > 0) & (off_axis < self.cut_tol * modulus)))
+
+            # |z f'(z) / f(z)| from f'(z) = b^3 z / ((b - z)^3 f(z))
+            if np.isfinite(f.b):
+                condition = np.abs(f.b) ** 3 * np.abs(z) ** 2 / (np.abs(f.b - z) ** 3 * modulus ** 2)
+            else:
+                condition = np.abs(z) ** 2 / modulus ** 2
+            condition = np.log10(condition[np.isfinite(condition) & (condition > 0)])
+
+        # The first and last counts hold everything outside of the edges
+        stats['condition'] += np.bincount(np.searchsorted(self.bins, condition, side='right'),
+                                          minlength=len(self.bins) + 1)
+
+    def to_dict(self) -> Dict:
+        '''
+        Returns the statistics of every stage, in order of stage.
+        Returns:
+        Dict: with the histogram edges under 'condition_bins' and a list of stages under 'stages'
+        '''
+        stages = []
+        for stage in sorted(self.stages):
+            stats = dict(self.stages[stage])
+            stats['stage'] = stage
+            stats['condition'] = stats['condition'].tolist()
+            if stats['min_modulus'] == np.inf:
+                stats['min_modulus'] = None
+            stages.append(stats)
+        return {'condition_bins': self.bins.tolist(), 'stages': stages}
+
+    def to_json(self, path: str = None) -> str:
+        '''
+        Returns the statistics as JSON, see to_dict.
+        Parameters:
+        path (str): if given, the JSON is also written to this file
+        Returns:
+        str
+        '''
+        text = json.dumps(self.to_dict())
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write(text)
+        return text
@@ -0,0 +1,222 @@
+'''
+parallel.py
+Evaluation of a zipper map over large arrays of points on several cores.
+'''
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple, Union
+from zippy.workspace import thread_workspace
+from zippy.zipper import Zipper
+
+# State of a worker process, set once by _attach and reused for every chunk
+_worker: Dict = {}
+
+# The maps that can be evaluated, and the names of the arrays each one returns
+_OUTPUTS = {
+    'forward': ('output',),
+    'inverse': ('output',),
+    'forward_derivative': ('output', 'derivative'),
+}
+
+def _apply(zipper: Zipper, method: str, z: np.ndarray) -> Tuple[np.ndarray, ...]:
+    '''
+    Evaluates one of the maps in _OUTPUTS and returns its arrays as a tuple.
+    The forward chain runs in the worker's own workspace, which every chunk reuses.
+    '''
+    if method == 'forward_derivative':
+        return zipper.forward(z, derivative=True, workspace=thread_workspace(len(z)))
+    if method == 'forward':
+        return (zipper.forward(z, workspace=thread_workspace(len(z))),)
+    return (getattr(zipper, method)(z),)
+
+def _chunks(n: int, chunk_size: int) -> List[Tuple[int, int]]:
+    '''
+    Splits range(n) into consecutive (start, stop) pairs of at most chunk_size.
+    '''
+    return [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+
+def _share(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    '''
+    Copies an array into a new shared memory block.
+    Returns:
+    SharedMemory: the block, which the caller must close and unlink
+    np.ndarray: view of the block holding the copy
+    '''
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    view[...] = array
+    return block, view
+
+def _attach(layout: Dict[str, Tuple[str, Tuple[int, ...], str]],
+            scalars: Tuple[complex, complex, complex],
+            method: str = 'forward'):
+    '''
+    Initializer of a worker process: maps every shared array and rebuilds
+    the zipper from its constants once.
+    Parameters:
+    layout (Dict): name of each array -> (shared memory name, shape, dtype)
+    scalars (Tuple): interior point, image of z_0 and image of the interior point
+    method (str): a key of _OUTPUTS, the map every chunk is evaluated with
+    '''
+    blocks = {}
+    arrays = {}
+    for key, (name, shape, dtype) in layout.items():
+        blocks[key] = shared_memory.SharedMemory(name=name)
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=blocks[key].buf)
+
+    interior, zeta0, interior_image = scalars
+    _worker['blocks'] = blocks
+    _worker['arrays'] = arrays
+    _worker['method'] = method
+    _worker['zipper'] = Zipper.from_constants(arrays['boundary'], interior,
+                                              arrays['a'], arrays['b'], arrays['c'],
+                                              zeta0, interior_image)
+
+def _evaluate_chunk(bounds: Tuple[int, int]):
+    '''
+    Evaluates one chunk of the shared input into the shared output.
+    Parameters:
+    bounds (Tuple[int, int]): start and stop of the chunk
+    '''
+    start, stop = bounds
+    arrays = _worker['arrays']
+    method = _worker['method']
+    results = _apply(_worker['zipper'], method, arrays['input'][start:stop])
+    for key, result in zip(_OUTPUTS[method], results):
+        arrays[key][start:stop] = result
+
+class MapPool:
+
+    '''
+    A pool of worker processes that evaluate one map of a zipper over many arrays
+    in turn, as a stream of chunks needs. The constants of the chain and input and
+    output arrays of a fixed size are placed in shared memory once, and every
+    worker rebuilds the zipper from them once, so each array only costs copying
+    it in and out. The pool must be closed, or used as a context manager.
+    '''
+
+    def __init__(self, zipper: Zipper, size: int, workers: int = None, method: str = 'forward'):
+        '''
+        Constructor. Starts the workers.
+        Parameters:
+        zipper (Zipper): the map to evaluate
+        size (int): the most points in an array given to the pool
+        workers (int): number of processes, otherwise the number of CPUs
+        method (str): see evaluate
+        Raises:
+        ValueError for an unknown method
+        '''
+        if method not in _OUTPUTS:
+            raise ValueError(f"method must be one of {', '.join(_OUTPUTS)}, got {method!r}")
+        self.size = size
+        self.method = method
+        a, b, c = zipper.stage_constants()
+        arrays = {'boundary': zipper.boundary, 'a': a, 'b': b, 'c': c, 'input': np.zeros(size, dtype=np.complex128)}
+        for key in _OUTPUTS[method]:
+            arrays[key] = np.zeros(size, dtype=np.complex128)
+        self._blocks = {}
+        self._views = {}
+        self._pool = None
+        try:
+            for key, array in arrays.items():
+                self._blocks[key], self._views[key] = _share(np.ascontiguousarray(array))
+            layout = {key: (self._blocks[key].name, view.shape, view.dtype.str) for key, view in self._views.items()}
+            scalars = (zipper.interior, zipper.zeta0, zipper.interior_image)
+            self._pool = ProcessPoolExecutor(workers, initializer=_attach, initargs=(layout, scalars, method))
+        except BaseException:
+            self.close()
+            raise
+
+    def __call__(self, z: np.ndarray, chunk_size: int = 65536) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        '''
+        Evaluates the map over z, split into tasks of chunk_size points.
+        Parameters:
+        z (np.ndarray): at most size points
+        chunk_size (int): the number of points in each task
+        Returns:
+        np.ndarray: see evaluate
+        Raises:
+        ValueError if z has more than size points
+        '''
+        z = np.asarray(z, dtype=np.complex128)
+        flat = z.reshape(-1)
+        if len(flat) > self.size:
+            raise ValueError(f'The pool holds {self.size} points, {len(flat)} were given.')
+        self._views['input'][:len(flat)] = flat
+        list(self._pool.map(_evaluate_chunk, _chunks(len(flat), chunk_size)))
+        results = tuple(self._views[key][:len(flat)].reshape(z.shape).copy() for key in _OUTPUTS[self.method])
+        return results if len(results) > 1 else results[0]
+
+    def close(self):
+        '''
+        Stops the workers and frees the shared memory.
+        '''
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        for block in self._blocks.values():
+            block.close()
+            block.unlink()
+        self._blocks = {}
+        self._views = {}
+
+    def __enter__(self) -> 'MapPool':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def evaluate(zipper: Zipper,
+             z: np.ndarray,
+             workers: int = None,
+             executor: str = 'process',
+             chunk_size: int = 65536,
+             method: str = 'forward') -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+    '''
+    Evaluates zipper.forward, or zipper.inverse, over z in chunks on a pool of workers.
+    With processes, the constants of the chain and the input and output
+    arrays are placed in shared memory once, so each task only sends
+    the bounds of its chunk, see MapPool. With threads, every thread works on the
+    same arrays directly, which scales as far as NumPy releases the GIL.
+    Parameters:
+    zipper (Zipper): the map to evaluate
+    z (np.ndarray): points to apply the map to
+    workers (int): number of workers, otherwise the number of CPUs
+    executor (str): 'process' or 'thread'
+    chunk_size (int): the number of points in each task
+    method (str): 'forward', 'inverse', or 'forward_derivative' for forward with derivative
+    Returns:
+    np.ndarray: zipper.forward(z) or zipper.inverse(z)
+    np.ndarray: the derivative of the map, only for 'forward_derivative'
+    Raises:
+    ValueError for an unknown executor or method, or a chunk size that is not positive
+    '''
+    if executor not in ('process', 'thread'):
+        raise ValueError(f"executor must be 'process' or 'thread', got {executor!r}")
+    if method not in _OUTPUTS:
+        raise ValueError(f"method must be one of {', '.join(_OUTPUTS)}, got {method!r}")
+    if chunk_size < 1:
+        raise ValueError(f'chunk_size must be positive, got {chunk_size}')
+
+    z = np.asarray(z, dtype=np.complex128)
+    flat = z.reshape(-1)
+    bounds = _chunks(len(flat), chunk_size)
+
+    names = _OUTPUTS[method]
+
+    if executor == 'thread':
+        outputs = [np.empty_like(flat) for _ in names]
+
+        def evaluate_chunk(chunk: Tuple[int, int]):
+            for out, result in zip(outputs, _apply(zipper, method, flat[chunk[0]:chunk[1]])):
+                out[chunk[0]:chunk[1]] = result
+
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(evaluate_chunk, bounds))
+        results = tuple(out.reshape(z.shape) for out in outputs)
+        return results if len(results) > 1 else results[0]
+
+    with MapPool(zipper, len(flat), workers, method) as pool:
+        return pool(z, chunk_size)
@@ -2,7 +2,10 @@
 point.py
 '''
 
+import sys
 import warnings
+import numpy as np
+from typing import Iterator, List
 
 class Point:
     '''
@@ -58,4 +61,162 @@ class Point:
         if name == None:
             self.name = str(z)
         else:
-            self.name = name
\ No newline at end of file
+            self.name = name
+
+# Bits of the packed flag column of a PointArray
+IS_ORIGIN = np.uint8(1)
+ON_AXIS = np.uint8(2)
+ON_ARC = np.uint8(4)
+
+def pack_flags(is_origin: np.ndarray, on_axis: np.ndarray, on_arc: np.ndarray) -> np.ndarray:
+    '''
+    Packs the boolean point attributes into one uint8 array.
+    Parameters:
+    is_origin, on_axis, on_arc (np.ndarray): boolean flags for each point
+    Returns:
+    np.ndarray: uint8 flags, see IS_ORIGIN, ON_AXIS and ON_ARC
+    '''
+    flags = np.asarray(is_origin, dtype=np.uint8) * IS_ORIGIN
+    flags |= np.asarray(on_axis, dtype=np.uint8) * ON_AXIS
+    flags |= np.asarray(on_arc, dtype=np.uint8) * ON_ARC
+    return flags
+
+class PointArray:
+    '''
+    Defines a collection of points stored as columns rather than
+    as a list of Point objects.
+    Indexing with a slice returns a view that shares memory with this
+    array, while indexing with a mask or an index array returns a copy.
+    '''
+
+    def __init__(self,
+                 z: np.ndarray,
+                 *,
+                 flags: np.ndarray = None,
+                 branch_sign: np.ndarray = None,
+                 names: np.ndarray = None):
+        '''
+        Constructor.
+        Unlike Point, no flags are inferred from the location of the points.
+        Parameters
+        z (np.ndarray): locations of the points
+        flags (np.ndarray): packed is_origin/on_axis/on_arc flags, defaults to all unset
+        branch_sign (np.ndarray): the multiplier that will be applied at the square root
+        names (np.ndarray): optional names of the points
+        Raises
+        ValueError if the columns do not all have the same length
+        '''
+
+        self.z = np.asarray(z, dtype=np.complex128).reshape(-1)
+        self.flags = np.zeros(len(self.z), dtype=np.uint8) if flags is None else np.asarray(flags, dtype=np.uint8)
+        self.branch_sign = np.zeros(len(self.z), dtype=np.int8) if branch_sign is None else np.asarray(branch_sign, dtype=np.int8)
+
+        # Names are interned so that repeated names share a single string
+        if names is not None and not (isinstance(names, np.ndarray) and names.dtype == object):
+            names = np.array([None if n is None else sys.intern(str(n)) for n in names], dtype=object)
+        self.names = names
+
+        for column in (self.flags, self.branch_sign) + (() if names is None else (names,)):
+            if column.shape != self.z.shape:
+                raise ValueError(f'Column of shape {column.shape} does not match points of shape {self.z.shape}')
+
+    @classmethod
+    def from_flags(cls,
+                   z: np.ndarray,
+                   is_origin: np.ndarray,
+                   on_axis: np.ndarray,
+                   on_arc: np.ndarray,
+                   branch_sign: np.ndarray,
+                   names: np.ndarray = None) -> 'PointArray':
+        '''
+        Builds a PointArray from separate boolean flag arrays, in the order
+        returned by the batch maps of F_a.
+        Returns:
+        PointArray
+        '''
+        return cls(z, flags=pack_flags(is_origin, on_axis, on_arc), branch_sign=branch_sign, names=names)
+
+    @classmethod
+    def from_points(cls, points: List[Point]) -> 'PointArray':
+        '''
+        Builds a PointArray holding the given points.
+        Parameters:
+        points (List[Point]): points to store
+        Returns:
+        PointArray
+        '''
+        return cls.from_flags(np.array([p.z for p in points], dtype=np.complex128),
+                              [bool(p.is_origin) for p in points],
+                              [bool(p.on_axis) for p in points],
+                              [bool(p.on_arc) for p in points],
+                              [p.branch_sign for p in points],
+                              names=[p.name for p in points])
+
+    @classmethod
+    def concatenate(cls, arrays: List['PointArray']) -> 'PointArray':
+        '''
+        Joins several PointArrays into one. Names are kept only if
+        every array has them.
+        Parameters:
+        arrays (List[PointArray]): arrays to join, in order
+        Returns:
+        PointArray
+        '''
+        names = None
+        if all(a.names is not None for a in arrays):
+            names = np.concatenate([a.names for a in arrays])
+        return cls(np.concatenate([a.z for a in arrays]),
+                   flags = np.concatenate([a.flags for a in arrays]),
+                   branch_sign = np.concatenate([a.branch_sign for a in arrays]),
+                   names = names)
+
+    def to_points(self) -> List[Point]:
+        '''
+        Converts this array into a list of Point objects.
+        Returns:
+        List[Point]
+        '''
+        return [self.point(i) for i in range(len(self))]
+
+    def point(self, i: int) -> Point:
+        '''
+        Returns the i-th point as a Point object.
+        Parameters:
+        i (int): index of the point
+        Returns:
+        Point
+        '''
+        return Point(complex(self.z[i]),
+                     name = None if self.names is None else self.names[i],
+                     is_origin = bool(self.flags[i] & IS_ORIGIN),
+                     on_axis = bool(self.flags[i] & ON_AXIS),
+                     on_arc = bool(self.flags[i] & ON_ARC),
+                     branch_sign = int(self.branch_sign[i]))
+
+    @property
+    def is_origin(self) -> np.ndarray:
+        return (self.flags & IS_ORIGIN) != 0
+
+    @property
+    def on_axis(self) -> np.ndarray:
+        return (self.flags & ON_AXIS) != 0
+
+    @property
+    def on_arc(self) -> np.ndarray:
+        return (self.flags & ON_ARC) != 0
+
+    def __len__(self) -> int:
+        return len(self.z)
+
+    def __getitem__(self, key):
+        # A single index behaves like indexing a list of points
+        if isinstance(key, (int, np.integer)):
+            return self.point(key)
+        return PointArray(self.z[key],
+                          flags = self.flags[key],
+                          branch_sign = self.branch_sign[key],
+                          names = None if self.names is None else self.names[key])
+
+    def __iter__(self) -> Iterator[Point]:
+        for i in range(len(self)):
+            yield self.point(i)
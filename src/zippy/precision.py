@@ -0,0 +1,567 @@
+'''
+precision.py
+Double-double arithmetic on arrays, for evaluating the chain with about
+106 bits of precision.
+
+A double-double number is an unevaluated sum hi + lo of two float64 with
+|lo| <= ulp(hi) / 2. Sums and products are computed exactly with the
+error-free transformations two_sum and two_prod, and then rounded back to
+a pair, as in Dekker (1971) and Hida, Li and Bailey (2001). Every operation
+works elementwise on whole arrays, so the chain is evaluated in batches as
+in double precision.
+'''
+
+import functools
+import numpy as np
+from typing import Tuple, Union
+
+# 2^27 + 1, which splits a float64 into two halves of 26 bits
+_SPLIT = 134217729.0
+
+# The error-free transformations below write their temporaries in place, since
+# the cost of double-double on arrays is mostly the number of passes NumPy makes
+
+def two_sum(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns s = fl(a + b) and the error e, so that a + b = s + e exactly.
+    '''
+    s = a + b
+    bb = s - a
+    e = s - bb
+    np.subtract(a, e, out=e)
+    np.subtract(b, bb, out=bb)
+    e += bb
+    return s, e
+
+def two_diff(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns s = fl(a - b) and the error e, so that a - b = s + e exactly.
+    '''
+    s = a - b
+    bb = s - a
+    e = s - bb
+    np.subtract(a, e, out=e)
+    np.add(b, bb, out=bb)
+    e -= bb
+    return s, e
+
+def quick_two_sum(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    two_sum for |a| >= |b|, in three operations instead of six.
+    '''
+    s = a + b
+    e = s - a
+    np.subtract(b, e, out=e)
+    return s, e
+
+def _split(a: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Splits a into hi + lo, where each half has at most 26 significant bits.
+    '''
+    t = _SPLIT * a
+    hi = t - a
+    np.subtract(t, hi, out=hi)
+    return hi, np.subtract(a, hi, out=t)
+
+def two_prod(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns p = fl(a b) and the error e, so that a b = p + e exactly.
+    NumPy has no fused multiply-add, so this uses Dekker's splitting.
+    '''
+    return _two_prod_halves(a, _split(a), b, _split(b))
+
+def _two_prod_halves(a: np.ndarray, a_halves: Tuple[np.ndarray, np.ndarray],
+                     b: np.ndarray, b_halves: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    two_prod with the halves of a and b already split.
+    '''
+    p = a * b
+    a_hi, a_lo = a_halves
+    b_hi, b_lo = b_halves
+    e = a_hi * b_hi
+    e -= p
+    t = a_hi * b_lo
+    e += t
+    np.multiply(a_lo, b_hi, out=t)
+    e += t
+    np.multiply(a_lo, b_lo, out=t)
+    e += t
+    return p, e
+
+def two_square(a: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    two_prod(a, a), splitting a only once.
+    '''
+    return _two_square_halves(a, _split(a))
+
+def _two_square_halves(a: np.ndarray, halves: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    two_square with the halves of a already split.
+    '''
+    p = a * a
+    hi, lo = halves
+    e = hi * hi
+    e -= p
+    t = hi * lo
+    t *= 2
+    e += t
+    np.multiply(lo, lo, out=t)
+    e += t
+    return p, e
+
+class DoubleDouble:
+
+    '''
+    An array of real double-double numbers.
+    Infinite values are not carried through the error terms, which become nan,
+    so callers replace them as apply_dd does.
+    '''
+
+    # The halves of hi from _split are kept once computed, since the same
+    # operand is often multiplied more than once
+    __slots__ = ('hi', 'lo', '_halves')
+
+    # NumPy scalars and arrays defer to the operators below instead of broadcasting over them
+    __array_ufunc__ = None
+
+    def __init__(self, hi: Union[float, np.ndarray], lo: Union[float, np.ndarray] = None):
+        '''
+        Constructor.
+        Parameters:
+        hi (float or np.ndarray): the leading parts
+        lo (float or np.ndarray): the trailing parts, otherwise 0
+        '''
+        # Scalars are kept as arrays of one entry, so that NumPy returns arrays
+        # that the operations can write into in place
+        self.hi = np.atleast_1d(np.asarray(hi, dtype=np.float64))
+        self.lo = np.zeros_like(self.hi) if lo is None else np.atleast_1d(np.asarray(lo, dtype=np.float64))
+        self._halves = None
+
+    @staticmethod
+    def _wrap(x: Union['DoubleDouble', float, np.ndarray]) -> 'DoubleDouble':
+        return x if isinstance(x, DoubleDouble) else DoubleDouble(x)
+
+    @staticmethod
+    def _pair(hi: np.ndarray, lo: np.ndarray) -> 'DoubleDouble':
+        '''
+        Builds a DoubleDouble from float64 arrays of the same shape, without converting them.
+        '''
+        x = DoubleDouble.__new__(DoubleDouble)
+        x.hi = hi
+        x.lo = lo
+        x._halves = None
+        return x
+
+    def halves(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Returns _split(self.hi), computed once.
+        '''
+        if self._halves is None:
+            self._halves = _split(self.hi)
+        return self._halves
+
+    def __add__(self, other) -> 'DoubleDouble':
+        if isinstance(other, ComplexDD):
+            return NotImplemented
+        other = self._wrap(other)
+        s, e = two_sum(self.hi, other.hi)
+        t, f = two_sum(self.lo, other.lo)
+        e += t
+        s, e = quick_two_sum(s, e)
+        e += f
+        return DoubleDouble._pair(*quick_two_sum(s, e))
+
+    __radd__ = __add__
+
+    def add_same_sign(self, other) -> 'DoubleDouble':
+        '''
+        Addition for operands of the same sign, such as sums of squares, which
+        cannot cancel, so the trailing parts can be added in float64 without
+        losing precision. Takes about half the passes of +.
+        '''
+        other = self._wrap(other)
+        s, e = two_sum(self.hi, other.hi)
+        e += self.lo
+        e += other.lo
+        return DoubleDouble._pair(*quick_two_sum(s, e))
+
+    def __neg__(self) -> 'DoubleDouble':
+        return DoubleDouble._pair(-self.hi, -self.lo)
+
+    def __sub__(self, other) -> 'DoubleDouble':
+        if isinstance(other, ComplexDD):
+            return NotImplemented
+        other = self._wrap(other)
+        s, e = two_diff(self.hi, other.hi)
+        t, f = two_diff(self.lo, other.lo)
+        e += t
+        s, e = quick_two_sum(s, e)
+        e += f
+        return DoubleDouble._pair(*quick_two_sum(s, e))
+
+    def __rsub__(self, other) -> 'DoubleDouble':
+        return self._wrap(other) - self
+
+    def __mul__(self, other) -> 'DoubleDouble':
+        if isinstance(other, ComplexDD):
+            return NotImplemented
+        other = self._wrap(other)
+        p, e = _two_prod_halves(self.hi, self.halves(), other.hi, other.halves())
+        t = self.hi * other.lo
+        e += t
+        np.multiply(self.lo, other.hi, out=t)
+        e += t
+        return DoubleDouble._pair(*quick_two_sum(p, e))
+
+    __rmul__ = __mul__
+
+    def square(self) -> 'DoubleDouble':
+        '''
+        Returns self * self, with one split instead of two.
+        '''
+        p, e = _two_square_halves(self.hi, self.halves())
+        t = self.hi * self.lo
+        t *= 2
+        e += t
+        return DoubleDouble._pair(*quick_two_sum(p, e))
+
+    def __truediv__(self, other) -> 'DoubleDouble':
+        if isinstance(other, ComplexDD):
+            return NotImplemented
+        other = self._wrap(other)
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            # Long division: one quotient digit per float64. Only the leading part of the
+            # remainder self - other q1 is needed, and self.hi - fl(other.hi q1) is exact
+            # since the two are within a factor of 2, so the rest is summed in float64
+            q1 = self.hi / other.hi
+            p, e = _two_prod_halves(other.hi, other.halves(), q1, _split(q1))
+            r = self.hi - p
+            r -= e
+            r += self.lo
+            np.multiply(other.lo, q1, out=e)
+            r -= e
+            r /= other.hi
+            q, e = quick_two_sum(q1, r)
+        return DoubleDouble._pair(q, e)
+
+    def __rtruediv__(self, other) -> 'DoubleDouble':
+        return self._wrap(other) / self
+
+    def __abs__(self) -> 'DoubleDouble':
+        return self.scale(np.where(self.negative(), -1.0, 1.0))
+
+    def scale(self, factor: np.ndarray) -> 'DoubleDouble':
+        '''
+        Multiplies by a power of two, such as a sign, which is exact.
+        '''
+        return DoubleDouble(self.hi * factor, self.lo * factor)
+
+    def __getitem__(self, index) -> 'DoubleDouble':
+        return DoubleDouble(self.hi[index], self.lo[index])
+
+    def __setitem__(self, index, value):
+        value = self._wrap(value)
+        self.hi[index] = value.hi
+        self.lo[index] = value.lo
+        self._halves = None
+
+    def __len__(self) -> int:
+        return len(self.hi)
+
+    def sqrt(self) -> 'DoubleDouble':
+        '''
+        Returns the square root, from one Newton step on the float64 root.
+        Negative entries give nan, as in np.sqrt.
+        '''
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # As in division, only the leading part of the remainder self - x^2 is needed
+            x = np.sqrt(self.hi)
+            p, e = two_square(x)
+            r = self.hi - p
+            r -= e
+            r += self.lo
+            np.multiply(x, 2, out=p)
+            r /= p
+            s, e = quick_two_sum(x, r)
+        zero = self.hi == 0
+        np.copyto(s, 0.0, where=zero)
+        np.copyto(e, 0.0, where=zero)
+        return DoubleDouble._pair(s, e)
+
+    def negative(self) -> np.ndarray:
+        '''
+        Returns whether each entry is less than 0.
+        '''
+        return (self.hi < 0) | ((self.hi == 0) & (self.lo < 0))
+
+    def copy(self) -> 'DoubleDouble':
+        return DoubleDouble(self.hi.copy(), self.lo.copy())
+
+    def to_float(self) -> np.ndarray:
+        '''
+        Returns the nearest float64 of each entry.
+        '''
+        return self.hi + self.lo
+
+    @staticmethod
+    def where(mask: np.ndarray, x: 'DoubleDouble', y: 'DoubleDouble') -> 'DoubleDouble':
+        '''
+        Elementwise choice as in np.where.
+        '''
+        x = DoubleDouble._wrap(x)
+        y = DoubleDouble._wrap(y)
+        return DoubleDouble(np.where(mask, x.hi, y.hi), np.where(mask, x.lo, y.lo))
+
+class ComplexDD:
+
+    '''
+    An array of complex numbers whose real and imaginary parts are double-double.
+    '''
+
+    __slots__ = ('real', 'imag')
+    __array_ufunc__ = None
+
+    def __init__(self, real: DoubleDouble, imag: DoubleDouble):
+        '''
+        Constructor.
+        Parameters:
+        real (DoubleDouble): the real parts
+        imag (DoubleDouble): the imaginary parts
+        '''
+        self.real = real
+        self.imag = imag
+
+    @classmethod
+    def from_complex(cls, z: Union[complex, np.ndarray]) -> 'ComplexDD':
+        '''
+        Converts complex128 values exactly.
+        '''
+        z = np.asarray(z, dtype=np.complex128)
+        return cls(DoubleDouble(z.real.copy()), DoubleDouble(z.imag.copy()))
+
+    def to_complex(self) -> np.ndarray:
+        '''
+        Returns the nearest complex128 of each entry.
+        '''
+        out = np.empty(self.real.hi.shape, dtype=np.complex128)
+        out.real = self.real.to_float()
+        out.imag = self.imag.to_float()
+        return out
+
+    @staticmethod
+    def _wrap(z) -> 'ComplexDD':
+        if isinstance(z, ComplexDD):
+            return z
+        if isinstance(z, DoubleDouble):
+            return ComplexDD(z, DoubleDouble(np.zeros_like(z.hi)))
+        return ComplexDD.from_complex(z)
+
+    def __add__(self, other) -> 'ComplexDD':
+        other = self._wrap(other)
+        return ComplexDD(self.real + other.real, self.imag + other.imag)
+
+    __radd__ = __add__
+
+    def __neg__(self) -> 'ComplexDD':
+        return ComplexDD(-self.real, -self.imag)
+
+    def __sub__(self, other) -> 'ComplexDD':
+        other = self._wrap(other)
+        return ComplexDD(self.real - other.real, self.imag - other.imag)
+
+    def __rsub__(self, other) -> 'ComplexDD':
+        return self._wrap(other) - self
+
+    def __mul__(self, other) -> 'ComplexDD':
+        if isinstance(other, DoubleDouble):
+            return ComplexDD(self.real * other, self.imag * other)
+        other = self._wrap(other)
+        return ComplexDD(self.real * other.real - self.imag * other.imag,
+                         self.real * other.imag + self.imag * other.real)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other) -> 'ComplexDD':
+        if isinstance(other, DoubleDouble):
+            return ComplexDD(self.real / other, self.imag / other)
+        other = self._wrap(other)
+        denom = other.real.square().add_same_sign(other.imag.square())
+        return ComplexDD((self.real * other.real + self.imag * other.imag) / denom,
+                         (self.imag * other.real - self.real * other.imag) / denom)
+
+    def __rtruediv__(self, other) -> 'ComplexDD':
+        return self._wrap(other) / self
+
+    def __getitem__(self, index) -> 'ComplexDD':
+        return ComplexDD(self.real[index], self.imag[index])
+
+    def __setitem__(self, index, value):
+        value = self._wrap(value)
+        self.real[index] = value.real
+        self.imag[index] = value.imag
+
+    def __len__(self) -> int:
+        return len(self.real)
+
+    def conjugate(self) -> 'ComplexDD':
+        return ComplexDD(self.real, -self.imag)
+
+    def copy(self) -> 'ComplexDD':
+        return ComplexDD(self.real.copy(), self.imag.copy())
+
+    def isinf(self) -> np.ndarray:
+        return np.isinf(self.real.hi) | np.isinf(self.imag.hi)
+
+    @staticmethod
+    def where(mask: np.ndarray, x: 'ComplexDD', y: 'ComplexDD') -> 'ComplexDD':
+        '''
+        Elementwise choice as in np.where.
+        '''
+        x = ComplexDD._wrap(x)
+        y = ComplexDD._wrap(y)
+        return ComplexDD(DoubleDouble.where(mask, x.real, y.real), DoubleDouble.where(mask, x.imag, y.imag))
+
+def _root_parts(z: ComplexDD) -> Tuple[DoubleDouble, DoubleDouble, np.ndarray]:
+    '''
+    Returns the moduli of the real and imaginary parts of a square root of z,
+    computed as in utils.f3sqrt from u = \\sqrt{(|z| + |x|) / 2} and v = |y| / 2u,
+    together with whether each y is negative.
+    '''
+    x, y = z.real, z.imag
+    abs_x = abs(x)
+    abs_y = abs(y)
+    big = x.square().add_same_sign(y.square()).sqrt().add_same_sign(abs_x).scale(0.5).sqrt()
+    small = abs_y / big.scale(2.0)
+    small = DoubleDouble.where(big.hi == 0, 0.0, small)
+
+    right = ~x.negative()
+    return DoubleDouble.where(right, big, small), DoubleDouble.where(right, small, big), y.negative()
+
+def f3sqrt_dd(z: ComplexDD) -> ComplexDD:
+    '''
+    Double-double version of utils.f3sqrt, the square root with the branch cut
+    along (0, \\infty) and values in the lower half plane.
+    Parameters:
+    z (ComplexDD): point(s) to apply map to
+    Returns:
+    ComplexDD: sqrt(z)
+    '''
+    real, imag, lower = _root_parts(z)
+
+    # The real part is negative unless y < 0, the imaginary part is never positive
+    return ComplexDD(real.scale(np.where(lower, 1.0, -1.0)), -imag)
+
+def sqrt_dd(z: ComplexDD) -> ComplexDD:
+    '''
+    Double-double version of the principal square root np.sqrt.
+    Parameters:
+    z (ComplexDD): point(s) to apply map to
+    Returns:
+    ComplexDD: sqrt(z)
+    '''
+    real, imag, lower = _root_parts(z)
+    return ComplexDD(real, imag.scale(np.where(lower, -1.0, 1.0)))
+
+def constants_dd(f) -> Tuple[ComplexDD, DoubleDouble, DoubleDouble]:
+    '''
+    Returns a, b = |a|^2 / Re a and c = |a|^2 / Im a of a map F_a in double-double.
+    The float64 value of a defines the map, so b and c are recomputed from it
+    rather than taken from the rounded f.b and f.c.
+    Parameters:
+    f (F_a): the map
+    Returns:
+    ComplexDD: a
+    DoubleDouble: b, \\infty when Re a = 0
+    DoubleDouble: c
+    '''
+    return _constants(complex(f.a))[:3]
+
+@functools.lru_cache(maxsize=1 << 16)
+def _constants(a_value: complex) -> Tuple[ComplexDD, DoubleDouble, DoubleDouble, DoubleDouble]:
+    '''
+    constants_dd followed by b^2 + c^2, computed once for each a, since on small
+    batches the operations on these single values cost as much as a stage.
+    The values returned are shared, and must not be changed.
+    '''
+    a = ComplexDD.from_complex(np.array([a_value]))
+    modulus = DoubleDouble(*two_square(a.real.hi)).add_same_sign(DoubleDouble(*two_square(a.imag.hi)))
+    b = DoubleDouble(np.inf) if a_value.real == 0 else modulus / a.real
+    c = modulus / a.imag
+    return a, b, c, _scale(b, c)
+
+def _scale(b: DoubleDouble, c: DoubleDouble) -> DoubleDouble:
+    '''
+    Returns b^2 + c^2, \\infty when b is.
+    '''
+    return b.square().add_same_sign(c.square()) if np.all(np.isfinite(b.hi)) else DoubleDouble(np.inf)
+
+def apply_dd(f, z: ComplexDD, constants: Tuple = None) -> ComplexDD:
+    '''
+    Double-double version of F_a.apply, with points of the closed upper half plane
+    treated as on the real axis.
+    Parameters:
+    f (F_a): the map
+    z (ComplexDD): points to apply the map to
+    constants (Tuple): constants_dd(f), otherwise taken from a cache of the constants of each a
+    Returns:
+    ComplexDD: f_a(z)
+    '''
+    if constants is None:
+        a, b, c, scale = _constants(complex(f.a))
+    else:
+        a, b, c = constants
+        scale = _scale(b, c)
+    finite_b = bool(np.isfinite(b.hi))
+    axis = ~z.imag.negative()
+    real = (z.imag.hi == 0) & (z.imag.lo == 0)
+    at_inf = z.isinf()
+    at_b = np.zeros(axis.shape, dtype=bool)
+    if finite_b:
+        at_b = (z.real.hi == b.hi) & (z.real.lo == b.lo) & real
+
+    # f_2(f_1(z)) = (b^2 + c^2) (z - a)(z - \\bar{a}) / (b - z)^2, where \\infty and b
+    # are replaced by 0 and their images are filled in at the end
+    special = at_inf | at_b
+    safe = ComplexDD.where(special, 0, z) if np.any(special) else z
+    x, y = safe.real, safe.imag
+
+    # Expanded into real arithmetic, (z - a)(z - \\bar{a}) = (x - Re a)^2 + (Im a - y)(Im a + y) + 2 i y (x - Re a)
+    shift = x - a.real
+    # Im a < 0 and y <= 0, so Im a + y cannot cancel
+    out = ComplexDD(shift.square() + (a.imag - y) * a.imag.add_same_sign(y), (y * shift).scale(2.0))
+    if finite_b:
+        # Dividing by (b - z)^2 = D is multiplying by \\bar{D} (b^2 + c^2) / |D|^2
+        shift = b - x
+        square = ComplexDD((shift - y) * (shift + y), (shift * y).scale(-2.0))
+        factor = scale / square.real.square().add_same_sign(square.imag.square())
+        out = out * square.conjugate() * factor
+
+    # Sign of Re f_1(z) = b (b Re z - |z|^2) / |b - z|^2 on the axis, which is -b at \\infty
+    # Skipped when no point is on the axis, since every operation has a fixed cost
+    f1_negative = np.zeros(axis.shape, dtype=bool)
+    if np.any(axis):
+        on_axis = safe[axis]
+        if finite_b:
+            f1_real = b * (b * on_axis.real - on_axis.real.square().add_same_sign(on_axis.imag.square()))
+            f1_negative[axis] = np.where(at_inf[axis], b.hi > 0, f1_real.negative())
+        else:
+            f1_negative[axis] = on_axis.real.negative()
+
+    # Off the axis this is f3sqrt, on the axis the principal root times the sign of Re f_1(z),
+    # and the images of real points are kept real
+    real_part, imag_part, lower = _root_parts(out)
+    real_sign = np.where(axis, np.where(f1_negative, -1.0, 1.0), np.where(lower, 1.0, -1.0))
+    imag_sign = np.where(axis, np.where(lower ^ f1_negative, -1.0, 1.0), -1.0)
+    imag_sign[axis & real] = 0.0
+    out = ComplexDD(real_part.scale(real_sign), imag_part.scale(imag_sign))
+
+    # f_a(\\infty) = -sign(b) \\sqrt{b^2 + c^2} and f_a(b) = \\infty
+    if np.any(at_inf):
+        if finite_b:
+            at_inf_value = scale.sqrt().scale(-1.0 if b.hi > 0 else 1.0)
+            out[at_inf] = ComplexDD(at_inf_value, DoubleDouble(0.0))
+        else:
+            out[at_inf] = complex(np.inf, 0)
+    if np.any(at_b):
+        out[at_b] = complex(np.inf, 0)
+    return out
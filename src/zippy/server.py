@@ -0,0 +1,329 @@
+'''
+server.py
+A local service that holds built maps in memory and evaluates them for other processes.
+
+Jobs on the same host connect over a Unix socket or localhost TCP instead of each
+loading their own copy of the maps. Small requests that arrive within a short
+window of each other, for the same map and direction, are merged into one batch,
+so that the maps are evaluated on large arrays.
+
+Every message is a frame of a fixed header followed by a payload. A request is
+    REQUEST header: request id, method, length of the map name, number of points
+    the map name in UTF-8, then the points as little-endian complex128
+and its response is
+    RESPONSE header: request id, status, length of the payload
+    the images as little-endian complex128, or an error message in UTF-8.
+Request ids are chosen by the client, so that one connection can have many
+requests in flight and match the responses to them.
+
+To serve maps written by Zipper.save:
+python -m zippy.server --socket /tmp/zippy.sock square=square.zippy disk=disk.zippy
+'''
+
+import argparse
+import asyncio
+import itertools
+import struct
+import numpy as np
+from typing import Dict, List, Tuple
+from zippy.zipper import Zipper
+
+REQUEST = struct.Struct('<IBHI')
+RESPONSE = struct.Struct('<IBI')
+
+# Methods of a request, as sent in its header
+METHODS = ('forward', 'inverse')
+
+OK = 0
+ERROR = 1
+
+class MapServer:
+
+    '''
+    Serves maps by name, merging concurrent requests into batches.
+    '''
+
+    def __init__(self, maps: Dict[str, Zipper] = None, window: float = 0.002, max_batch: int = 1 << 16):
+        '''
+        Constructor.
+        Parameters:
+        maps (Dict[str, Zipper]): the maps to serve, by name
+        window (float): seconds to wait after the first request of a batch for more to join it
+        max_batch (int): number of points at which a batch is evaluated without waiting
+        '''
+        self.maps = dict(maps or {})
+        self.window = window
+        self.max_batch = max_batch
+        self.stats = {'requests': 0, 'batches': 0, 'points': 0}
+
+        # (map name, method) -> requests waiting, as (points, future) pairs
+        self._pending: Dict[Tuple[str, str], List[Tuple[np.ndarray, asyncio.Future]]] = {}
+        self._timers: Dict[Tuple[str, str], asyncio.TimerHandle] = {}
+        self._server = None
+
+    def load(self, name: str, path: str):
+        '''
+        Adds a map written by Zipper.save.
+        '''
+        self.maps[name] = Zipper.load(path)
+
+    async def evaluate(self, name: str, method: str, z: np.ndarray) -> np.ndarray:
+        '''
+        Evaluates a map on points, as part of the next batch of that map and method.
+        Parameters:
+        name (str): the name of the map
+        method (str): 'forward' or 'inverse'
+        z (np.ndarray): points to map
+        Returns:
+        np.ndarray: images of the points
+        Raises:
+        ValueError for an unknown map or method
+        '''
+        if name not in self.maps:
+            raise ValueError(f'No map named {name!r}.')
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {', '.join(METHODS)}, got {method!r}")
+        self.stats['requests'] += 1
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (name, method)
+        pending = self._pending.setdefault(key, [])
+        pending.append((z, future))
+
+        if sum(len(points) for points, _ in pending) >= self.max_batch:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key: Tuple[str, str]):
+        '''
+        Starts evaluating every request waiting for a map and method as one batch.
+        '''
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, [])
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(key, batch))
+
+    async def _run(self, key: Tuple[str, str], batch: List[Tuple[np.ndarray, asyncio.Future]]):
+        '''
+        Evaluates one batch in a worker thread, so that the server keeps
+        accepting requests, and hands each request its part of the result.
+        '''
+        name, method = key
+        z = np.concatenate([points for points, _ in batch])
+        self.stats['batches'] += 1
+        self.stats['points'] += len(z)
+        try:
+            images = await asyncio.get_running_loop().run_in_executor(None, getattr(self.maps[name], method), z)
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        start = 0
+        for points, future in batch:
+            if not future.done():
+                future.set_result(images[start:start + len(points)])
+            start += len(points)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        '''
+        Serves one connection, answering each request as soon as its batch is done.
+        When the client stops sending, the answers still pending are sent before the
+        connection is closed; when the connection is lost, they are dropped.
+        '''
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def answer(request_id: int, name: str, method: str, z: np.ndarray):
+            try:
+                payload = np.ascontiguousarray(await self.evaluate(name, method, z), dtype='<c16').tobytes()
+                status = OK
+            except Exception as error:
+                payload = str(error).encode('utf-8')
+                status = ERROR
+            async with lock:
+                if writer.is_closing():
+                    return
+                try:
+                    writer.write(RESPONSE.pack(request_id, status, len(payload)) + payload)
+                    await writer.drain()
+                except ConnectionError:
+                    # The client has gone, and the connection is closed below
+                    pass
+
+        lost = False
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(REQUEST.size)
+                    request_id, method, name_length, count = REQUEST.unpack(header)
+                    name = (await reader.readexactly(name_length)).decode('utf-8')
+                    z = np.frombuffer(await reader.readexactly(16 * count), dtype='<c16').astype(np.complex128)
+                except asyncio.IncompleteReadError:
+                    break
+                except ConnectionError:
+                    lost = True
+                    break
+                method = METHODS[method] if method < len(METHODS) else str(method)
+                task = asyncio.create_task(answer(request_id, name, method, z))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks and not lost:
+                await asyncio.gather(*tasks)
+        finally:
+            # Answers left when the connection was lost, or the handler was cancelled,
+            # have nowhere to go
+            for task in list(tasks):
+                task.cancel()
+            writer.close()
+
+    async def start_unix(self, path: str):
+        '''
+        Starts serving on a Unix socket.
+        '''
+        self._server = await asyncio.start_unix_server(self._handle, path=path)
+
+    async def start_tcp(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        '''
+        Starts serving on a TCP port, by default a free port of localhost.
+        Returns:
+        int: the port
+        '''
+        self._server = await asyncio.start_server(self._handle, host=host, port=port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        '''
+        Stops accepting connections.
+        '''
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+class MapClient:
+
+    '''
+    Connection to a MapServer, on which many requests can be in flight at once.
+    '''
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count()
+        self._waiting: Dict[int, asyncio.Future] = {}
+
+        # The error that stopped _receive, if any, kept for the requests made after it
+        self._error: BaseException = None
+        self._receiver = asyncio.create_task(self._receive())
+
+    @classmethod
+    async def connect_unix(cls, path: str) -> 'MapClient':
+        return cls(*await asyncio.open_unix_connection(path))
+
+    @classmethod
+    async def connect_tcp(cls, host: str, port: int) -> 'MapClient':
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def _receive(self):
+        '''
+        Reads responses and resolves the requests they answer. However it stops, when
+        the connection drops, on a bad response or when the client is closed, the
+        requests still waiting are failed, since no response will come for them.
+        Errors are kept rather than raised, since nothing awaits this task.
+        '''
+        reason = 'the client was closed'
+        try:
+            while True:
+                request_id, status, length = RESPONSE.unpack(await self._reader.readexactly(RESPONSE.size))
+                payload = await self._reader.readexactly(length)
+                future = self._waiting.pop(request_id)
+                if status == OK:
+                    future.set_result(np.frombuffer(payload, dtype='<c16').astype(np.complex128))
+                else:
+                    future.set_exception(ValueError(payload.decode('utf-8')))
+        except (asyncio.IncompleteReadError, ConnectionError) as error:
+            self._error = error
+            reason = str(error)
+        except Exception as error:
+            self._error = error
+            reason = f'bad response: {error!r}'
+        finally:
+            for future in self._waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f'Connection to the map server was lost: {reason}'))
+            self._waiting.clear()
+
+    async def request(self, name: str, method: str, z: np.ndarray) -> np.ndarray:
+        '''
+        Evaluates a map on the server.
+        Parameters:
+        name (str): the name of the map
+        method (str): 'forward' or 'inverse'
+        z (np.ndarray): points to map
+        Returns:
+        np.ndarray: images of the points
+        Raises:
+        ValueError if the server could not evaluate the map
+        ConnectionError if the connection was lost, before or during the request
+        '''
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {', '.join(METHODS)}, got {method!r}")
+        if self._receiver.done():
+            raise ConnectionError('The connection to the map server is closed.') from self._error
+        z = np.ascontiguousarray(np.asarray(z, dtype=np.complex128).reshape(-1), dtype='<c16')
+        encoded = name.encode('utf-8')
+        request_id = next(self._ids) % (1 << 32)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        self._writer.write(REQUEST.pack(request_id, METHODS.index(method), len(encoded), len(z)) + encoded + z.tobytes())
+        await self._writer.drain()
+        return await future
+
+    async def forward(self, name: str, z: np.ndarray) -> np.ndarray:
+        return await self.request(name, 'forward', z)
+
+    async def inverse(self, name: str, z: np.ndarray) -> np.ndarray:
+        return await self.request(name, 'inverse', z)
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+        self._receiver.cancel()
+
+def main(argv: List[str] = None):
+    '''
+    Command line entry point, see the module docstring.
+    '''
+    parser = argparse.ArgumentParser(prog='python -m zippy.server', description='Serve saved maps to local processes.')
+    parser.add_argument('maps', nargs='+', metavar='NAME=PATH', help='maps written by Zipper.save, by name')
+    parser.add_argument('--socket', default=None, help='Unix socket to listen on')
+    parser.add_argument('--port', type=int, default=None, help='localhost TCP port to listen on, if no socket is given')
+    parser.add_argument('--window', type=float, default=0.002, help='seconds that requests wait to be batched (default 0.002)')
+    parser.add_argument('--max-batch', type=int, default=1 << 16, help='points at which a batch runs without waiting')
+    args = parser.parse_args(argv)
+
+    server = MapServer(window=args.window, max_batch=args.max_batch)
+    for item in args.maps:
+        name, _, path = item.partition('=')
+        server.load(name, path)
+
+    async def serve():
+        if args.socket is not None:
+            await server.start_unix(args.socket)
+            print(f'Serving {len(server.maps)} map(s) on {args.socket}')
+        else:
+            port = await server.start_tcp(port=args.port or 0)
+            print(f'Serving {len(server.maps)} map(s) on 127.0.0.1:{port}')
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+'''
+storage.py
+Binary file format for built maps.
+
+A file holds, in order:
+    the magic bytes b'ZIPPYMAP'
+    the format version and the length of the header, as little-endian uint32
+    a JSON header describing every array and holding the scalar values
+    the raw arrays, each starting at a multiple of ALIGNMENT bytes
+so that every array can be memory-mapped in place.
+
+Streams of points, for the zippy command and for boundary curves, are read
+in chunks by read_chunks.
+'''
+
+import io
+import itertools
+import json
+import struct
+import numpy as np
+from typing import BinaryIO, Dict, Iterator, Tuple
+
+MAGIC = b'ZIPPYMAP'
+VERSION = 1
+ALIGNMENT = 64
+
+_PREFIX = struct.Struct('<8sII')
+
+def _align(n: int) -> int:
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+def write_arrays(path: str, arrays: Dict[str, np.ndarray], scalars: Dict) -> None:
+    '''
+    Writes arrays and JSON-compatible scalars to a file.
+    Parameters:
+    path (str): file to write
+    arrays (Dict[str, np.ndarray]): arrays to store, by name
+    scalars (Dict): values to store in the header, by name
+    '''
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    # Offsets are relative to the start of the data, which follows the header
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.newbyteorder('<').str, 'shape': list(array.shape), 'offset': offset}
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({'arrays': layout, 'scalars': scalars}).encode('utf-8')
+    start = _align(_PREFIX.size + len(header))
+
+    with open(path, 'wb') as file:
+        file.write(_PREFIX.pack(MAGIC, VERSION, len(header)))
+        file.write(header)
+        for name, array in arrays.items():
+            file.seek(start + layout[name]['offset'])
+            file.write(array.astype(layout[name]['dtype'], copy=False).tobytes())
+        file.truncate(start + offset)
+
+def read_arrays(path: str, mmap: bool = True) -> Tuple[Dict[str, np.ndarray], Dict]:
+    '''
+    Reads a file written by write_arrays.
+    Parameters:
+    path (str): file to read
+    mmap (bool): whether to memory-map the arrays read-only instead of reading them
+    Returns:
+    Dict[str, np.ndarray]: the arrays, by name
+    Dict: the scalar values, by name
+    Raises:
+    ValueError if the file is not a map file or has an unsupported version
+    '''
+    with open(path, 'rb') as file:
+        prefix = file.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise ValueError(f'{path} is not a zippy map file.')
+        magic, version, length = _PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a zippy map file.')
+        if version != VERSION:
+            raise ValueError(f'{path} has format version {version}, but only version {VERSION} is supported.')
+        header = json.loads(file.read(length).decode('utf-8'))
+    start = _align(_PREFIX.size + length)
+
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        dtype = np.dtype(entry['dtype'])
+        shape = tuple(entry['shape'])
+        count = int(np.prod(shape))
+        if count == 0:
+            arrays[name] = np.empty(shape, dtype=dtype)
+        elif mmap:
+            arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=start + entry['offset'], shape=shape)
+        else:
+            arrays[name] = np.fromfile(path, dtype=dtype, count=count, offset=start + entry['offset']).reshape(shape)
+    return arrays, header['scalars']
+
+def read_npy_header(stream: BinaryIO) -> tuple:
+    '''
+    Reads the header of an npy file and returns its shape and dtype.
+    '''
+    version = np.lib.format.read_magic(stream)
+    if version == (1, 0):
+        shape, _, dtype = np.lib.format.read_array_header_1_0(stream)
+    else:
+        shape, _, dtype = np.lib.format.read_array_header_2_0(stream)
+    return shape, dtype
+
+def read_chunks(stream: BinaryIO, fmt: str, chunk_size: int) -> Iterator[np.ndarray]:
+    '''
+    Reads complex points in chunks.
+    Parameters:
+    stream (BinaryIO): binary stream to read
+    fmt (str): 'csv' for lines of real,imaginary, 'npy' for a 1D complex array
+    in the NumPy file format, or 'raw' for little-endian complex128
+    chunk_size (int): the most points in a chunk
+    Returns:
+    Iterator[np.ndarray]: complex128 chunks
+    Raises:
+    ValueError for an npy file that does not hold a 1D complex array
+    '''
+    if fmt == 'csv':
+        text = io.TextIOWrapper(stream, encoding='utf-8')
+        try:
+            while True:
+                # A chunk ends at the end of the stream, rather than reading past it chunk_size times
+                lines = list(itertools.islice(text, chunk_size))
+                rows = [line for line in lines if line.strip() and not line.lstrip().startswith('#')]
+                if rows:
+                    values = np.loadtxt(rows, delimiter=',', ndmin=2, dtype=np.float64)
+                    yield values[:, 0] + 1j * values[:, 1]
+                if len(lines) < chunk_size:
+                    return
+        finally:
+            # Leave the stream open for the caller
+            text.detach()
+
+    dtype = np.dtype('<c16')
+    count = None
+    if fmt == 'npy':
+        shape, dtype = read_npy_header(stream)
+        if len(shape) != 1 or dtype.kind != 'c':
+            raise ValueError(f'Expected a 1D complex array, got shape {shape} and dtype {dtype}.')
+        count = shape[0]
+
+    while count is None or count > 0:
+        n = chunk_size if count is None else min(chunk_size, count)
+        data = stream.read(n * dtype.itemsize)
+        if not data:
+            return
+        chunk = np.frombuffer(data[:len(data) - len(data) % dtype.itemsize], dtype=dtype)
+        if count is not None:
+            count -= len(chunk)
+        yield chunk.astype(np.complex128)
+        if len(data) < n * dtype.itemsize:
+            return
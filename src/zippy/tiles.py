@@ -0,0 +1,232 @@
+'''
+tiles.py
+Zoomable domain coloring, rendered as a pyramid of fixed-size tiles that are cached.
+
+The root extent is tile (0, 0) at zoom 0, and each tile at zoom k splits into
+four at zoom k + 1, so zoom k has 2^k by 2^k tiles. Columns count from the
+left and rows from the top, as images do. Tiles are rendered on demand, kept
+in an in-memory LRU of bounded size, and optionally spilled to disk when they
+are evicted, keyed by the map and the tile coordinates, so that panning and
+zooming reuse what was already rendered.
+'''
+
+import os
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Tuple
+from zippy.utils import render_domain_coloring
+
+# (zoom, column, row)
+Tile = Tuple[int, int, int]
+
+class TileRenderer:
+
+    '''
+    Renders and caches tiles of the domain coloring of a function.
+    '''
+
+    def __init__(self,
+                 func: Callable[[np.ndarray], np.ndarray],
+                 extent: Tuple[float, float, float, float],
+                 key: str,
+                 tile_size: int = 256,
+                 capacity: int = 256,
+                 spill_dir: str = None,
+                 workers: int = None):
+        '''
+        Constructor.
+        Parameters:
+        func (function): function applied to a 2D array of complex points at once,
+        such as Zipper.forward
+        extent (Tuple[float, float, float, float]): (min_r, max_r, min_c, max_c) of the root tile
+        key (str): identifies func in the spill directory, such as Zipper.fingerprint(),
+        so that tiles of different maps never mix
+        tile_size (int): pixels along each side of a tile
+        capacity (int): the most tiles kept in memory, each of tile_size^2 * 4 bytes
+        spill_dir (str): if given, evicted tiles are written under this directory
+        and read back instead of being rendered again
+        workers (int): if given, missing tiles are rendered by this many threads
+        Raises:
+        ValueError if tile_size or capacity is not positive
+        '''
+        if tile_size < 1 or capacity < 1:
+            raise ValueError('tile_size and capacity must be positive.')
+        self.func = func
+        self.extent = tuple(float(e) for e in extent)
+        self.key = key
+        self.tile_size = tile_size
+        self.capacity = capacity
+        self.spill_dir = spill_dir
+        self.workers = workers
+
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'spilled': 0, 'loaded': 0}
+
+    @classmethod
+    def for_zipper(cls, zipper, extent: Tuple[float, float, float, float], **kwargs) -> 'TileRenderer':
+        '''
+        Returns a renderer of zipper.forward, keyed by the zipper's fingerprint.
+        Parameters:
+        zipper (Zipper): the map to render
+        extent (Tuple[float, float, float, float]): (min_r, max_r, min_c, max_c) of the root tile
+        kwargs: passed to the constructor
+        Returns:
+        TileRenderer
+        '''
+        return cls(zipper.forward, extent, zipper.fingerprint(), **kwargs)
+
+    def tile_extent(self, tile: Tile) -> Tuple[float, float, float, float]:
+        '''
+        Returns (min_r, max_r, min_c, max_c) of a tile.
+        '''
+        zoom, col, row = tile
+        min_r, max_r, min_c, max_c = self.extent
+        width = (max_r - min_r) / 2 ** zoom
+        height = (max_c - min_c) / 2 ** zoom
+        return (min_r + col * width, min_r + (col + 1) * width,
+                max_c - (row + 1) * height, max_c - row * height)
+
+    def _path(self, tile: Tile) -> str:
+        zoom, col, row = tile
+        return os.path.join(self.spill_dir, self.key, str(zoom), str(col), f'{row}.npy')
+
+    def _render(self, tile: Tile) -> np.ndarray:
+        '''
+        Renders one tile, sampling func at the center of every pixel so that
+        neighbouring tiles and zoom levels line up without repeated pixels.
+        '''
+        min_r, max_r, min_c, max_c = self.tile_extent(tile)
+        half_r = (max_r - min_r) / (2 * self.tile_size)
+        half_c = (max_c - min_c) / (2 * self.tile_size)
+        return render_domain_coloring(self.func, (min_r + half_r, max_r - half_r, min_c + half_c, max_c - half_c),
+                                      (self.tile_size, self.tile_size))
+
+    def _load(self, tile: Tile) -> np.ndarray:
+        '''
+        Returns a spilled tile, or None.
+        '''
+        if self.spill_dir is None:
+            return None
+        path = self._path(tile)
+        if not os.path.exists(path):
+            return None
+        image = np.load(path)
+        with self._lock:
+            self.stats['loaded'] += 1
+        return image
+
+    def _store(self, tile: Tile, image: np.ndarray):
+        '''
+        Puts a tile in the cache unless it is already there, evicting the least
+        recently used tiles past capacity. The check is made under the lock, since
+        another thread may have stored the tile since it was looked up.
+        '''
+        with self._lock:
+            if tile in self._cache:
+                return
+            self._cache[tile] = image
+            self._cache.move_to_end(tile)
+            evicted = []
+            while len(self._cache) > self.capacity:
+                evicted.append(self._cache.popitem(last=False))
+        if self.spill_dir is None:
+            return
+        for old, old_image in evicted:
+            path = self._path(old)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                np.save(path, old_image)
+                with self._lock:
+                    self.stats['spilled'] += 1
+
+    def _lookup(self, tile: Tile) -> np.ndarray:
+        '''
+        Returns a cached tile, marking it as recently used, or None.
+        '''
+        with self._lock:
+            image = self._cache.get(tile)
+            if image is not None:
+                self._cache.move_to_end(tile)
+                self.stats['hits'] += 1
+            return image
+
+    def tiles(self, tiles: Iterable[Tile]) -> Dict[Tile, np.ndarray]:
+        '''
+        Returns several tiles, rendering the ones that are not cached in parallel.
+        Parameters:
+        tiles (Iterable[Tile]): (zoom, column, row) of each tile
+        Returns:
+        Dict[Tile, np.ndarray]: uint8 image of shape (tile_size, tile_size, 4) of each tile
+        Raises:
+        ValueError for a tile outside its zoom level
+        '''
+        found = {}
+        missing = []
+        for tile in dict.fromkeys(tuple(int(t) for t in tile) for tile in tiles):
+            zoom, col, row = tile
+            if zoom < 0 or not (0 <= col < 2 ** zoom and 0 <= row < 2 ** zoom):
+                raise ValueError(f'Tile {tile} is outside zoom level {zoom}.')
+            image = self._lookup(tile)
+            if image is None:
+                image = self._load(tile)
+            if image is None:
+                missing.append(tile)
+            else:
+                found[tile] = image
+
+        with self._lock:
+            self.stats['misses'] += len(missing)
+        if self.workers is not None and len(missing) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                rendered = list(pool.map(self._render, missing))
+        else:
+            rendered = [self._render(tile) for tile in missing]
+        found.update(zip(missing, rendered))
+
+        for tile, image in found.items():
+            self._store(tile, image)
+        return found
+
+    def tile(self, zoom: int, col: int, row: int) -> np.ndarray:
+        '''
+        Returns one tile, see tiles.
+        '''
+        return self.tiles([(zoom, col, row)])[(zoom, col, row)]
+
+    def render(self, extent: Tuple[float, float, float, float], zoom: int) -> Tuple[np.ndarray, Tuple[float, float, float, float]]:
+        '''
+        Assembles the tiles of one zoom level that cover an extent into one image.
+        Parameters:
+        extent (Tuple[float, float, float, float]): (min_r, max_r, min_c, max_c) to cover,
+        clipped to the root tile
+        zoom (int): the zoom level of the tiles
+        Returns:
+        np.ndarray: uint8 image of the covering tiles, for plt.imshow
+        Tuple[float, float, float, float]: the extent of that image, which contains the one asked for
+        '''
+        min_r, max_r, min_c, max_c = self.extent
+        n = 2 ** zoom
+        width = (max_r - min_r) / n
+        height = (max_c - min_c) / n
+        cols = np.clip([int(np.floor((extent[0] - min_r) / width)), int(np.ceil((extent[1] - min_r) / width)) - 1], 0, n - 1)
+        rows = np.clip([int(np.floor((max_c - extent[3]) / height)), int(np.ceil((max_c - extent[2]) / height)) - 1], 0, n - 1)
+
+        found = self.tiles((zoom, col, row) for row in range(rows[0], rows[1] + 1) for col in range(cols[0], cols[1] + 1))
+        size = self.tile_size
+        image = np.empty(((rows[1] - rows[0] + 1) * size, (cols[1] - cols[0] + 1) * size, 4), dtype=np.uint8)
+        for (_, col, row), tile in found.items():
+            image[(row - rows[0]) * size:(row - rows[0] + 1) * size, (col - cols[0]) * size:(col - cols[0] + 1) * size] = tile
+
+        first = self.tile_extent((zoom, cols[0], rows[0]))
+        last = self.tile_extent((zoom, cols[1], rows[1]))
+        return image, (first[0], last[1], last[2], first[3])
+
+    def clear(self):
+        '''
+        Empties the in-memory cache. Spilled tiles are kept.
+        '''
+        with self._lock:
+            self._cache.clear()
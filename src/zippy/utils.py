@@ -5,69 +5,138 @@ Relevant math helper functions.
 
 import numpy as np
 import colorsys
-from zippy.point import Point
-from typing import List
+from zippy.point import Point, PointArray, pack_flags
+from typing import Iterator, List, Tuple, Union
 
-def sign(z: complex) -> int:
+def sign(z: Union[complex, np.ndarray], out: np.ndarray = None) -> Union[int, np.ndarray]:
     '''
     Returns 1 if the real part is greater than or equal to
     zero and -1 otherwise.
     Note that the imaginary axis is included as "positive."
+    For an array, the sign of every entry is returned as int8.
     Parameters:
-    z (complex): the input point
+    z (complex or np.ndarray): the input point(s)
+    out (np.ndarray): optional int8 array to write the result into
     Returns:
-    int
+    int or np.ndarray
     '''
-    if z.real >= 0:
-        return 1
-    else:
-        return -1
-    
-def f3sqrt(z: complex) -> complex:
+    if np.ndim(z) == 0 and out is None:
+        if z.real >= 0:
+            return 1
+        else:
+            return -1
+
+    z = np.asarray(z)
+    if out is None:
+        out = np.empty(z.shape, dtype=np.int8)
+    np.greater_equal(z.real, 0, out=out)
+    out *= 2
+    out -= 1
+    return out
+
+def as_complex(z: Union[complex, np.ndarray]) -> np.ndarray:
+    '''
+    Converts to a complex array, keeping complex64 for single precision
+    and using complex128 for everything else.
+    Parameters:
+    z (complex or np.ndarray): the input point(s)
+    Returns:
+    np.ndarray
+    '''
+    z = np.asarray(z)
+    if z.dtype == np.complex64:
+        return z
+    return z.astype(np.complex128, copy=False)
+
+def f3sqrt(z: Union[complex, np.ndarray], out: np.ndarray = None, workspace=None) -> Union[complex, np.ndarray]:
     '''
     Applies the square root function 
     sqrt(re^{i theta}) = r^{1/2}e^{i theta/2} to z
-    where the branch cut is along (0, \infty) - which
-    means that the argument of the outputs will lie between
-    [0, 2\pi]
-    This code was taken from: https://flothesof.github.io/branch-cuts-with-square-roots.html
+    where the branch cut is along (0, \\infty) - which
+    means that theta is taken in [-2\\pi, 0) and the
+    outputs lie in the lower half plane.
+    Originally based on: https://flothesof.github.io/branch-cuts-with-square-roots.html
+    which rotates by np.exp of half the argument. Instead, the root is built from
+    real square roots as in the principal branch,
+    sqrt(z) = u + iv with u = \\sqrt{(|z| + |x|) / 2} and v = |y| / 2u,
+    and the signs are fixed up afterwards: the real part of the result is
+    negative unless y < 0, and the imaginary part is never positive.
+    Single precision input is computed in single precision.
     Parameters:
-    z (complex): point to apply map to
+    z (complex or np.ndarray): point(s) to apply map to
+    out (np.ndarray): optional array to write the result into, may be z
+    workspace (Workspace): optional temporary arrays for a 1D z of its size, see zippy.workspace
     Returns:
-    complex: sqrt(z)
+    complex or np.ndarray: sqrt(z)
     '''
+    z = as_complex(z)
+    scalar = z.ndim == 0 and out is None
+    if scalar:
+        z = z.reshape(1)
+    x = z.real
+    y = z.imag
+    if workspace is None:
+        big = small = right = upper = real = None
+    else:
+        workspace = workspace(z.size)
+        big, small, right, upper, real = workspace.big, workspace.small, workspace.right, workspace.upper, workspace.real
 
+    # The larger of the two components in magnitude, with no cancellation
+    big = np.abs(z, out=big)
+    small = np.abs(x, out=small)
+    big += small
+    big *= 0.5
+    np.sqrt(big, out=big)
 
-    # np.angle = tangent function for complex inputs
-    argument = np.angle(z)
-    modulus = np.abs(z)
+    # A signed zero imaginary part counts as the upper side of the cut
+    right = np.greater_equal(x, 0, out=right)
+    upper = np.add(y, 0.0, out=upper)
 
-    # Shift over 2 * np.pi, which defines the branch cut
-    argument = np.mod(argument + 2 * np.pi, 2 * np.pi) - 2 * np.pi
-    
-    return np.sqrt(modulus) * np.exp(1j * argument / 2)
+    # The smaller component, where 0 / 0 at the origin is dropped by fmax below
+    np.abs(y, out=small)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(small, big, out=small)
+    small *= 0.5
 
-    '''
-    # Convert the original point to polar coordinates
-    real_part = z.real
-    imag_part = z.imag
-    r = np.sqrt(real_part ** 2 + imag_part ** 2)
-    
-    # Note that we subtract pi from theta in order to get the desired branch cut in arctan
-    theta = np.arctan2(imag_part, real_part) - np.pi
-    p = complex(r * np.cos(theta), r * np.sin(theta))
+    # The real part is the larger component right of the imaginary axis
+    real = np.multiply(big, right, out=real)
+    with np.errstate(invalid='ignore'):
+        big -= real
+    np.fmax(real, small, out=real)
+    np.fmax(big, small, out=big)
+    np.copysign(real, upper, out=real)
 
-    result = np.sqrt(p)
-    new_real_part = result.real
-    new_imag_part = result.imag
-    new_r = np.sqrt(new_real_part ** 2 + new_imag_part ** 2)
-    
-    # Wwe add back pi/2 to reset to the original point
-    new_theta = np.arctan2(new_imag_part, new_real_part) + (np.pi / 2)
-    return complex(new_r * np.cos(new_theta), new_r * np.sin(new_theta))
+    if out is None:
+        out = np.empty_like(z)
+    np.negative(real, out=out.real)
+    np.negative(big, out=out.imag)
+    return out[0] if scalar else out
+
+def hls_to_rgb(h: np.ndarray, l: np.ndarray, s: np.ndarray) -> np.ndarray:
     '''
+    Array version of colorsys.hls_to_rgb.
+    Parameters:
+    h, l, s (np.ndarray): hue, lightness and saturation, each in [0, 1]
+    Returns:
+    np.ndarray: array with a last axis of length 3 holding (r, g, b)
+    '''
+    h, l, s = np.broadcast_arrays(np.asarray(h, dtype=np.float64),
+                                  np.asarray(l, dtype=np.float64),
+                                  np.asarray(s, dtype=np.float64))
+    m2 = np.where(l <= 0.5, l * (1.0 + s), l + s - (l * s))
+    m1 = 2.0 * l - m2
+
+    rgb = np.empty(h.shape + (3,), dtype=np.float64)
+    for k, shift in enumerate((1.0 / 3.0, 0.0, -1.0 / 3.0)):
+        # The piecewise linear ramp of colorsys._v, which rises on [0, 1/6],
+        # is flat on [1/6, 1/2] and falls on [1/2, 2/3]
+        hue = np.mod(h + shift, 1.0)
+        ramp = np.minimum(6.0 * hue, 4.0 - 6.0 * hue)
+        np.clip(ramp, 0.0, 1.0, out=ramp)
+        rgb[..., k] = m1 + (m2 - m1) * ramp
+    return rgb
 
-def get_color(z: complex) -> List:
+def get_color(z: Union[complex, np.ndarray]) -> Union[List, np.ndarray]:
     '''
     Returns the color associated with the point at this particular location.
     Note that this does not update the color.
@@ -75,9 +144,10 @@ def get_color(z: complex) -> List:
     https://en.wikipedia.org/wiki/Domain_coloring
 
     Parameters:
-    z (complex): the point to assign a color to
+    z (complex or np.ndarray): the point(s) to assign a color to
     Returns:
-    List: (r, g, b, a)
+    List: (r, g, b) for a single point, or
+    np.ndarray: array with a last axis of length 3 for an array of points
     '''
 
     r = z.real
@@ -87,7 +157,62 @@ def get_color(z: complex) -> List:
     s = 1
     r = np.sqrt(r ** 2 + i ** 2)
     l = (2 / np.pi) * np.arctan(r)
-    return colorsys.hls_to_rgb(h, l, s)
+    if np.ndim(z) == 0:
+        return colorsys.hls_to_rgb(h, l, s)
+    return hls_to_rgb(h, l, s)
+
+def render_domain_coloring(func, extent: Tuple[float, float, float, float], shape: Tuple[int, int],
+                           path: str = None) -> np.ndarray:
+    '''
+    Colors every pixel of a grid by the value of func there, using get_color.
+    The image is laid out for plt.imshow(image, extent=extent), so the first
+    row holds the largest imaginary part.
+    Pixels where func is not finite are left transparent.
+    Parameters:
+    func (function): function applied to a 2D array of complex points at once
+    extent (Tuple[float, float, float, float]): (min_r, max_r, min_c, max_c)
+    shape (Tuple[int, int]): (rows, columns) of the image
+    path (str): if given, the image is also written to this PNG file
+    Returns:
+    np.ndarray: uint8 array of shape (rows, columns, 4) holding (r, g, b, a)
+    '''
+    min_r, max_r, min_c, max_c = extent
+    rows, cols = shape
+    reals = np.linspace(min_r, max_r, cols)
+    imags = np.linspace(max_c, min_c, rows)
+    re, im = np.meshgrid(reals, imags)
+
+    with np.errstate(all='ignore'):
+        values = np.asarray(func(re + 1j * im), dtype=np.complex128)
+        finite = np.isfinite(values)
+        rgb = get_color(np.where(finite, values, 0))
+
+    image = np.empty((rows, cols, 4), dtype=np.uint8)
+    image[..., :3] = np.clip(np.rint(rgb * 255), 0, 255)
+    image[..., 3] = np.where(finite, 255, 0)
+
+    if path is not None:
+        import matplotlib.image
+        matplotlib.image.imsave(path, image)
+    return image
+
+def grid_axes(min_r: float, max_r: float, min_c: float, max_c: float, density=10) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns the real and imaginary values of the grid used by generate_complex.
+    The number of values along each axis is density times the length of the
+    range, rounded to the nearest integer (and at least one), so that the
+    extents need not be integers.
+    Parameters:
+    min_r (float), min_c (float): the minimum value for real and complex components, respectively
+    max_r (float), max_c (float): the maximum value for real and complex components, respectively
+    density (float): the number of points generated per unit
+    Returns:
+    np.ndarray: real values
+    np.ndarray: imaginary values
+    '''
+    n_r = max(int(round(density * (max_r - min_r))), 1)
+    n_c = max(int(round(density * (max_c - min_c))), 1)
+    return np.linspace(min_r, max_r, n_r), np.linspace(min_c, max_c, n_c)
 
 def generate_complex(min_r: float, max_r: float, min_c: float, max_c: float, density=10) -> List[complex]:
     '''
@@ -101,15 +226,15 @@ def generate_complex(min_r: float, max_r: float, min_c: float, max_c: float, den
     Returns:
     List[complex]: list of complex values in the given range with specified density
     '''
-    reals = np.linspace(min_r, max_r, density*(max_r - min_r))
-    imags = np.linspace(min_c, max_c, density*(max_c - min_c))
+    reals, imags = grid_axes(min_r, max_r, min_c, max_c, density)
     results = []
     for r in reals:
         for i in imags:
             results.append(complex(r, i))
     return results
 
-def generate_complex_point(min_r: float, max_r: float, min_c: float, max_c: float, density=10) -> List[Point]:
+def generate_complex_point(min_r: float, max_r: float, min_c: float, max_c: float, density=10,
+                           as_array: bool = False) -> Union[List[Point], PointArray]:
     '''
     Generates a list of Point objects
     real value in the range [min_r, max_r] and complex value
@@ -118,11 +243,16 @@ def generate_complex_point(min_r: float, max_r: float, min_c: float, max_c: floa
     min_r (float), min_c (float): the minimum value for real and complex components, respectively
     max_r (flaot), max_c (float): the maximum value for real and complex components, respectively
     density (int): the number of points generated per unit
+    as_array (bool): whether to return a PointArray instead of a list of Points
     Returns:
-    List[Point]: list of Points in the given range with specified density
+    List[Point] or PointArray: Points in the given range with specified density
     '''
-    reals = np.linspace(min_r, max_r, density*(max_r - min_r))
-    imags = np.linspace(min_c, max_c, density*(max_c - min_c))
+    reals, imags = grid_axes(min_r, max_r, min_c, max_c, density)
+
+    # Same order as the loops below: the imaginary part varies fastest
+    if as_array:
+        return _grid_point_array((reals[:, None] + 1j * imags[None, :]).reshape(-1))
+
     results = []
     for r in reals:
         for i in imags:
@@ -132,11 +262,76 @@ def generate_complex_point(min_r: float, max_r: float, min_c: float, max_c: floa
             if i == 0:
                 if r == 0:
                     p.is_origin = True
-                print('set the axis to be True')
                 p.on_axis = True
             results.append(p)
     return results
 
+def _grid_point_array(z: np.ndarray) -> PointArray:
+    '''
+    Wraps grid points in a PointArray, flagging the points on the real axis and the origin.
+    '''
+    on_axis = z.imag == 0
+    is_origin = on_axis & (z.real == 0)
+    return PointArray(z, flags = pack_flags(is_origin, on_axis, False))
+
+def iter_complex(min_r: float, max_r: float, min_c: float, max_c: float, density=10,
+                 chunk_size: int = 65536) -> Iterator[np.ndarray]:
+    '''
+    Generates the same points as generate_complex, in the same order, as
+    arrays of at most chunk_size points so that the whole grid is never
+    held in memory.
+    Parameters:
+    min_r (float), min_c (float): the minimum value for real and complex components, respectively
+    max_r (float), max_c (float): the maximum value for real and complex components, respectively
+    density (float): the number of points generated per unit
+    chunk_size (int): the number of points in each chunk, except possibly the last
+    Returns:
+    Iterator[np.ndarray]: complex128 chunks of the grid
+    '''
+    if chunk_size < 1:
+        raise ValueError(f'chunk_size must be positive, got {chunk_size}')
+    reals, imags = grid_axes(min_r, max_r, min_c, max_c, density)
+    total = len(reals) * len(imags)
+    for start in range(0, total, chunk_size):
+        index = np.arange(start, min(start + chunk_size, total))
+        chunk = np.empty(len(index), dtype=np.complex128)
+        chunk.real = reals[index // len(imags)]
+        chunk.imag = imags[index % len(imags)]
+        yield chunk
+
+def iter_complex_point(min_r: float, max_r: float, min_c: float, max_c: float, density=10,
+                       chunk_size: int = 65536) -> Iterator[PointArray]:
+    '''
+    Generates the same points as generate_complex_point, in the same order,
+    as PointArrays of at most chunk_size points.
+    Parameters:
+    See iter_complex
+    Returns:
+    Iterator[PointArray]: chunks of the grid
+    '''
+    for chunk in iter_complex(min_r, max_r, min_c, max_c, density, chunk_size):
+        yield _grid_point_array(chunk)
+
+def generate_complex_memmap(path: str, min_r: float, max_r: float, min_c: float, max_c: float, density=10,
+                            chunk_size: int = 65536) -> np.memmap:
+    '''
+    Writes the points of generate_complex to a raw complex128 file one chunk
+    at a time and returns it memory-mapped.
+    Parameters:
+    path (str): file to write
+    See iter_complex for the remaining parameters
+    Returns:
+    np.memmap: the grid, backed by the file
+    '''
+    reals, imags = grid_axes(min_r, max_r, min_c, max_c, density)
+    grid = np.memmap(path, dtype=np.complex128, mode='w+', shape=(len(reals) * len(imags),))
+    start = 0
+    for chunk in iter_complex(min_r, max_r, min_c, max_c, density, chunk_size):
+        grid[start:start + len(chunk)] = chunk
+        start += len(chunk)
+    grid.flush()
+    return grid
+
 def get_coords_from_complex(lst: List[complex]) -> List[float]:
     '''
     Given a list of complex points, returns a list of order pairs of
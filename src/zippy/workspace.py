@@ -0,0 +1,97 @@
+'''
+workspace.py
+Preallocated buffers for evaluating the chain without allocating arrays.
+
+Each stage of the chain needs a few temporary arrays, for the factors of
+f_2(f_1(z)), the parts of f3sqrt and the masks of special points. A Workspace
+holds all of them, sized once for the largest chunk, and F_a.apply, f3sqrt
+and Zipper.chain write into it through their workspace arguments. After the
+first chunk of a given length, a whole sweep through the chain allocates no
+arrays. A Workspace must only be used by one thread at a time; thread_workspace
+gives every thread its own.
+'''
+
+import threading
+import numpy as np
+
+class Workspace:
+
+    '''
+    Temporary arrays for one chunk of points, see the module docstring.
+    '''
+
+    # The arrays of each kind, by name
+    COMPLEX = ('result', 'other', 'denom', 'root', 'power')
+    REAL = ('big', 'small', 'real', 'upper', 'f1')
+    BOOL = ('axis', 'right', 'at_inf', 'at_b', 'negative', 'on_real')
+
+    def __init__(self, size: int, dtype: np.dtype = np.complex128):
+        '''
+        Constructor. Allocates every array.
+        Parameters:
+        size (int): the largest number of points the workspace is used for
+        dtype (np.dtype): complex128, or complex64 for single precision chains
+        Raises:
+        ValueError if dtype is not complex64 or complex128
+        '''
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.complex64, np.complex128):
+            raise ValueError(f'dtype must be complex64 or complex128, got {self.dtype}.')
+        self.size = size
+        real = np.empty(0, dtype=self.dtype).real.dtype
+        for name in self.COMPLEX:
+            setattr(self, name, np.empty(size, dtype=self.dtype))
+        for name in self.REAL:
+            setattr(self, name, np.empty(size, dtype=real))
+        for name in self.BOOL:
+            setattr(self, name, np.empty(size, dtype=bool))
+
+        # The last workspace sliced for a shorter chunk, which is reused while the
+        # length stays the same, as it does for every chunk but the last
+        self._view = self
+
+    def __call__(self, n: int) -> 'Workspace':
+        '''
+        Returns a workspace for n points that shares these arrays.
+        Parameters:
+        n (int): the number of points
+        Returns:
+        Workspace
+        Raises:
+        ValueError if n is larger than the workspace
+        '''
+        if n == self.size:
+            return self
+        if self._view.size == n:
+            return self._view
+        if n > self.size:
+            raise ValueError(f'The workspace holds {self.size} points, {n} were given.')
+        view = Workspace.__new__(Workspace)
+        view.dtype = self.dtype
+        view.size = n
+        for name in self.COMPLEX + self.REAL + self.BOOL:
+            setattr(view, name, getattr(self, name)[:n])
+        view._view = view
+        self._view = view
+        return view
+
+_local = threading.local()
+
+def thread_workspace(size: int, dtype: np.dtype = np.complex128) -> Workspace:
+    '''
+    Returns the workspace of the calling thread for this dtype, replaced by a larger
+    one when size does not fit, so that each thread reuses its own buffers.
+    Parameters:
+    size (int): the number of points needed
+    dtype (np.dtype): see Workspace
+    Returns:
+    Workspace: for exactly size points
+    '''
+    workspaces = getattr(_local, 'workspaces', None)
+    if workspaces is None:
+        workspaces = _local.workspaces = {}
+    key = np.dtype(dtype)
+    workspace = workspaces.get(key)
+    if workspace is None or workspace.size < size:
+        workspace = workspaces[key] = Workspace(size, key)
+    return workspace(size)
@@ -0,0 +1,75 @@
+'''
+test_adaptive.py
+Test the adaptive sampler.
+
+To run:
+poetry run pytest tests/test_adaptive.py
+'''
+
+import numpy as np
+import pytest
+from zippy.adaptive import adaptive_sample
+from zippy.f_a import F_a
+from zippy.utils import get_color
+
+def test_linear_map_is_not_refined():
+    '''
+    Ensure that a map that is linear everywhere keeps the starting grid.
+    '''
+    sample = adaptive_sample(lambda z: 2 * z + 1, (-1, 1, -1, 1), initial=4, criterion='value')
+    assert len(sample) == 5 ** 2 + 4 ** 2
+    assert len(sample.cells) == 16
+    assert np.allclose(sample.values, 2 * sample.points + 1)
+
+@pytest.mark.parametrize('criterion', ['color', 'value'])
+def test_refines_near_base_point(criterion):
+    '''
+    Ensure that F_a is sampled finely only near a, where it is far from linear,
+    with far fewer evaluations than a uniform grid at the finest resolution.
+    '''
+    f = F_a(complex(.3, -.7))
+    calls = []
+    def func(z):
+        calls.append(len(z))
+        return f.apply(z)
+    sample = adaptive_sample(func, (-2, 2, -2, 0), initial=16, max_depth=6, criterion=criterion)
+    assert sum(calls) == len(sample)
+    assert len(sample) * 50 < 1024 ** 2
+
+    # The smallest cells are next to a
+    sizes = sample.cells[:, 1] - sample.cells[:, 0]
+    centers = (sample.cells[:, 0] + sample.cells[:, 1]) / 2 + 1j * (sample.cells[:, 2] + sample.cells[:, 3]) / 2
+    assert np.min(np.abs(centers[sizes == sizes.min()] - f.a)) < .1
+
+    # The cells that were not split cover the rectangle
+    assert np.isclose(np.sum(sizes * (sample.cells[:, 3] - sample.cells[:, 2])), 8)
+
+def test_interpolation_matches_the_map():
+    '''
+    Ensure that colors interpolated over the triangulation are close to the
+    colors of the map at points that were not sampled.
+    '''
+    import matplotlib.tri
+    f = F_a(complex(.3, -.7))
+    sample = adaptive_sample(f.apply, (-2, 2, -2, -1e-9), tol=.02)
+    triangulation = sample.triangulation()
+    colors = sample.colors()
+
+    rng = np.random.default_rng(0)
+    z = rng.uniform(-2, 2, 2000) + 1j * rng.uniform(-2, 0, 2000)
+    estimate = np.stack([matplotlib.tri.LinearTriInterpolator(triangulation, colors[:, k])(z.real, z.imag)
+                         for k in range(3)], axis=-1)
+    # Points outside the triangulation are masked, and np.percentile ignores masks
+    error = np.abs(estimate - get_color(f.apply(z))).max(axis=-1)
+    error = np.ma.masked_invalid(error).compressed()
+    assert len(error) > 1900
+    assert np.percentile(error, 99) < .05
+
+def test_invalid():
+    '''
+    Ensure that an unknown criterion and a grid of no cells are rejected.
+    '''
+    with pytest.raises(ValueError):
+        adaptive_sample(lambda z: z, (0, 1, 0, 1), criterion='derivative')
+    with pytest.raises(ValueError):
+        adaptive_sample(lambda z: z, (0, 1, 0, 1), initial=0)
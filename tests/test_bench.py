@@ -0,0 +1,35 @@
+'''
+test_bench.py
+Test the benchmark harness.
+
+To run:
+poetry run pytest tests/test_bench.py
+'''
+
+import json
+from zippy import bench
+
+def test_compare():
+    '''
+    Ensure that only benchmarks slower than the threshold, and present in
+    both runs, are flagged.
+    '''
+    baseline = {'a': 1.0, 'b': 1.0, 'c': 1.0}
+    results = {'a': 1.1, 'b': 1.5, 'd': 9.0}
+    assert bench.compare(results, baseline, threshold=0.2) == ['b']
+    assert bench.compare(results, baseline, threshold=0.6) == []
+
+def test_save_and_compare(tmp_path):
+    '''
+    Ensure that a quick run writes a baseline that a later run can compare against.
+    '''
+    path = tmp_path / 'baseline.json'
+    assert bench.main(['--quick', '--sizes', '50', '--save', str(path)]) == 0
+    saved = json.loads(path.read_text())
+    assert 'zipper_build_50' in saved['results']
+    assert 'numpy' in saved['environment']
+
+    # Every timing is far above a baseline of zero seconds
+    saved['results'] = {name: 0.0 for name in saved['results']}
+    path.write_text(json.dumps(saved))
+    assert bench.main(['--quick', '--sizes', '50', '--compare', str(path)]) == 1
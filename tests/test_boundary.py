@@ -0,0 +1,117 @@
+'''
+test_boundary.py
+Test the loading, deduplication and simplification of large boundary curves.
+
+To run:
+poetry run pytest tests/test_boundary.py
+'''
+
+import time
+import numpy as np
+import pytest
+from zippy.boundary import deduplicate, load_boundary, read_vertices, signed_area, simplify
+from zippy.zipper import Zipper
+
+def star(n: int) -> np.ndarray:
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    return np.exp(1j * t) * (1 + .3 * np.cos(3 * t))
+
+def square(n: int) -> np.ndarray:
+    side = np.linspace(0, 1, n, endpoint=False)
+    return np.concatenate([side, 1 + 1j * side, 1 + 1j - side, 1j - 1j * side])
+
+def test_deduplicate_matches_walking_every_vertex():
+    '''
+    Ensure that streamed deduplication keeps exactly the vertices that a walk
+    along the curve from each kept vertex would, whatever the chunks.
+    '''
+    rng = np.random.default_rng(0)
+    z = np.cumsum(rng.exponential(1, 2000) * np.exp(2j * np.pi * rng.uniform(size=2000)))
+    for tol in (0, .3, 1, 3):
+        lengths = np.concatenate([[0], np.cumsum(np.abs(np.diff(z)))])
+        expected = [0]
+        for i in range(1, len(z)):
+            if lengths[i] - lengths[expected[-1]] > tol:
+                expected.append(i)
+        expected = z[expected]
+        while np.abs(expected[-1] - expected[0]) <= tol:
+            expected = expected[:-1]
+        for chunk in (7, 100, 5000):
+            np.testing.assert_array_equal(deduplicate(iter(np.split(z, range(chunk, len(z), chunk))), tol), expected)
+
+def test_load_boundary(tmp_path):
+    '''
+    Ensure that a clockwise curve with repeated vertices, as npy, npy of pairs and CSV,
+    is loaded counterclockwise, brought down to the target, and flagged for the zipper.
+    '''
+    z = np.repeat(star(20000)[::-1], 2)
+    z[0] = 1.3
+    np.save(tmp_path / 'curve.npy', z)
+    np.save(tmp_path / 'pairs.npy', np.stack([z.real, z.imag], axis=1))
+    np.savetxt(tmp_path / 'curve.csv', np.stack([z.real, z.imag], axis=1), delimiter=',')
+
+    points = load_boundary(str(tmp_path / 'curve.npy'), target=300, chunk_size=4096)
+    assert len(points) == 300
+    assert signed_area(points.z) > 0
+    assert points.z[0] == 1.3 and points.on_axis[0]
+    np.testing.assert_array_equal(points.on_axis, points.z.imag == 0)
+    assert not np.any(points.on_arc)
+    for other in ('pairs.npy', 'curve.csv'):
+        np.testing.assert_array_equal(load_boundary(str(tmp_path / other), target=300, chunk_size=4096).z, points.z)
+
+    # Every vertex kept is on the curve, and the zipper sends them to the circle
+    assert np.all(np.isin(points.z, z))
+    zipper = Zipper(points, interior=0)
+    assert np.max(np.abs(np.abs(zipper.forward(points.z)) - 1)) < 1e-12
+    assert len(load_boundary(str(tmp_path / 'curve.npy'))) == 20000
+
+def test_load_small_csv(tmp_path):
+    '''
+    Ensure that a CSV of a few vertices loads with the default chunk size, without
+    reading past its end for every vertex of a chunk in either pass over the file.
+    '''
+    (tmp_path / 'pentagon.csv').write_text(''.join(f'{np.cos(t)},{np.sin(t)}\n'
+                                                   for t in np.linspace(0, 2 * np.pi, 5, endpoint=False)))
+    start = time.perf_counter()
+    points = load_boundary(str(tmp_path / 'pentagon.csv'))
+    assert time.perf_counter() - start < 1
+    assert len(points) == 5 and signed_area(points.z) > 0
+
+def test_simplify_keeps_corners_and_follows_curvature():
+    '''
+    Ensure that corners are always kept, that resampled vertices lie on the edges,
+    and that turning draws vertices to the tips of a star.
+    '''
+    z = square(1000)
+    for method in ('decimate', 'resample'):
+        simple = simplify(z, 20, method=method)
+        assert len(simple) <= 20
+        assert np.all(np.isin([0, 1, 1 + 1j, 1j], simple))
+        on_edges = (np.isclose(simple.real, 0) | np.isclose(simple.real, 1) |
+                    np.isclose(simple.imag, 0) | np.isclose(simple.imag, 1))
+        assert np.all(on_edges)
+    assert len(simplify(z, 20, method='resample')) == 20
+
+    # The tips of the star, at angles 0 and 2 pi / 3, turn the most
+    curve = star(30000)
+    arc = simplify(curve, 200, curvature=0)
+    curved = simplify(curve, 200, curvature=.9)
+    near_tip = lambda v: np.sum(np.abs(np.angle(v)) < .2)
+    assert near_tip(curved) > near_tip(arc)
+
+def test_errors(tmp_path):
+    '''
+    Ensure that bad inputs are reported.
+    '''
+    np.save(tmp_path / 'bad.npy', np.zeros((4, 3)))
+    with pytest.raises(ValueError):
+        list(read_vertices(str(tmp_path / 'bad.npy')))
+    with pytest.raises(ValueError):
+        list(read_vertices(str(tmp_path / 'curve.txt')))
+    np.save(tmp_path / 'line.npy', np.array([0, 1, 1, 0], dtype=np.complex128))
+    with pytest.raises(ValueError):
+        load_boundary(str(tmp_path / 'line.npy'))
+    with pytest.raises(ValueError):
+        simplify(square(10), 2)
+    with pytest.raises(ValueError):
+        simplify(square(10), 10, method='spline')
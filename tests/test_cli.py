@@ -0,0 +1,166 @@
+'''
+test_cli.py
+Test the zippy command.
+
+To run:
+poetry run pytest tests/test_cli.py
+'''
+
+import io
+import os
+import sys
+import numpy as np
+import pytest
+from zippy import cli
+from zippy.zipper import Zipper
+
+@pytest.fixture
+def saved(tmp_path):
+    t = np.linspace(0, 2 * np.pi, 40, endpoint=False)
+    zipper = Zipper(np.exp(1j * t) * (1 + .3 * np.cos(3 * t)), interior=0)
+    path = tmp_path / 'map.zippy'
+    zipper.save(str(path))
+    return zipper, str(path)
+
+def points(n: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.uniform(0, .6, n) * np.exp(2j * np.pi * rng.uniform(size=n))
+
+def test_npy_files(saved, tmp_path, capsys):
+    '''
+    Ensure that mapping an npy file in several chunks gives the same images as
+    forward, and that the throughput is reported.
+    '''
+    zipper, path = saved
+    z = points(1000)
+    np.save(tmp_path / 'points.npy', z)
+    assert cli.main([path, str(tmp_path / 'points.npy'), '-o', str(tmp_path / 'images.npy'), '--chunk-size', '300']) == 0
+    assert np.array_equal(np.load(tmp_path / 'images.npy'), zipper.forward(z))
+    assert '1000 points' in capsys.readouterr().err
+
+@pytest.mark.parametrize('out_format', ['raw', 'csv', 'npy'])
+def test_streams(saved, out_format):
+    '''
+    Ensure that raw and csv streams round trip through the forward and inverse maps.
+    '''
+    zipper, _ = saved
+    z = points(500)
+    source = io.BytesIO(z.astype('<c16').tobytes())
+    target = io.BytesIO()
+    assert cli.run(zipper, source, target, 'raw', out_format, chunk_size=128) == 500
+    expected = zipper.forward(z)
+
+    target.seek(0)
+    if out_format == 'csv':
+        images = np.loadtxt(target, delimiter=',')
+        assert np.array_equal(images[:, 0] + 1j * images[:, 1], expected)
+    elif out_format == 'npy':
+        assert np.array_equal(np.load(target), expected)
+    else:
+        assert np.array_equal(np.frombuffer(target.getvalue(), dtype='<c16'), expected)
+
+    # The inverse takes csv back to the points
+    csv = io.BytesIO(''.join(f'{w.real!r},{w.imag!r}\n' for w in expected.tolist()).encode())
+    back = io.BytesIO()
+    cli.run(zipper, csv, back, 'csv', 'raw', inverse=True, chunk_size=100)
+    assert np.allclose(np.frombuffer(back.getvalue(), dtype='<c16'), z, atol=1e-8)
+
+def test_npy_needs_count_or_file(saved):
+    '''
+    Ensure that npy cannot be streamed to a pipe when the number of points is unknown.
+    '''
+    class Pipe(io.BytesIO):
+        def seekable(self):
+            return False
+    zipper, _ = saved
+    with pytest.raises(ValueError):
+        cli.run(zipper, Pipe(b'0.5,0\n'), Pipe(), 'csv', 'npy')
+
+def test_error_in_the_map_is_raised(saved):
+    '''
+    Ensure that an error raised by the map partway through a stream of many chunks
+    is raised by run, rather than leaving the reader blocked on a full queue.
+    '''
+    zipper, _ = saved
+    calls = []
+
+    def failing(z):
+        calls.append(len(z))
+        if len(calls) == 3:
+            raise ValueError('map failed')
+        return zipper.forward(z)
+
+    zipper.forward = failing
+    source = io.BytesIO(points(1000).astype('<c16').tobytes())
+    with pytest.raises(ValueError, match='map failed'):
+        cli.run(zipper, source, io.BytesIO(), 'raw', 'raw', chunk_size=10)
+    assert len(calls) == 3
+
+def test_short_csv_stops_at_the_end(saved):
+    '''
+    Ensure that a csv stream much shorter than a chunk is read to its end once,
+    rather than read past the end for every line of the chunk.
+    '''
+    class Counting(io.BytesIO):
+        reads = 0
+
+        def read1(self, size=-1):
+            Counting.reads += 1
+            return super().read1(size)
+
+    zipper, _ = saved
+    target = io.BytesIO()
+    assert cli.run(zipper, Counting(b'0.1,0.2\n# a comment\n0.3,-0.1\n'), target, 'csv', 'raw') == 2
+    assert np.array_equal(np.frombuffer(target.getvalue(), dtype='<c16'), zipper.forward(np.array([.1 + .2j, .3 - .1j])))
+    assert Counting.reads < 10
+
+def test_workers_start_once(saved, monkeypatch):
+    '''
+    Ensure that with workers, every chunk of a stream is mapped by one pool of
+    processes, started once and closed at the end.
+    '''
+    zipper, _ = saved
+    pools = []
+
+    class Counting(cli.MapPool):
+        def __init__(self, *args, **kwargs):
+            pools.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(cli, 'MapPool', Counting)
+    z = points(1000)
+    target = io.BytesIO()
+    assert cli.run(zipper, io.BytesIO(z.astype('<c16').tobytes()), target, 'raw', 'raw', chunk_size=300, workers=2) == 1000
+    assert np.array_equal(np.frombuffer(target.getvalue(), dtype='<c16'), zipper.forward(z))
+    assert len(pools) == 1 and pools[0].size == 300
+    assert pools[0]._pool is None
+
+def test_broken_pipe(saved, tmp_path, monkeypatch):
+    '''
+    Ensure that a reader of stdout that goes away ends the command with an exit
+    status rather than a traceback, and stops the stream.
+    '''
+    zipper, path = saved
+    np.save(tmp_path / 'points.npy', points(1000))
+    calls = []
+    forward = zipper.forward
+    monkeypatch.setattr(Zipper, 'load', staticmethod(lambda _: zipper))
+    monkeypatch.setattr(zipper, 'forward', lambda z: calls.append(len(z)) or forward(z), raising=False)
+
+    class Closed(io.BytesIO):
+        def write(self, data):
+            raise BrokenPipeError
+
+    class Stdout:
+        buffer = Closed()
+
+        def fileno(self):
+            return descriptor
+
+    descriptor = os.open(tmp_path / 'stdout', os.O_WRONLY | os.O_CREAT)
+    monkeypatch.setattr(sys, 'stdout', Stdout())
+    try:
+        assert cli.main([path, str(tmp_path / 'points.npy'), '--output-format', 'raw', '--chunk-size', '10', '-q']) == 1
+    finally:
+        os.close(descriptor)
+    assert len(calls) < 100
@@ -13,7 +13,7 @@ import pytest
 import numpy as np
 from zippy.point import Point
 from zippy.f_a import F_a
-from zippy.utils import f3sqrt
+from zippy.utils import f3sqrt, sign
 
 REL_TOL = 1e-9
 
@@ -163,4 +163,168 @@ def test_f3_correct_computation():
     assert f.f3(point_on_axis_negative)[0].z.imag == 0
 
 def test_f3_special_points():
-    pass
\ No newline at end of file
+    pass
+
+def test_array_maps_match_scalar():
+    '''
+    Ensure that the batch versions of f_1, f_2, and f_3 agree exactly with
+    the scalar maps, including the flags carried along by each point.
+    '''
+    a = Point(complex(3, 4), name='a')
+    f = F_a(a)
+
+    z = np.array([complex(.5, .5), complex(-.5, -.5), complex(0, 3), complex(3, 0), complex(-2, 0), complex(1, -2)])
+    is_origin = np.array([False, False, False, False, False, False])
+    on_axis = np.array([False, False, False, True, True, False])
+    on_arc = np.array([False, True, False, False, False, False])
+    branch_sign = np.array([1, -1, 1, 1, -1, 0])
+    pts = [Point(complex(z[i]), is_origin=bool(is_origin[i]), on_axis=bool(on_axis[i]),
+                 on_arc=bool(on_arc[i]), branch_sign=int(branch_sign[i])) for i in range(len(z))]
+
+    for scalar_map, array_map in [(f.f1, f.f1_array), (f.f2, f.f2_array), (f.f3, f.f3_array)]:
+        results = array_map(z, is_origin, on_axis, on_arc, branch_sign)
+        for i, p in enumerate(pts):
+            expected = scalar_map(p)
+            if isinstance(expected, list):
+                assert len(expected) == (2 if results[5][i] else 1)
+                expected = expected[0]
+            assert expected.z == results[0][i]
+            assert expected.on_axis == results[2][i]
+            assert expected.branch_sign == results[4][i]
+
+def test_f1_array_special_points():
+    '''
+    Ensure that the batch version of f_1 sends b to infinity.
+    '''
+    a = Point(complex(3, 4), name='a')
+    f = F_a(a)
+    z, _, _, _, branch_sign = f.f1_array(np.array([complex(25 / 3, 0), complex(0, 0)]))
+    assert np.isinf(z[0])
+    assert branch_sign[0] == 0
+    assert z[1] == 0
+
+def test_apply_matches_composition():
+    '''
+    Ensure that the fused map agrees with f_3(f_2(f_1(z))), including
+    the branch chosen for points on the real axis.
+    '''
+    a = Point(complex(3, -4), name='a')
+    f = F_a(a)
+
+    z = np.array([complex(.5, -.5), complex(-2, -1), complex(1, 0), complex(-1, 0), complex(10, 0)])
+    on_axis = z.imag == 0
+    results = f.apply(z)
+    for i in range(len(z)):
+        expected = f.f3(f.f2(f.f1(Point(complex(z[i]), is_origin=False, on_axis=bool(on_axis[i])))))[0].z
+        assert cmath.isclose(results[i], expected, rel_tol=REL_TOL)
+
+def test_apply_special_points():
+    '''
+    Ensure that the fused map sends a to exactly 0 and b to infinity.
+    '''
+    a = Point(complex(3, -4), name='a')
+    f = F_a(a)
+    results = f.apply(np.array([a.z, f.b]))
+    assert results[0] == 0
+    assert np.isinf(results[1])
+
+def test_apply_inverse():
+    '''
+    Ensure that apply_inverse undoes apply on the lower half plane and on the
+    real axis, and sends 0 back to a and \\infty back to b.
+    '''
+    a = Point(complex(3, -4), name='a')
+    f = F_a(a)
+
+    z = np.array([complex(.5, -.5), complex(-2, -1), complex(1, 0), complex(-1, 0), complex(10, 0), complex(4, -3.9)])
+    results = f.apply_inverse(f.apply(z))
+    for i in range(len(z)):
+        assert cmath.isclose(results[i], z[i], rel_tol=REL_TOL)
+
+    special = f.apply_inverse(np.array([0, np.inf]))
+    assert cmath.isclose(special[0], a.z, rel_tol=REL_TOL)
+    assert special[1] == f.b
+
+def test_stage_inverses():
+    '''
+    Ensure that inverting f_3, f_2 and f_1 in turn agrees with apply_inverse,
+    including the branch of points on the real axis.
+    '''
+    f = F_a(complex(3, -4))
+    w = f.apply(np.array([complex(.5, -.5), complex(-2, -1), complex(1, 0), complex(-1, 0)]))
+
+    v, branch_sign = f.f3_inverse(w)
+    results = f.f1_inverse(f.f2_inverse(v, branch_sign))
+    assert np.allclose(results, f.apply_inverse(w), rtol=REL_TOL)
+
+def test_apply_inverse_polish():
+    '''
+    Ensure that points near \\pm c, where the inverse is sensitive to rounding,
+    are sent to points whose image is at least as close.
+    '''
+    f = F_a(complex(3, -4))
+    w = np.array([complex(f.c * (1 + 1e-9), -1e-9), complex(-f.c + 1e-10, -1e-12)])
+    polished = np.abs(f.apply(f.apply_inverse(w)) - w)
+    exact = np.abs(f.apply(f.apply_inverse(w, polish=False)) - w)
+    assert np.all(polished <= exact)
+    assert np.all(polished < 1e-14 * np.abs(f.c))
+
+def test_derivative():
+    '''
+    Ensure that the derivative agrees with a central difference.
+    '''
+    f = F_a(complex(3, -4))
+    z = np.array([complex(.5, -.5), complex(-2, -1), complex(6, -2)])
+    h = 1e-6
+    difference = (f.apply(z + h) - f.apply(z - h)) / (2 * h)
+    assert np.allclose(f.derivative(z), difference, rtol=1e-6)
+
+def test_stage_derivatives():
+    '''
+    Ensure that the derivatives carried through f_1, f_2, f_3 and the fused
+    map agree with central differences and with each other.
+    '''
+    f = F_a(complex(3, -4))
+    z = np.array([complex(.5, -.5), complex(-2, -1), complex(6, -2)])
+    h = 1e-6
+
+    for stage in (f.f1_array, f.f2_array):
+        dz = np.ones_like(z)
+        stage(z, dz=dz)
+        difference = (stage(z + h)[0] - stage(z - h)[0]) / (2 * h)
+        assert np.allclose(dz, difference, rtol=1e-6)
+
+    # f_3 is differentiated away from its branch cut
+    w = f.f2_array(f.f1_array(z)[0])[0]
+    dz = np.ones_like(w)
+    f.f3_array(w, dz=dz)
+    difference = (f.f3_array(w + h)[0] - f.f3_array(w - h)[0]) / (2 * h)
+    assert np.allclose(dz, difference, rtol=1e-6)
+
+    dz = np.full_like(z, 2)
+    f.apply(z, dz=dz)
+    assert np.allclose(dz, 2 * f.derivative(z), rtol=REL_TOL)
+
+def test_f3sqrt_array():
+    '''
+    Ensure that the array version of the custom square root agrees with
+    the polar form r^{1/2}e^{i theta/2}, theta in [-2pi, 0), and can write in place.
+    '''
+    z = np.array([complex(3, 4), complex(3, -4), complex(-4, 1e-3), complex(-4, -1e-3), complex(0, 2), complex(1e-20, 1e20)])
+    theta = np.mod(np.angle(z) + 2 * np.pi, 2 * np.pi) - 2 * np.pi
+    expected = np.sqrt(np.abs(z)) * np.exp(1j * theta / 2)
+
+    results = f3sqrt(z)
+    assert np.allclose(results, expected, rtol=1e-14, atol=0)
+    assert np.all(results.imag <= 0)
+
+    f3sqrt(z, out=z)
+    assert np.array_equal(z, results)
+    assert cmath.isclose(f3sqrt(complex(3, 4)), complex(-2, -1), rel_tol=REL_TOL)
+
+def test_sign_array():
+    '''
+    Ensure that the array version of sign agrees with the scalar version.
+    '''
+    z = np.array([complex(1, 1), complex(-1, 1), complex(0, -1), complex(-1e-300, 0)])
+    assert list(sign(z)) == [sign(complex(p)) for p in z]
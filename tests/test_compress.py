@@ -0,0 +1,62 @@
+'''
+test_compress.py
+Test the compression of the end of a zipper chain by a power series.
+
+To run:
+poetry run pytest tests/test_compress.py
+'''
+
+import numpy as np
+import pytest
+from zippy.compress import compress
+from zippy.zipper import Zipper
+
+def star(n: int) -> Zipper:
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    return Zipper(np.exp(1j * t) * (1 + .3 * np.cos(3 * t)), interior=0)
+
+def disk_points(n: int, radius: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return radius * np.sqrt(rng.uniform(size=n)) * np.exp(2j * np.pi * rng.uniform(size=n))
+
+def test_compressed_chain_matches_full_chain():
+    '''
+    Ensure that stages are dropped, and that the compressed map stays within its
+    reported bound of the full chain on new points of the region.
+    '''
+    zipper = star(200)
+    compressed = compress(zipper, disk_points(3000, .4, 0), tol=1e-8)
+    kept, full = compressed.operations()
+    assert full == len(zipper.maps)
+    assert kept < full
+    assert compressed.error_bound <= 1e-8
+
+    z = disk_points(5000, .4, 1)
+    assert np.max(np.abs(compressed.forward(z) - zipper.forward(z))) <= compressed.error_bound
+
+def test_points_outside_the_region_use_the_full_chain():
+    '''
+    Ensure that points away from the compressed region still get the images of the full chain.
+    '''
+    zipper = star(100)
+    compressed = compress(zipper, disk_points(2000, .2, 0), tol=1e-10)
+    far = np.array([complex(.9, 0), complex(-.3, -.8)])
+    assert np.allclose(compressed.forward(far), zipper.forward(far), rtol=0, atol=1e-12)
+
+def test_too_few_points():
+    '''
+    Ensure that too few points to fit the series are reported.
+    '''
+    with pytest.raises(ValueError):
+        compress(star(50), disk_points(20, .2, 0), degree=24)
+
+def test_missed_tolerance_warns():
+    '''
+    Ensure that a warning is given when even the final and disk maps alone cannot be
+    fitted to tol, and that the map returned keeps every stage with its bound.
+    '''
+    zipper = star(60)
+    with pytest.warns(UserWarning):
+        compressed = compress(zipper, disk_points(500, .9, 0), tol=1e-30, degree=4)
+    assert compressed.stages == len(zipper.maps)
+    assert compressed.error_bound > 1e-30
@@ -0,0 +1,81 @@
+'''
+test_disk.py
+Test the complex disk arithmetic used for certified error bounds.
+
+To run:
+poetry run pytest tests/test_disk.py
+'''
+
+import numpy as np
+import pytest
+from zippy.disk import DiskArray, apply_disk
+from zippy.f_a import F_a
+from zippy.precision import ComplexDD, apply_dd
+
+def sample(disks: DiskArray, rng: np.random.Generator) -> np.ndarray:
+    '''
+    Returns a point of each disk near its edge, where the images are farthest from the
+    center, but far enough inside that rounding the results cannot take them out.
+    '''
+    return disks.center + .99 * disks.radius * np.exp(2j * np.pi * rng.uniform(size=len(disks)))
+
+def test_arithmetic_contains():
+    '''
+    Ensure that the result of every operation holds the results for points of the input disks.
+    '''
+    rng = np.random.default_rng(0)
+    x = DiskArray(rng.normal(size=200) + 1j * rng.normal(size=200), 1e-3 * rng.uniform(size=200))
+    y = DiskArray(rng.normal(size=200) + 1j * rng.normal(size=200), 1e-3 * rng.uniform(size=200))
+    for _ in range(20):
+        p, q = sample(x, rng), sample(y, rng)
+        for result, value in [(x + y, p + q), (x - y, p - q), (x * y, p * q), (x / y, p / q),
+                              (2.5 - x, 2.5 - p), (x.square(), p * p), (x.sqrt('principal'), np.sqrt(p))]:
+            assert np.all(result.contains(value))
+
+    # Exact inputs give radii of a few rounding errors
+    exact = DiskArray(np.array([1 + 2j])) * DiskArray(np.array([3 - 1j]))
+    assert exact.center[0] == 5 + 5j
+    assert 0 < exact.radius[0] < 1e-14
+
+def test_reciprocal_of_disk_around_zero():
+    '''
+    Ensure that dividing by a disk that holds 0 certifies nothing.
+    '''
+    x = DiskArray(np.array([1e-3 + 0j, 1 + 0j]), np.array([1e-2, 1e-2]))
+    inverse = x.reciprocal()
+    assert np.isinf(inverse.radius[0])
+    assert np.isfinite(inverse.radius[1])
+
+def test_sqrt_branch_cut():
+    '''
+    Ensure that disks that meet the branch cut of f3sqrt cover both roots, and
+    that disks away from it stay small.
+    '''
+    from zippy.utils import f3sqrt
+    x = DiskArray(np.array([4 - 1e-9j, -4 + 0j, 4 - 1j]), np.array([1e-6, 1e-6, 1e-6]))
+    roots = x.sqrt('f3')
+    assert np.all(roots.contains(f3sqrt(x.center)))
+
+    # Just across the cut, f3sqrt jumps from 2 to -2
+    assert roots.contains(np.array([-2, 0, 0]))[0]
+    assert roots[:1].contains(f3sqrt(np.array([4 + 1e-9j])))[0]
+    assert roots.radius[1] < 1e-5 and roots.radius[2] < 1e-5
+
+    with pytest.raises(ValueError):
+        x.sqrt('other')
+
+@pytest.mark.parametrize('a', [complex(.3, -.7), complex(-2, -.1), complex(0, -1)])
+def test_apply_disk(a):
+    '''
+    Ensure that apply_disk holds the double-double image of points of the
+    lower half plane and of the axis, taken as exact.
+    '''
+    f = F_a(a)
+    rng = np.random.default_rng(1)
+    z = np.concatenate([rng.normal(size=100) - 1j * np.abs(rng.normal(size=100)), 3 * rng.normal(size=20)])
+    disks = apply_disk(f, DiskArray(z))
+    expected = apply_dd(f, ComplexDD.from_complex(z)).to_complex()
+
+    assert np.allclose(disks.center, f.apply(z))
+    assert np.all(disks.contains(expected))
+    assert np.all(disks.radius < 1e-10)
@@ -0,0 +1,105 @@
+'''
+test_point_array.py
+Test the column storage of PointArray and its use in the component maps.
+
+To run:
+poetry run pytest tests/test_point_array.py
+'''
+
+import numpy as np
+from zippy.point import Point, PointArray, pack_flags
+from zippy.branches import apply_chain
+from zippy.f_a import F_a
+from zippy.utils import generate_complex_point
+
+def test_round_trip_points():
+    '''
+    Ensure that converting Points into a PointArray and back keeps
+    every attribute.
+    '''
+    pts = [Point(complex(0, 0), name='o', is_origin=True, on_axis=True),
+           Point(complex(1, 1), name='x', on_axis=False, on_arc=True, branch_sign=-1),
+           Point(complex(2, 0), name='y', on_axis=True, branch_sign=1)]
+    arr = PointArray.from_points(pts)
+
+    assert len(arr) == 3
+    for p, q in zip(pts, arr.to_points()):
+        assert (p.z, p.name, p.is_origin, p.on_axis, p.on_arc, p.branch_sign) == \
+               (q.z, q.name, q.is_origin, q.on_axis, q.on_arc, q.branch_sign)
+
+def test_slicing_and_masking():
+    '''
+    Ensure that slices share memory with the original array while
+    masks copy, and that concatenation restores the original points.
+    '''
+    arr = PointArray(np.arange(6) + 1j, flags=pack_flags(False, np.arange(6) % 2 == 0, False))
+
+    view = arr[1:4]
+    view.z[0] = 10
+    assert arr.z[1] == 10
+
+    evens = arr[arr.on_axis]
+    evens.z[0] = 20
+    assert arr.z[0] != 20
+    assert len(evens) == 3
+
+    joined = PointArray.concatenate([arr[:2], arr[2:]])
+    assert np.array_equal(joined.z, arr.z)
+    assert np.array_equal(joined.flags, arr.flags)
+
+def test_generate_complex_point_array():
+    '''
+    Ensure that the PointArray grid holds the same points and flags
+    as the list of Points.
+    '''
+    pts = generate_complex_point(-1, 1, 0, 1, 3)
+    arr = generate_complex_point(-1, 1, 0, 1, 3, as_array=True)
+
+    assert len(pts) == len(arr)
+    for p, q in zip(pts, arr):
+        assert (p.z, p.is_origin, p.on_axis) == (q.z, q.is_origin, q.on_axis)
+
+def test_f3_point_array_branches():
+    '''
+    Ensure that f_3 on a PointArray returns the second branch only
+    for the points that are multivalued.
+    '''
+    f = F_a(Point(complex(3, 4), name='a'))
+    arr = PointArray(np.array([complex(4, 0), complex(1, -1)]),
+                     flags=pack_flags(False, [True, False], [True, False]),
+                     names=['arc', 'other'])
+    results = f.f3(arr)
+
+    assert len(results) == 2
+    assert len(results[1]) == 1
+    assert results[1].names[0] == 'arc'
+    assert results[0].z[0] == 2
+    assert results[1].z[0] == -2
+
+def test_branch_tracking_matches_fan_out():
+    '''
+    Ensure that tracking branches with a side array keeps the same branches
+    as applying the scalar maps to every Point they return, without the lists.
+    '''
+    maps = [F_a(Point(complex(3, 4), name='a')), F_a(Point(complex(1, 2), name='b'))]
+    pts = [Point(complex(4, 0), name='arc', on_axis=True, on_arc=True),
+           Point(complex(1, -1), name='other', on_axis=False),
+           Point(complex(0, 0), name='origin', is_origin=True, on_axis=True)]
+    branches = apply_chain(maps, PointArray.from_points(pts))
+
+    assert len(branches.primary) == len(pts)
+    assert len(branches.alternate) == len(branches.source)
+    for i, p in enumerate(pts):
+        expected = [p]
+        for f in maps:
+            expected = [q for r in expected for q in f.f3(f.f2(f.f1(r)))]
+        found = branches.branches_of(i)
+        assert np.allclose(sorted(found.z, key=lambda z: (z.real, z.imag)),
+                           sorted([q.z for q in expected], key=lambda z: (z.real, z.imag)))
+        assert set(found.names) == {p.name}
+
+    # Only the split points have alternates, and the primary branch is the first one f3 returns
+    assert list(branches.split) == [True, False, True]
+    assert list(branches.counts()) == [2, 1, 2]
+    first = [maps[1].f3(maps[1].f2(maps[1].f1(maps[0].f3(maps[0].f2(maps[0].f1(p)))[0])))[0].z for p in pts]
+    assert np.allclose(branches.primary.z, first)
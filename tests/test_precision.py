@@ -0,0 +1,71 @@
+'''
+test_precision.py
+Test the double-double arithmetic used for extended precision evaluation.
+
+To run:
+poetry run pytest tests/test_precision.py
+'''
+
+import numpy as np
+from fractions import Fraction
+from zippy.f_a import F_a
+from zippy.precision import two_sum, two_prod, DoubleDouble, ComplexDD, f3sqrt_dd, apply_dd, constants_dd
+from zippy.utils import f3sqrt
+
+def exact(x: DoubleDouble, i: int) -> Fraction:
+    return Fraction(float(x.hi[i])) + Fraction(float(x.lo[i]))
+
+def test_error_free_transforms():
+    '''
+    Ensure that two_sum and two_prod return the rounding error exactly.
+    '''
+    rng = np.random.default_rng(0)
+    a = rng.normal(size=100) * 10.0 ** rng.integers(-10, 10, size=100)
+    b = rng.normal(size=100) * 10.0 ** rng.integers(-10, 10, size=100)
+    s, e = two_sum(a, b)
+    p, f = two_prod(a, b)
+    for i in range(100):
+        assert Fraction(s[i]) + Fraction(e[i]) == Fraction(a[i]) + Fraction(b[i])
+        assert Fraction(p[i]) + Fraction(f[i]) == Fraction(a[i]) * Fraction(b[i])
+
+def test_double_double_arithmetic():
+    '''
+    Ensure that every operation is accurate to far more than double precision.
+    '''
+    rng = np.random.default_rng(1)
+    x = DoubleDouble(rng.normal(size=50)) / 3.0
+    y = DoubleDouble(rng.normal(size=50)) / 7.0
+    tol = Fraction(1, 2 ** 100)
+    for result, op in [(x + y, lambda a, b: a + b), (x - y, lambda a, b: a - b),
+                       (x * y, lambda a, b: a * b), (x / y, lambda a, b: a / b)]:
+        for i in range(50):
+            expected = op(exact(x, i), exact(y, i))
+            assert abs(exact(result, i) - expected) <= tol * abs(expected)
+
+    root = abs(x).sqrt()
+    for i in range(50):
+        assert abs(exact(root, i) ** 2 - abs(exact(x, i))) <= tol * abs(exact(x, i))
+
+def test_f3sqrt_dd():
+    '''
+    Ensure that the double-double root takes the same branch as f3sqrt,
+    including on the cut.
+    '''
+    z = np.array([complex(1, 1), complex(1, -1), complex(-1, 1), complex(-1, -1), complex(4, 0), complex(-4, 0), 0])
+    assert np.allclose(f3sqrt_dd(ComplexDD.from_complex(z)).to_complex(), f3sqrt(z), rtol=1e-15, atol=0)
+
+def test_apply_dd():
+    '''
+    Ensure that the double-double map agrees with the double precision map,
+    including the branch on the real axis and \\infty, and sends b to \\infty.
+    '''
+    for a in (complex(3, -4), complex(-1.2, -.1), complex(0, -1)):
+        f = F_a(a)
+        z = np.array([complex(.5, -.5), complex(-2, -1), complex(1, 0), complex(-1, 0), complex(10, 0), np.inf, a])
+        expected = f.apply(z)
+        results = apply_dd(f, ComplexDD.from_complex(z)).to_complex()
+        assert np.allclose(results, expected, rtol=1e-13, atol=1e-13)
+
+        # b in double-double differs from the rounded f.b
+        _, b, _ = constants_dd(f)
+        assert np.all(np.isinf(apply_dd(f, ComplexDD(b, DoubleDouble(np.zeros(1)))).to_complex()))
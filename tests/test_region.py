@@ -0,0 +1,70 @@
+'''
+test_region.py
+Test the classification of points against a polygon.
+
+To run:
+poetry run pytest tests/test_region.py
+'''
+
+import numpy as np
+import pytest
+from zippy.region import PolygonIndex, EXTERIOR, INTERIOR, NEAR
+
+def star(n: int) -> np.ndarray:
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    return np.exp(1j * t) * (1 + .3 * np.cos(5 * t))
+
+def crossing_number(boundary: np.ndarray, z: np.ndarray) -> np.ndarray:
+    '''
+    Brute force point in polygon, checking every edge for every point.
+    '''
+    start, end = boundary[:, None], np.roll(boundary, -1)[:, None]
+    crosses = (start.imag <= z.imag) != (end.imag <= z.imag)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = start.real + (z.imag - start.imag) / (end.imag - start.imag) * (end.real - start.real)
+    return np.sum(crosses & (x > z.real), axis=0) % 2 == 1
+
+@pytest.mark.parametrize('boundary', [np.array([0, 1, 1 + 1j, 1j]), star(50), star(400)[::-1]])
+def test_classify_matches_brute_force(boundary):
+    '''
+    Ensure that points away from the boundary get the same side as a brute force
+    crossing count, whichever way the polygon is oriented.
+    '''
+    rng = np.random.default_rng(0)
+    z = rng.uniform(-1.5, 1.5, 20000) + 1j * rng.uniform(-1.5, 1.5, 20000)
+    labels = PolygonIndex(boundary, tol=1e-3).classify(z)
+    expected = np.where(crossing_number(boundary, z), INTERIOR, EXTERIOR)
+    decided = labels != NEAR
+    assert np.all(labels[decided] == expected[decided])
+    assert np.mean(decided) > .99
+
+@pytest.mark.parametrize('cells', [None, 1, 40])
+def test_cell_labels_match_brute_force(cells):
+    '''
+    Ensure that the reference point of every cell is labelled as a brute force
+    crossing count labels it, for a jagged polygon whose edges cross many rows.
+    '''
+    rng = np.random.default_rng(3)
+    t = np.linspace(0, 2 * np.pi, 500, endpoint=False)
+    for boundary in (np.exp(1j * t) * (1 + .5 * rng.uniform(size=500)), np.array([0, 2, 2 + 1j, 1 + 1j, 1 + 2j, 2j])):
+        index = PolygonIndex(boundary, cells=cells)
+        np.testing.assert_array_equal(index.inside.reshape(-1), crossing_number(boundary, index.reference.reshape(-1)))
+
+def test_near_boundary():
+    '''
+    Ensure that points within tol of an edge, and vertices, are labelled NEAR.
+    '''
+    square = np.array([0, 1, 1 + 1j, 1j])
+    index = PolygonIndex(square, tol=.01)
+    labels = index.classify(np.array([.5 + .005j, .5 - .005j, .5 + .02j, 1 + 1j, .5 + .5j, 2 + 2j]))
+    assert list(labels) == [NEAR, NEAR, INTERIOR, NEAR, INTERIOR, EXTERIOR]
+
+    # Shapes are kept
+    grid = np.linspace(-.5, 1.5, 12)[:, None] + 1j * np.linspace(-.5, 1.5, 10)
+    assert index.classify(grid).shape == grid.shape
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        PolygonIndex(np.array([0, 1]))
+    with pytest.raises(ValueError):
+        PolygonIndex(np.array([0, 1, 1j]), tol=-1)
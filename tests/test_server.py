@@ -0,0 +1,158 @@
+'''
+test_server.py
+Test the local map server and its batching.
+
+To run:
+poetry run pytest tests/test_server.py
+'''
+
+import asyncio
+import socket
+import struct
+import numpy as np
+import pytest
+from zippy.server import REQUEST, RESPONSE, OK, MapServer, MapClient
+from zippy.zipper import Zipper
+
+def star() -> Zipper:
+    t = np.linspace(0, 2 * np.pi, 40, endpoint=False)
+    return Zipper(np.exp(1j * t) * (1 + .3 * np.cos(3 * t)), interior=0)
+
+def points(n: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, .6, n) * np.exp(2j * np.pi * rng.uniform(size=n))
+
+def test_concurrent_requests_are_batched(tmp_path):
+    '''
+    Ensure that concurrent requests from several clients over a Unix socket get
+    their own images, and are evaluated in fewer batches than there were requests.
+    '''
+    zipper = star()
+
+    async def scenario():
+        server = MapServer({'star': zipper}, window=.05)
+        path = str(tmp_path / 'zippy.sock')
+        await server.start_unix(path)
+        clients = [await MapClient.connect_unix(path) for _ in range(3)]
+        requests = [(clients[k % 3], points(10 + k, k)) for k in range(12)]
+        results = await asyncio.gather(*(client.forward('star', z) for client, z in requests))
+        for (_, z), images in zip(requests, results):
+            assert np.array_equal(images, zipper.forward(z))
+        for client in clients:
+            await client.close()
+        await server.close()
+        return server.stats
+
+    stats = asyncio.run(scenario())
+    assert stats['requests'] == 12
+    assert stats['batches'] < 12
+
+def test_tcp_inverse_and_errors():
+    '''
+    Ensure that the inverse can be requested over localhost TCP, that a full batch
+    runs without waiting for the window, and that errors come back to the client.
+    '''
+    zipper = star()
+
+    async def scenario():
+        server = MapServer({'star': zipper}, window=10, max_batch=5)
+        port = await server.start_tcp()
+        client = await MapClient.connect_tcp('127.0.0.1', port)
+        w = zipper.forward(points(8, 0))
+        back = await asyncio.wait_for(client.inverse('star', w), timeout=5)
+        assert np.allclose(back, points(8, 0), atol=1e-8)
+        with pytest.raises(ValueError, match='No map'):
+            await asyncio.wait_for(client.forward('missing', w), timeout=5)
+        await client.close()
+        await server.close()
+
+    asyncio.run(scenario())
+
+def test_lost_connection_fails_requests():
+    '''
+    Ensure that requests waiting when the connection drops, and requests made after,
+    raise ConnectionError instead of hanging, and that closing the client fails
+    the requests still waiting.
+    '''
+    async def scenario():
+        async def hang_up(reader, writer):
+            await reader.read(1)
+            writer.close()
+
+        server = await asyncio.start_server(hang_up, '127.0.0.1', 0)
+        client = await MapClient.connect_tcp('127.0.0.1', server.sockets[0].getsockname()[1])
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(client.forward('star', points(4, 0)), timeout=5)
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(client.forward('star', points(4, 0)), timeout=5)
+        await client.close()
+        server.close()
+        await server.wait_closed()
+
+        # A server that never answers
+        server = MapServer({'star': star()}, window=10)
+        port = await server.start_tcp()
+        client = await MapClient.connect_tcp('127.0.0.1', port)
+        pending = asyncio.ensure_future(client.forward('star', points(4, 0)))
+        await asyncio.sleep(.05)
+        await client.close()
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(pending, timeout=5)
+        await server.close()
+
+    asyncio.run(scenario())
+
+def test_reset_connection_drops_answers():
+    '''
+    Ensure that a client resetting its connection with a request pending ends the
+    handler cleanly, and that the answer is dropped instead of written to the closed
+    transport, with no error left for the event loop to report.
+    '''
+    async def scenario():
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        server = MapServer({'star': star()}, window=.2)
+        port = await server.start_tcp()
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(REQUEST.pack(0, 0, 4, 4) + b'star' + points(4, 0).astype('<c16').tobytes())
+        await writer.drain()
+        await asyncio.sleep(.05)
+
+        # Closing with a linger of 0 resets the connection
+        writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        writer.transport.abort()
+        await asyncio.sleep(.4)
+        await server.close()
+        return errors, server.stats
+
+    errors, stats = asyncio.run(scenario())
+    assert errors == []
+    assert stats['requests'] == 1
+
+def test_bad_response_is_kept():
+    '''
+    Ensure that a response the client cannot match fails the waiting request and
+    later ones with ConnectionError, without an error left for the event loop to report.
+    '''
+    async def scenario():
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+
+        async def unknown_id(reader, writer):
+            await reader.read(1)
+            writer.write(RESPONSE.pack(12345, OK, 0))
+            await writer.drain()
+
+        server = await asyncio.start_server(unknown_id, '127.0.0.1', 0)
+        client = await MapClient.connect_tcp('127.0.0.1', server.sockets[0].getsockname()[1])
+        with pytest.raises(ConnectionError, match='bad response'):
+            await asyncio.wait_for(client.forward('star', points(4, 0)), timeout=5)
+        with pytest.raises(ConnectionError) as info:
+            await asyncio.wait_for(client.forward('star', points(4, 0)), timeout=5)
+        assert isinstance(info.value.__cause__, KeyError)
+        await client.close()
+        server.close()
+        await server.wait_closed()
+        return errors
+
+    assert asyncio.run(scenario()) == []
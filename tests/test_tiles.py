@@ -0,0 +1,110 @@
+'''
+test_tiles.py
+Test the tile pyramid renderer and its cache.
+
+To run:
+poetry run pytest tests/test_tiles.py
+'''
+
+import threading
+import numpy as np
+import pytest
+from zippy.tiles import TileRenderer
+from zippy.zipper import Zipper
+
+def counting(calls: list):
+    '''
+    Returns the identity, recording every call to it.
+    '''
+    def func(z):
+        calls.append(z.shape)
+        return z
+    return func
+
+def test_tiles_line_up():
+    '''
+    Ensure that the four tiles below a tile cover it, so that the
+    assembled image at zoom 1 samples the root extent at twice the resolution.
+    '''
+    renderer = TileRenderer(lambda z: z, (-1, 1, -1, 1), key='identity', tile_size=8)
+    image, extent = renderer.render((-1, 1, -1, 1), zoom=1)
+    assert image.shape == (16, 16, 4)
+    assert extent == (-1, 1, -1, 1)
+
+    finer = TileRenderer(lambda z: z, (-1, 1, -1, 1), key='identity', tile_size=16)
+    assert np.array_equal(image, finer.tile(0, 0, 0))
+
+    # The top left tile holds the points with negative real and positive imaginary parts
+    assert renderer.tile_extent((1, 0, 0)) == (-1, 0, 0, 1)
+
+def test_cache_reuses_tiles():
+    '''
+    Ensure that tiles are rendered once, and again only after they were evicted.
+    '''
+    calls = []
+    renderer = TileRenderer(counting(calls), (0, 4, 0, 4), key='identity', tile_size=4, capacity=4)
+    renderer.render((0, 2, 0, 2), zoom=2)
+    assert len(calls) == 4
+    renderer.render((0, 2, 0, 2), zoom=2)
+    assert len(calls) == 4
+    assert renderer.stats['hits'] == 4
+
+    # Panning to the right evicts the least recently used tiles
+    renderer.render((2, 4, 0, 2), zoom=2)
+    assert len(calls) == 8
+    renderer.tile(2, 0, 3)
+    assert len(calls) == 9
+
+    with pytest.raises(ValueError):
+        renderer.tile(1, 2, 0)
+
+def test_spill(tmp_path):
+    '''
+    Ensure that evicted tiles are written to disk and read back instead of rendered again.
+    '''
+    calls = []
+    renderer = TileRenderer(counting(calls), (0, 4, 0, 4), key='identity', tile_size=4,
+                            capacity=1, spill_dir=str(tmp_path))
+    first = renderer.tile(1, 0, 0).copy()
+    renderer.tile(1, 1, 0)
+    assert renderer.stats['spilled'] == 1
+    assert np.array_equal(renderer.tile(1, 0, 0), first)
+    assert len(calls) == 2
+    assert renderer.stats['loaded'] == 1
+
+def test_cache_shared_by_threads():
+    '''
+    Ensure that threads requesting the same tiles each count as a hit or a miss,
+    and that the cache holds every tile once.
+    '''
+    renderer = TileRenderer(lambda z: z, (0, 4, 0, 4), key='identity', tile_size=4, capacity=4)
+    wanted = [(1, col, row) for col in range(2) for row in range(2)]
+
+    def request():
+        for _ in range(50):
+            renderer.tiles(wanted)
+
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert renderer.stats['hits'] + renderer.stats['misses'] == 4 * 50 * len(wanted)
+    assert sorted(renderer._cache) == wanted
+
+def test_zipper_tiles_in_parallel():
+    '''
+    Ensure that rendering with several threads gives the same tiles, and that
+    tiles are keyed by the map so that changing the map changes the key.
+    '''
+    corners = np.array([complex(-1, -1), complex(1, -1), complex(1, 1), complex(-1, 1)])
+    boundary = np.concatenate([np.linspace(corners[i], corners[(i + 1) % 4], 10, endpoint=False) for i in range(4)])
+    zipper = Zipper(boundary, interior=complex(.1, -.2))
+    serial = TileRenderer.for_zipper(zipper, (-1, 1, -1, 1), tile_size=8)
+    threaded = TileRenderer.for_zipper(zipper, (-1, 1, -1, 1), tile_size=8, workers=2)
+    assert np.array_equal(serial.render((-1, 1, -1, 1), 2)[0], threaded.render((-1, 1, -1, 1), 2)[0])
+
+    key = zipper.fingerprint()
+    assert Zipper(boundary, interior=complex(.1, -.2)).fingerprint() == key
+    zipper.set_vertex(5, complex(-.5, -.9))
+    assert zipper.fingerprint() != key
@@ -0,0 +1,75 @@
+'''
+test_utils.py
+Test the coloring and grid helpers in utils.
+
+To run:
+poetry run pytest tests/test_utils.py
+'''
+
+import numpy as np
+from zippy.point import PointArray
+from zippy.utils import get_color, render_domain_coloring, generate_complex, generate_complex_point, \
+    iter_complex, iter_complex_point, generate_complex_memmap
+
+def test_get_color_array():
+    '''
+    Ensure that coloring an array of points agrees with
+    coloring each point through colorsys.
+    '''
+    z = np.array([complex(1, 1), complex(-1, 2), complex(0, -3), complex(.1, 0), complex(-5, -5), 0])
+    colors = get_color(z)
+
+    assert colors.shape == (len(z), 3)
+    for i, p in enumerate(z):
+        assert np.allclose(colors[i], get_color(complex(p)), atol=1e-12)
+
+def test_render_domain_coloring():
+    '''
+    Ensure that the image is laid out for imshow and that points where
+    the function is not finite are transparent.
+    '''
+    image = render_domain_coloring(lambda z: 1 / z, (-1, 1, -1, 1), (5, 7))
+
+    assert image.shape == (5, 7, 4)
+    assert image.dtype == np.uint8
+
+    # The center pixel is at z = 0
+    assert image[2, 3, 3] == 0
+    assert np.all(np.delete(image[..., 3].reshape(-1), 2 * 7 + 3) == 255)
+
+    # The top-left pixel is -1 + i
+    expected = np.rint(np.array(get_color(1 / complex(-1, 1))) * 255)
+    assert np.array_equal(image[0, 0, :3], expected)
+
+def test_iter_complex_matches_list():
+    '''
+    Ensure that the chunks of the streamed grid concatenate to the full
+    grid, in the same order, including for extents that are not integers.
+    '''
+    expected = np.array(generate_complex(-1, 1.5, -.25, 1, 4))
+    chunks = list(iter_complex(-1, 1.5, -.25, 1, 4, chunk_size=7))
+
+    assert len(expected) == 10 * 5
+    assert all(len(chunk) == 7 for chunk in chunks[:-1])
+    assert np.array_equal(np.concatenate(chunks), expected)
+
+def test_iter_complex_point_flags():
+    '''
+    Ensure that the streamed PointArray chunks flag the axis and origin
+    exactly as generate_complex_point does.
+    '''
+    expected = generate_complex_point(-1, 1, -1, 1, 1.5, as_array=True)
+    chunks = list(iter_complex_point(-1, 1, -1, 1, 1.5, chunk_size=2))
+    joined = PointArray.concatenate(chunks)
+
+    assert np.array_equal(joined.z, expected.z)
+    assert np.array_equal(joined.flags, expected.flags)
+    assert joined.is_origin.sum() == 1
+
+def test_generate_complex_memmap(tmp_path):
+    '''
+    Ensure that the memory-mapped grid holds the same points as the list.
+    '''
+    grid = generate_complex_memmap(str(tmp_path / 'grid.bin'), 0, 2, 0, 1, 3, chunk_size=5)
+    assert np.array_equal(np.asarray(grid), np.array(generate_complex(0, 2, 0, 1, 3)))
+    assert np.array_equal(np.fromfile(tmp_path / 'grid.bin', dtype=np.complex128), np.asarray(grid))
@@ -0,0 +1,124 @@
+'''
+test_workspace.py
+Test the evaluation of the chain in preallocated workspaces.
+
+To run:
+poetry run pytest tests/test_workspace.py
+'''
+
+import gc
+import threading
+import tracemalloc
+import weakref
+import numpy as np
+import pytest
+from zippy.f_a import F_a
+from zippy.workspace import Workspace, thread_workspace
+from zippy.zipper import Zipper
+
+def star(n: int) -> Zipper:
+    t = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    return Zipper(np.exp(1j * t) * (1 + .3 * np.cos(3 * t)), interior=0)
+
+def test_apply_matches_without_workspace():
+    '''
+    Ensure that F_a.apply gives the same bits with and without a workspace, including
+    points on the axis, at b, at infinity and on the arc, and their derivatives.
+    '''
+    rng = np.random.default_rng(0)
+    z = rng.normal(size=2000) - 1j * np.abs(rng.normal(size=2000))
+    z[:200] = z[:200].real
+    z[200] = np.inf
+    z[201] = 0
+    f = F_a(.3 - .8j)
+    z[202] = f.b
+    on_arc = np.zeros(len(z), dtype=bool)
+    on_arc[300:310] = True
+    workspace = Workspace(4096)
+
+    for arc in (None, on_arc):
+        dz = np.ones(len(z), dtype=np.complex128)
+        dz_workspace = dz.copy()
+        with np.errstate(all='ignore'):
+            expected = f.apply(z, on_arc=arc, dz=dz)
+            result = f.apply(z.copy(), on_arc=arc, dz=dz_workspace, workspace=workspace)
+        np.testing.assert_array_equal(result, expected)
+        np.testing.assert_array_equal(dz_workspace, dz)
+
+    single = z.astype(np.complex64)
+    np.testing.assert_array_equal(f.apply(single, workspace=Workspace(len(z), np.complex64)), f.apply(single))
+    with pytest.raises(ValueError):
+        f.apply(single, workspace=workspace)
+
+def test_forward_matches_without_workspace():
+    '''
+    Ensure that the whole map gives the same bits with a workspace, with and without
+    derivatives and in single precision.
+    '''
+    zipper = star(100)
+    rng = np.random.default_rng(1)
+    z = .5 * (rng.uniform(-1, 1, 3000) + 1j * rng.uniform(-1, 1, 3000))
+    workspace = Workspace(len(z))
+    np.testing.assert_array_equal(zipper.forward(z, workspace=workspace), zipper.forward(z))
+    for result, expected in zip(zipper.forward(z, derivative=True, workspace=workspace),
+                                zipper.forward(z, derivative=True)):
+        np.testing.assert_array_equal(result, expected)
+    np.testing.assert_array_equal(zipper.forward(z, precision='single', workspace=Workspace(len(z), np.complex64)),
+                                  zipper.forward(z, precision='single'))
+    with pytest.raises(ValueError):
+        zipper.chain(z, workspace=Workspace(len(z) - 1))
+
+def test_chain_does_not_allocate_after_warm_up():
+    '''
+    Ensure that once a workspace has been used for a length, sweeping a chunk
+    through the chain allocates nothing the size of the chunk.
+    '''
+    zipper = star(50)
+    z = .5 * np.exp(2j * np.pi * np.linspace(0, 1, 1 << 16))
+    workspace = Workspace(1 << 17)
+    zipper.chain(z, workspace=workspace)
+
+    tracemalloc.start()
+    try:
+        zipper.chain(z, workspace=workspace)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # One complex array of the chunk is 1 MB, while NumPy's own ufunc buffers,
+    # which do not grow with the chunk, take up to 64 KB
+    assert peak < 128 * 1024
+
+def test_thread_workspace_is_per_thread():
+    '''
+    Ensure that each thread gets its own workspace, reused for later chunks.
+    '''
+    seen = {}
+
+    def take(name: str):
+        first = thread_workspace(1000)
+        seen[name] = (first, np.shares_memory(thread_workspace(500).result, first.result))
+
+    threads = [threading.Thread(target=take, args=(str(k),)) for k in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert seen['0'][0] is not seen['1'][0]
+    assert seen['0'][1] and seen['1'][1]
+
+def test_only_the_last_view_is_kept():
+    '''
+    Ensure that a workspace reuses the view for the last length, and does not keep
+    the views of every length it was called with.
+    '''
+    workspace = Workspace(1000)
+    assert workspace(1000) is workspace
+    view = workspace(10)
+    assert workspace(10) is view and view.size == 10 and np.shares_memory(view.result, workspace.result)
+    old = weakref.ref(view)
+    del view
+    for n in range(11, 500):
+        workspace(n)
+    gc.collect()
+    assert old() is None
+    assert workspace(499) is workspace(499)
@@ -0,0 +1,292 @@
+'''
+test_zipper.py
+Test the conformal map built by the zipper from a boundary polygon.
+
+To run:
+poetry run pytest tests/test_zipper.py
+'''
+
+import json
+import pytest
+import numpy as np
+from zippy import instrument
+from zippy.f_a import F_a
+from zippy.region import EXTERIOR, INTERIOR, NEAR
+from zippy.workspace import Workspace
+from zippy.zipper import Zipper
+
+def circle(n: int) -> np.ndarray:
+    return np.exp(1j * np.linspace(0, 2 * np.pi, n, endpoint=False))
+
+def square(n: int) -> np.ndarray:
+    corners = [complex(-1, -1), complex(1, -1), complex(1, 1), complex(-1, 1), complex(-1, -1)]
+    sides = [np.linspace(corners[i], corners[i + 1], n // 4, endpoint=False) for i in range(4)]
+    return np.concatenate(sides)
+
+def test_boundary_to_circle():
+    '''
+    Ensure that every boundary point, including z_0, is sent to the unit circle
+    and the interior point is sent to the origin.
+    '''
+    boundary = square(200)
+    zipper = Zipper(boundary, interior=0)
+
+    assert len(zipper.maps) == len(boundary) - 2
+    assert np.allclose(np.abs(zipper.forward(boundary)), 1, atol=1e-10)
+    assert np.abs(zipper.forward(np.array([0]))[0]) < 1e-12
+
+def test_disk_is_nearly_identity():
+    '''
+    For a polygon inscribed in the unit circle, the map sent 0 to 0 should
+    nearly preserve the modulus of points away from the boundary.
+    '''
+    zipper = Zipper(circle(500), interior=0)
+    pts = np.array([complex(.5, 0), complex(0, .3), complex(-.7, .1), complex(.2, -.6)])
+    assert np.allclose(np.abs(zipper.forward(pts)), np.abs(pts), atol=1e-6)
+
+def test_orientation_and_interior():
+    '''
+    The map should not depend on the orientation of the boundary, and points
+    inside the polygon should be sent inside the disk.
+    '''
+    pts = np.array([complex(.5, .5), complex(-.9, .1), complex(0, -.99)])
+    forward = Zipper(square(100), interior=0).forward(pts)
+    backward = Zipper(square(100)[::-1], interior=0).forward(pts)
+
+    assert np.allclose(np.abs(forward), np.abs(backward), atol=1e-3)
+    assert np.all(np.abs(forward) < 1)
+
+def test_inverse():
+    '''
+    Ensure that the inverse undoes the forward map inside the region, sends
+    0 to the interior point, and sends the unit circle onto the boundary.
+    '''
+    zipper = Zipper(square(200), interior=complex(.1, -.2))
+    pts = np.array([complex(.5, .5), complex(-.9, .1), complex(0, -.99), complex(.3, -.4)])
+    assert np.allclose(zipper.inverse(zipper.forward(pts)), pts, atol=1e-10)
+    assert abs(zipper.inverse(np.array([0]))[0] - zipper.interior) < 1e-12
+
+    circle_pts = circle(300)
+    assert np.allclose(zipper.forward(zipper.inverse(.99 * circle_pts)), .99 * circle_pts, atol=1e-10)
+
+    # The edges between the vertices are only followed up to the arcs of the algorithm
+    edge = zipper.inverse(circle_pts)
+    distance = np.minimum(np.abs(np.abs(edge.real) - 1), np.abs(np.abs(edge.imag) - 1))
+    assert np.all(distance < 1e-2)
+
+def test_forward_derivative():
+    '''
+    Ensure that the derivative carried through the chain agrees with a
+    central difference, and that the values are unchanged.
+    '''
+    zipper = Zipper(square(200), interior=complex(.1, -.2))
+    pts = np.array([complex(.5, .5), complex(-.9, .1), complex(0, -.99), complex(.3, -.4)])
+    values, derivatives = zipper.forward(pts, derivative=True)
+    assert np.array_equal(values, zipper.forward(pts))
+
+    h = 1e-4
+    difference = (zipper.forward(pts + h) - zipper.forward(pts - h)) / (2 * h)
+    assert np.allclose(derivatives, difference, rtol=1e-6)
+
+def test_precisions():
+    '''
+    Ensure that single and double-double precision agree with double precision
+    inside the region, to about the accuracy of the lower of the two.
+    '''
+    zipper = Zipper(square(100), interior=complex(.1, -.2))
+    pts = np.array([complex(.5, .5), complex(-.9, .1), complex(0, -.9), complex(.3, -.4), zipper.interior])
+    expected = zipper.forward(pts)
+
+    extended = zipper.forward(pts, precision='double-double')
+    assert extended.dtype == np.complex128
+    assert np.allclose(extended, expected, atol=1e-10)
+
+    # The image of the interior point that defines the disk map was found in double precision
+    assert abs(extended[-1]) < 1e-12
+
+    assert np.allclose(zipper.forward(pts, precision='single'), expected, atol=1e-3)
+
+    with pytest.raises(ValueError):
+        zipper.forward(pts, precision='quad')
+    with pytest.raises(ValueError):
+        zipper.forward(pts, precision='single', derivative=True)
+
+def test_forward_disk():
+    '''
+    Ensure that the certified radii hold the double-double images, and that
+    inside the region they are small.
+    '''
+    zipper = Zipper(square(100), interior=complex(.1, -.2))
+    pts = np.array([complex(.5, .5), complex(-.9, .1), complex(0, -.9), complex(.3, -.4), zipper.interior])
+    center, radius = zipper.forward_disk(pts)
+    assert np.allclose(center, zipper.forward(pts))
+    assert np.all(np.abs(zipper.forward(pts, precision='double-double') - center) <= radius)
+    assert np.all(radius < 1e-6)
+
+    # Moving the points within the given radius keeps their images within the returned one
+    moved = pts + 1e-8 * np.exp(1j)
+    center, radius = zipper.forward_disk(pts, radius=2e-8)
+    assert np.all(np.abs(zipper.forward(moved) - center) <= radius)
+    assert np.all(radius < 1e-6)
+
+def test_forward_inside():
+    '''
+    Ensure that a whole grid can be mapped, with points outside the polygon skipped
+    and points near its boundary mapped in double-double precision.
+    '''
+    zipper = Zipper(square(100), interior=complex(.1, -.2))
+    grid = np.linspace(-2, 2, 41)[:, None] + 1j * np.linspace(-2, 2, 41)
+    result, labels = zipper.forward_inside(grid, tol=.02)
+    assert result.shape == grid.shape
+    assert np.all(np.isnan(result[labels == EXTERIOR]))
+    assert np.all(np.abs(result[labels == INTERIOR]) < 1)
+    assert np.all(np.abs(grid[labels == EXTERIOR]) > 1 - 1e-9)
+
+    inside = labels == INTERIOR
+    assert np.array_equal(result[inside], zipper.forward(grid[inside]))
+    near = labels == NEAR
+    assert np.any(near)
+    assert np.array_equal(result[near], zipper.forward(grid[near], precision='double-double'))
+
+def test_too_few_points():
+    with pytest.raises(ValueError):
+        Zipper(np.array([0, 1]))
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_parallel_forward(executor):
+    '''
+    Ensure that splitting the points between workers gives exactly the
+    same images as evaluating them all at once.
+    '''
+    zipper = Zipper(square(40), interior=0)
+    grid = np.linspace(-1, 1, 30)[:, None] + 1j * np.linspace(-1, 1, 20)[None, :]
+
+    expected = zipper.forward(grid)
+    results = zipper.forward(grid, workers=2, executor=executor, chunk_size=64)
+    assert results.shape == grid.shape
+    assert np.array_equal(results, expected, equal_nan=True)
+
+    disk = 0.9 * grid / np.max(np.abs(grid))
+    expected = zipper.inverse(disk)
+    results = zipper.inverse(disk, workers=2, executor=executor, chunk_size=64)
+    assert np.array_equal(results, expected, equal_nan=True)
+
+    expected = zipper.forward(grid, derivative=True)
+    results = zipper.forward(grid, workers=2, executor=executor, chunk_size=64, derivative=True)
+    for result, value in zip(results, expected):
+        assert np.array_equal(result, value, equal_nan=True)
+
+def test_from_constants():
+    '''
+    Ensure that a zipper rebuilt from the constants of its maps is the same map.
+    '''
+    zipper = Zipper(square(40), interior=0)
+    rebuilt = Zipper.from_constants(zipper.boundary, zipper.interior, *zipper.stage_constants(),
+                                    zipper.zeta0, zipper.interior_image)
+    pts = np.array([complex(.1, .2), complex(-.5, .5)])
+    assert np.array_equal(rebuilt.forward(pts), zipper.forward(pts))
+
+def test_append_matches_full_build():
+    '''
+    Ensure that appending boundary points reuses the existing maps and
+    gives the same map as building from all of the points at once.
+    '''
+    boundary = square(80)
+    full = Zipper(boundary, interior=0)
+    zipper = Zipper(boundary[:60], interior=0)
+    prefix = zipper.maps[:]
+    zipper.append(boundary[60:])
+
+    assert all(f is g for f, g in zip(prefix, zipper.maps))
+    assert len(zipper.maps) == len(full.maps)
+    pts = np.array([complex(.1, .2), complex(-.5, .5), complex(.9, -.9)])
+    assert np.array_equal(zipper.forward(pts), full.forward(pts))
+
+def test_set_vertex_keeps_prefix():
+    '''
+    Ensure that moving a vertex only rebuilds the maps from that vertex on,
+    and that moving it back restores the original map.
+    '''
+    boundary = square(80)
+    full = Zipper(boundary, interior=0)
+    zipper = Zipper(boundary, interior=0)
+    prefix = zipper.maps[:50]
+
+    zipper.set_vertex(52, boundary[52] * .9)
+    assert all(f is g for f, g in zip(prefix, zipper.maps[:50]))
+    pts = np.array([complex(.1, .2), complex(-.5, .5)])
+    assert not np.allclose(zipper.forward(pts), full.forward(pts))
+
+    zipper.set_vertex(52, boundary[52])
+    assert np.array_equal(zipper.forward(pts), full.forward(pts))
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_save_and_load(tmp_path, mmap):
+    '''
+    Ensure that a saved map loads as the same map, without rebuilding it.
+    '''
+    zipper = Zipper(square(60), interior=complex(.1, -.2))
+    path = str(tmp_path / 'square.zmap')
+    zipper.save(path)
+
+    loaded = Zipper.load(path, mmap=mmap)
+    assert isinstance(loaded.boundary, np.memmap) == mmap
+    assert loaded.zeta0 == zipper.zeta0
+    assert loaded.interior == zipper.interior
+
+    pts = np.array([complex(.1, .2), complex(-.5, .5), complex(.9, -.9)])
+    assert np.array_equal(loaded.forward(pts), zipper.forward(pts))
+
+    # A loaded map can still be extended
+    loaded.append(np.array([complex(-1, -.99)]))
+    assert len(loaded.maps) == len(zipper.maps) + 1
+
+def test_load_rejects_other_files(tmp_path):
+    '''
+    Ensure that loading a file that is not a saved map, or is too short to hold
+    the prefix of one, raises an error.
+    '''
+    path = tmp_path / 'other.bin'
+    for content in (b'not a map file at all', b'ZIP', b''):
+        path.write_bytes(content)
+        with pytest.raises(ValueError):
+            Zipper.load(str(path))
+
+def test_instrumentation(tmp_path, monkeypatch):
+    '''
+    Ensure that a recorder sees every stage of the chain without changing
+    the images, and that its statistics export to JSON.
+    '''
+    zipper = Zipper(square(40), interior=0)
+    pts = np.array([complex(.5, .5), complex(-.9, .1), complex(0, -.99)])
+    expected = zipper.forward(pts)
+
+    with instrument.recording() as recorder:
+        assert instrument.active()
+        assert np.array_equal(zipper.forward(pts), expected)
+    assert not instrument.active()
+
+    # Stages run in the workspace and precision they are given, as without hooks
+    workspaces = []
+    apply = F_a.apply
+
+    def spy(self, *args, **kwargs):
+        workspaces.append(kwargs.get('workspace'))
+        return apply(self, *args, **kwargs)
+
+    monkeypatch.setattr(F_a, 'apply', spy)
+    workspace = Workspace(len(pts))
+    with instrument.recording():
+        assert np.array_equal(zipper.forward(pts, workspace=workspace), expected)
+        assert zipper.chain(pts, single=True, workspace=Workspace(len(pts), np.complex64)).dtype == np.complex64
+    assert len(workspaces) == 2 * len(zipper.maps) and all(w is not None for w in workspaces)
+
+    assert sorted(recorder.stages) == list(range(len(zipper.maps)))
+    assert all(stats['points'] == len(pts) for stats in recorder.stages.values())
+    assert all(stats['condition'].sum() == len(pts) for stats in recorder.stages.values())
+
+    path = tmp_path / 'stages.json'
+    recorder.to_json(str(path))
+    exported = json.loads(path.read_text())
+    assert len(exported['stages']) == len(zipper.maps)
+    assert len(exported['stages'][0]['condition']) == len(exported['condition_bins']) + 1